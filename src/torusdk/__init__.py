@@ -3,6 +3,7 @@ The Torus CLI library package.
 
 Submodules:
     * `torus.client`: A lightweigh yet faster client for the Torus Network.
+    * `.async_client`: An asyncio client with the same surface as `.client`.
     * `.compat`: Compatibility layer for the *classic* `commune` library.
     * `.types`: Torus common types.
     * `.key`: Key related functions.
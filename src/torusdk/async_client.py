@@ -0,0 +1,873 @@
+"""
+Asyncio client for the Torus network.
+"""
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Callable, TypeVar, cast
+
+import aiohttp
+from scalecodec.base import ScaleBytes
+from torustrateinterface import ExtrinsicReceipt, Keypair, SubstrateInterface
+from torustrateinterface.storage import StorageKey
+
+from torusdk.client import KEYS_PAGE_SIZE, MAX_PAGES_IN_FLIGHT
+from torusdk.codec import DEFAULT_CODEC, JsonCodec
+from torusdk.decoding import DecodeExecutor, DecoderRegistry, StorageDecoder
+from torusdk.errors import (
+    ChainTransactionError,
+    NetworkError,
+    NetworkQueryError,
+    NetworkTimeoutError,
+)
+from torusdk.metadata_cache import METADATA_CACHE_DIR, attach_metadata_cache
+from torusdk.transport import MAX_UNCLAIMED_NOTIFICATIONS, TrafficStats
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncConnection:
+    """
+    A websocket shared by any number of in-flight requests.
+
+    A reader task routes each response to the future waiting on its JSON-RPC
+    id, and subscription notifications to a queue per subscription id.
+    """
+
+    _ws: aiohttp.ClientWebSocketResponse
+    _codec: JsonCodec
+    _traffic: TrafficStats
+    _pending: dict[int, asyncio.Future[dict[str, Any]]]
+    _subscriptions: dict[str, asyncio.Queue[Any]]
+    _unclaimed: dict[str, list[Any]]
+
+    def __init__(
+        self,
+        ws: aiohttp.ClientWebSocketResponse,
+        codec: JsonCodec,
+        traffic: TrafficStats,
+    ):
+        self._ws = ws
+        self._codec = codec
+        self._traffic = traffic
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._subscriptions = {}
+        self._unclaimed = {}
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._ws.closed or self._reader.done()
+
+    def _dispatch(self, message: dict[str, Any]):
+        request_id = message.get("id")
+        if request_id is not None:
+            future = self._pending.pop(request_id, None)
+            if future is not None and not future.done():
+                future.set_result(message)
+            return
+        params = message.get("params")
+        if not isinstance(params, dict) or "subscription" not in params:
+            return
+        subscription_id = cast(str, params["subscription"])
+        result = params.get("result")  # type: ignore
+        queue = self._subscriptions.get(subscription_id)
+        if queue is not None:
+            queue.put_nowait(result)
+            return
+        # notifications can arrive before the subscriber registers its
+        # queue; a few are kept for it, and those of dropped subscriptions
+        # are eventually evicted
+        if len(self._unclaimed) >= MAX_UNCLAIMED_NOTIFICATIONS:
+            del self._unclaimed[next(iter(self._unclaimed))]
+        self._unclaimed.setdefault(subscription_id, []).append(result)
+
+    async def _read_loop(self):
+        error: Exception = NetworkError("Websocket connection closed")
+        try:
+            async for msg in self._ws:
+                if msg.type not in (
+                    aiohttp.WSMsgType.TEXT,
+                    aiohttp.WSMsgType.BINARY,
+                ):
+                    continue
+                self._traffic.record_received(len(msg.data))  # type: ignore
+                received: Any = self._codec.loads(msg.data)
+                if isinstance(received, dict):
+                    received = [received]
+                for message in received:
+                    self._dispatch(message)
+        except Exception as e:
+            error = NetworkError(f"Websocket connection failed: {e}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            for queue in self._subscriptions.values():
+                queue.put_nowait(error)
+
+    async def request_batch(
+        self,
+        requests: list[tuple[str, list[Any]]],
+        timeout: float | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Sends the requests as a single JSON-RPC batch and waits for all of
+        their responses, in request order.
+        """
+        loop = asyncio.get_running_loop()
+        request_ids: list[int] = []
+        futures: list[asyncio.Future[dict[str, Any]]] = []
+        payload: list[dict[str, Any]] = []
+        for method, params in requests:
+            request_id = next(self._ids)
+            future: asyncio.Future[dict[str, Any]] = loop.create_future()
+            self._pending[request_id] = future
+            request_ids.append(request_id)
+            futures.append(future)
+            payload.append(
+                {
+                    "jsonrpc": "2.0",
+                    "method": method,
+                    "params": params,
+                    "id": request_id,
+                }
+            )
+        try:
+            data = self._codec.dumps(
+                payload[0] if len(payload) == 1 else payload
+            )
+            self._traffic.record_sent(len(data))
+            await self._ws.send_frame(data, aiohttp.WSMsgType.TEXT)
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        except asyncio.TimeoutError:
+            raise NetworkTimeoutError(
+                f"No response after {timeout} seconds for {len(requests)} requests"
+            )
+        finally:
+            for request_id in request_ids:
+                self._pending.pop(request_id, None)
+
+    def subscription_queue(self, subscription_id: str) -> asyncio.Queue[Any]:
+        """
+        Registers a subscription, returning the queue its notifications are
+        put in.
+        """
+        if subscription_id not in self._subscriptions:
+            queue: asyncio.Queue[Any] = asyncio.Queue()
+            for result in self._unclaimed.pop(subscription_id, []):
+                queue.put_nowait(result)
+            self._subscriptions[subscription_id] = queue
+        return self._subscriptions[subscription_id]
+
+    def drop_subscription(self, subscription_id: str):
+        self._subscriptions.pop(subscription_id, None)
+        self._unclaimed.pop(subscription_id, None)
+
+    async def close(self):
+        await self._ws.close()
+        await asyncio.gather(self._reader, return_exceptions=True)
+
+
+class _LoopBoundSubstrate(SubstrateInterface):
+    """
+    `SubstrateInterface` used for its metadata, type registry and extrinsic
+    building only. It never opens a socket: its RPC calls, subscriptions
+    included, are forwarded to the `AsyncTorusClient` event loop, so it must
+    be driven from a worker thread.
+    """
+
+    def __init__(
+        self, client: "AsyncTorusClient", loop: asyncio.AbstractEventLoop
+    ):
+        self._client = client
+        self._loop = loop
+        super().__init__(url=client.url)  # type: ignore
+
+    def connect_websocket(self):
+        pass
+
+    def rpc_request(  # type: ignore
+        self,
+        method: str,
+        params: list[Any],
+        result_handler: Callable[..., Any] | None = None,
+    ) -> dict[str, Any]:
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            raise RuntimeError(
+                "Substrate calls must run in a worker thread, not in the "
+                "event loop of the AsyncTorusClient"
+            )
+        if result_handler is not None:
+            return self._subscribe(method, params, result_handler)
+        future = asyncio.run_coroutine_threadsafe(
+            self._client.rpc_request_raw(method, params), self._loop
+        )
+        return future.result()
+
+    def _subscribe(
+        self,
+        method: str,
+        params: list[Any],
+        result_handler: Callable[..., Any],
+    ) -> Any:
+        """
+        Feeds the notifications of a subscription to `result_handler` until
+        it returns a result, as `SubstrateInterface.rpc_request` does.
+        """
+        conn, subscription_id = asyncio.run_coroutine_threadsafe(
+            self._client.subscribe(method, params), self._loop
+        ).result()
+        queue = conn.subscription_queue(subscription_id)
+        try:
+            for update_nr in itertools.count():
+                update = asyncio.run_coroutine_threadsafe(
+                    queue.get(), self._loop
+                ).result()
+                if isinstance(update, Exception):
+                    raise update
+                message = {
+                    "jsonrpc": "2.0",
+                    "params": {
+                        "subscription": subscription_id,
+                        "result": update,
+                    },
+                }
+                result = result_handler(message, update_nr, subscription_id)
+                if result is not None:
+                    return result
+        finally:
+            self._loop.call_soon_threadsafe(
+                conn.drop_subscription, subscription_id
+            )
+
+
+class AsyncTorusClient:
+    """
+    An asyncio client for interacting with Torus network nodes, with the same
+    query and extrinsic surface as `TorusClient`.
+
+    Every request is multiplexed by JSON-RPC id over `num_connections`
+    websockets, so a single event loop can keep hundreds of storage reads and
+    extrinsic submissions in flight. SCALE encoding, decoding and signing run
+    in the loop's default executor.
+
+    Attributes:
+        wait_for_finalization: Whether to wait for transaction finalization.
+
+    Example:
+    ```py
+    async with AsyncTorusClient(url) as client:
+        balances = await client.query_map("Account", module="System")
+    ```
+    """
+
+    wait_for_finalization: bool
+    url: str
+    _num_connections: int
+    _timeout: float | None
+    _metadata_cache_dir: str | None
+    _codec: JsonCodec
+    _compress: bool
+    _max_message_size: int | None
+    _decode_executor: DecodeExecutor | None
+    traffic: TrafficStats
+    _session: aiohttp.ClientSession | None
+    _connections: list[_AsyncConnection]
+    _substrate: _LoopBoundSubstrate | None
+
+    def __init__(
+        self,
+        url: str,
+        num_connections: int = 1,
+        wait_for_finalization: bool = False,
+        timeout: float | None = None,
+        metadata_cache_dir: str | None = METADATA_CACHE_DIR,
+        codec: JsonCodec = DEFAULT_CODEC,
+        compress: bool = False,
+        max_message_size: int | None = None,
+        decode_executor: DecodeExecutor | None = None,
+    ):
+        """
+        Args:
+            url: The URL of the network node to connect to.
+            num_connections: The number of websocket connections to be opened.
+            timeout: Seconds to wait for each response before giving up.
+            metadata_cache_dir: Where to cache runtime metadata on disk.
+              None disables the cache.
+            codec: The JSON codec of the RPC traffic. Defaults to the
+              fastest one installed.
+            compress: Negotiate permessage-deflate compression, which
+              shrinks the hex-encoded storage of full-map reads several
+              times over. Nodes not supporting it are used uncompressed.
+            max_message_size: The largest message accepted from the node, in
+              bytes. None accepts any size.
+            decode_executor: Where storage map entries are decoded. None
+              decodes them in the loop's default executor. An
+              `InlineDecodeExecutor` would block the event loop.
+        """
+        assert num_connections > 0
+        self.url = url
+        self.wait_for_finalization = wait_for_finalization
+        self._num_connections = num_connections
+        self._timeout = timeout
+        self._metadata_cache_dir = metadata_cache_dir
+        self._codec = codec
+        self._compress = compress
+        self._max_message_size = max_message_size
+        self._decode_executor = decode_executor
+        self.traffic = TrafficStats()
+        self._session = None
+        self._connections = []
+        self._round_robin = itertools.count()
+        self._substrate = None
+        self._substrate_lock = asyncio.Lock()
+        self._decoders = DecoderRegistry()
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connections(self) -> int:
+        """
+        Gets the number of websocket connections to the network node.
+        """
+        return self._num_connections
+
+    async def _open_connection(self) -> _AsyncConnection:
+        assert self._session is not None
+        ws = await self._session.ws_connect(  # type: ignore
+            self.url,
+            max_msg_size=self._max_message_size or 0,
+            autoping=True,
+            compress=15 if self._compress else 0,
+        )
+        return _AsyncConnection(ws, self._codec, self.traffic)
+
+    async def connect(self):
+        """
+        Opens the websocket connections. Called implicitly by the first
+        request, or by entering the client as an async context manager.
+        """
+        async with self._connect_lock:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            if not self._connections:
+                self._connections = list(
+                    await asyncio.gather(
+                        *(
+                            self._open_connection()
+                            for _ in range(self._num_connections)
+                        )
+                    )
+                )
+            if self._substrate is None:
+                # the interface queries the chain name on construction
+                self._substrate = await asyncio.to_thread(
+                    _LoopBoundSubstrate, self, asyncio.get_running_loop()
+                )
+                if self._metadata_cache_dir is not None:
+                    await asyncio.to_thread(
+                        attach_metadata_cache,
+                        self._substrate,
+                        self._metadata_cache_dir,
+                    )
+
+    async def close(self):
+        """
+        Closes every websocket connection and the underlying HTTP session.
+        """
+        await asyncio.gather(
+            *(conn.close() for conn in self._connections),
+            return_exceptions=True,
+        )
+        self._connections = []
+        # bound to this loop, so built again by the next `connect`
+        self._substrate = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncTorusClient":
+        try:
+            await self.connect()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, *_: Any):
+        await self.close()
+
+    async def _get_conn(self) -> _AsyncConnection:
+        if not self._connections:
+            await self.connect()
+        idx = next(self._round_robin) % len(self._connections)
+        conn = self._connections[idx]
+        if conn.closed:
+            # reconnects
+            async with self._connect_lock:
+                conn = self._connections[idx]
+                if conn.closed:
+                    conn = await self._open_connection()
+                    self._connections[idx] = conn
+        return conn
+
+    async def _run_sync(self, fn: Callable[[SubstrateInterface], T]) -> T:
+        """
+        Runs `fn` with the loop-bound substrate interface in a worker thread.
+
+        The interface is stateful, so calls are serialized.
+        """
+        if self._substrate is None:
+            await self.connect()
+        substrate = self._substrate
+        assert substrate is not None
+        async with self._substrate_lock:
+            return await asyncio.to_thread(fn, substrate)
+
+    async def rpc_request_raw(
+        self, method: str, params: list[Any]
+    ) -> dict[str, Any]:
+        """
+        Sends a single JSON-RPC request and returns the whole response
+        message, including any `error` field.
+        """
+        conn = await self._get_conn()
+        (response,) = await conn.request_batch(
+            [(method, params)], self._timeout
+        )
+        return response
+
+    async def subscribe(
+        self, method: str, params: list[Any]
+    ) -> tuple[_AsyncConnection, str]:
+        """
+        Starts a subscription, e.g. with `author_submitAndWatchExtrinsic`.
+
+        Returns:
+            The connection its notifications arrive on, and its id, to get
+            their queue with `subscription_queue`.
+
+        Raises:
+            NetworkQueryError: If the node refuses the subscription.
+        """
+        conn = await self._get_conn()
+        (response,) = await conn.request_batch(
+            [(method, params)], self._timeout
+        )
+        if "error" in response:
+            raise NetworkQueryError(response["error"])
+        return conn, response["result"]
+
+    async def rpc_request_batch(
+        self, batch_requests: list[tuple[str, list[Any]]]
+    ) -> list[Any]:
+        """
+        Sends the requests as one JSON-RPC batch and returns their results.
+
+        Raises:
+            NetworkQueryError: If there is an `error` in any response message.
+        """
+        conn = await self._get_conn()
+        responses = await conn.request_batch(batch_requests, self._timeout)
+        results: list[Any] = []
+        for message in responses:
+            if "error" in message:
+                raise NetworkQueryError(message["error"])
+            results.append(message.get("result"))
+        return results
+
+    async def rpc_request(self, method: str, params: list[Any]) -> Any:
+        """
+        Sends a single JSON-RPC request and returns its result.
+
+        Raises:
+            NetworkQueryError: If there is an `error` in the response message.
+        """
+        (result,) = await self.rpc_request_batch([(method, params)])
+        return result
+
+    async def get_block_hash(self, block_number: int | None = None) -> str:
+        """
+        Gets the hash of the block at `block_number`, or of the chain head.
+        """
+        return await self.rpc_request("chain_getBlockHash", [block_number])
+
+    async def get_block(
+        self, block_hash: str | None = None
+    ) -> dict[Any, Any] | None:
+        """
+        Retrieves information about a specific block in the network.
+        """
+        return await self._run_sync(
+            lambda substrate: substrate.get_block(block_hash)  # type: ignore
+        )
+
+    async def _run_at(
+        self, block_hash: str, fn: Callable[[SubstrateInterface], T]
+    ) -> T:
+        """
+        Runs `fn` like `_run_sync`, with the runtime initialized at
+        `block_hash` in the same call, so a query at another block can't
+        swap the metadata in between.
+        """
+
+        def run(substrate: SubstrateInterface) -> T:
+            substrate.init_runtime(block_hash=block_hash)  # type: ignore
+            return fn(substrate)
+
+        return await self._run_sync(run)
+
+    async def query_batch(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Executes batch queries and returns results in a dictionary format.
+
+        Args:
+            functions: A dictionary mapping module names to lists of query
+              calls (function name and parameters).
+            block_hash: The block to query. Defaults to the chain head.
+
+        Returns:
+            A dictionary where keys are storage function names and values are
+            the query results.
+        """
+        if not functions:
+            raise Exception("No result")
+        if block_hash is None:
+            block_hash = await self.get_block_hash()
+        pinned_hash = block_hash
+
+        def create_keys(substrate: SubstrateInterface) -> list[StorageKey]:
+            return [
+                StorageKey.create_from_storage_function(  # type: ignore
+                    module,
+                    fn,
+                    params,
+                    runtime_config=substrate.runtime_config,  # type: ignore
+                    metadata=substrate.metadata,  # type: ignore
+                )
+                for module, queries in functions.items()
+                for fn, params in queries
+            ]
+
+        storage_keys = await self._run_at(pinned_hash, create_keys)
+        response = await self.rpc_request(
+            "state_queryStorageAt",
+            [[key.to_hex() for key in storage_keys], pinned_hash],
+        )
+
+        def decode(_: SubstrateInterface) -> dict[str, Any]:
+            key_map = {key.to_hex(): key for key in storage_keys}
+            result: dict[str, Any] = {}
+            for result_group in response:
+                for change_key, change_data in result_group["changes"]:
+                    storage_key = key_map[change_key]
+                    value = storage_key.decode_scale_value(  # type: ignore
+                        change_data and ScaleBytes(change_data)
+                    )
+                    result[storage_key.storage_function] = value.value  # type: ignore
+            return result
+
+        return await self._run_at(pinned_hash, decode)
+
+    async def query(
+        self,
+        name: str,
+        params: list[Any] = [],
+        module: str = "Torus0",
+        block_hash: str | None = None,
+    ) -> Any:
+        """
+        Queries a storage function on the network.
+
+        Raises:
+            NetworkQueryError: If the query fails or is invalid.
+        """
+        result = await self.query_batch({module: [(name, params)]}, block_hash)
+        return result[name]
+
+    async def _read_map_changes(
+        self, prefix: str, block_hash: str
+    ) -> list[tuple[str, str]]:
+        """
+        Reads the raw `[key, value]` entries under `prefix` page by page,
+        like `TorusClient`: keys are enumerated with `state_getKeysPaged`,
+        and the values of each page are fetched while the next page is
+        enumerated, with up to `MAX_PAGES_IN_FLIGHT` pages fetching at once.
+        """
+        in_flight = asyncio.Semaphore(MAX_PAGES_IN_FLIGHT)
+
+        async def fetch_values(keys: list[str]) -> Any:
+            try:
+                return await self.rpc_request(
+                    "state_queryStorageAt", [keys, block_hash]
+                )
+            finally:
+                in_flight.release()
+
+        fetches: list[asyncio.Future[Any]] = []
+        start_key = None
+        try:
+            while True:
+                keys: list[str] = await self.rpc_request(
+                    "state_getKeysPaged",
+                    [prefix, KEYS_PAGE_SIZE, start_key, block_hash],
+                )
+                if keys:
+                    await in_flight.acquire()
+                    fetches.append(asyncio.ensure_future(fetch_values(keys)))
+                if len(keys) < KEYS_PAGE_SIZE:
+                    break
+                start_key = keys[-1]
+            pages = await asyncio.gather(*fetches)
+        except BaseException:
+            for fetch in fetches:
+                fetch.cancel()
+            raise
+        return [
+            change
+            for page in pages
+            for group in page
+            for change in group["changes"]
+        ]
+
+    async def _query_map_function(
+        self,
+        prefix: str,
+        decoder: StorageDecoder,
+        block_hash: str,
+    ) -> dict[Any, Any]:
+        changes = await self._read_map_changes(prefix, block_hash)
+        if self._decode_executor is None:
+            return await asyncio.to_thread(
+                decoder.decode_changes, changes, prefix
+            )
+        return await asyncio.wrap_future(
+            self._decode_executor.submit(decoder, changes, prefix)
+        )
+
+    async def query_batch_map(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
+    ) -> dict[str, dict[Any, Any]]:
+        """
+        Queries multiple storage maps concurrently and returns the combined
+        result.
+
+        Args:
+            functions: A dictionary mapping module names to lists of query
+              calls.
+            block_hash: The block to query. Defaults to the chain head.
+
+        Returns:
+            A dictionary mapping each storage function name to its decoded
+            `{key: value}` entries.
+        """
+        if block_hash is None:
+            block_hash = await self.get_block_hash()
+        pinned_hash = block_hash
+
+        def describe(
+            substrate: SubstrateInterface,
+        ) -> list[tuple[str, StorageDecoder]]:
+            described: list[tuple[str, StorageDecoder]] = []
+            for module, queries in functions.items():
+                for fn, params in queries:
+                    prefix = StorageKey.create_from_storage_function(  # type: ignore
+                        module,
+                        fn,
+                        params,
+                        runtime_config=substrate.runtime_config,  # type: ignore
+                        metadata=substrate.metadata,  # type: ignore
+                    ).to_hex()
+                    decoder = self._decoders.get(substrate, module, fn, params)
+                    described.append((prefix, decoder))
+            return described
+
+        described = await self._run_at(pinned_hash, describe)
+        decoded = await asyncio.gather(
+            *(
+                self._query_map_function(prefix, decoder, pinned_hash)
+                for prefix, decoder in described
+            )
+        )
+        multi_result: dict[str, dict[Any, Any]] = {}
+        for (_, decoder), entries in zip(described, decoded):
+            if entries:
+                multi_result.setdefault(decoder.storage_function, {}).update(
+                    entries
+                )
+        return multi_result
+
+    async def query_map(
+        self,
+        name: str,
+        params: list[Any] = [],
+        module: str = "Torus0",
+        extract_value: bool = True,
+        block_hash: str | None = None,
+    ) -> dict[Any, Any]:
+        """
+        Queries a storage map from a network node, like
+        `TorusClient.query_map`.
+
+        Args:
+            name: The name of the storage map to query.
+            params: A list of parameters for the query.
+            module: The module in which the storage map is located.
+            extract_value: Return the entries of the map, instead of a
+              dictionary mapping its name to them.
+            block_hash: The block to query. Defaults to the chain head.
+        """
+        result = await self.query_batch_map(
+            {module: [(name, params)]}, block_hash
+        )
+        if extract_value:
+            return result.get(name, {})
+        return result
+
+    async def _watch_extrinsic(
+        self, extrinsic_data: str, wait_for_finalization: bool
+    ) -> tuple[str, bool]:
+        conn, subscription_id = await self.subscribe(
+            "author_submitAndWatchExtrinsic", [extrinsic_data]
+        )
+        queue = conn.subscription_queue(subscription_id)
+        try:
+            while True:
+                update = await queue.get()
+                if isinstance(update, Exception):
+                    raise update
+                if not isinstance(update, dict):
+                    if update in ("dropped", "invalid"):
+                        raise ChainTransactionError(
+                            f"Extrinsic {update}", update
+                        )
+                    continue
+                status: dict[str, Any] = {
+                    str(k).lower(): v  # type: ignore
+                    for k, v in update.items()  # type: ignore
+                }
+                if "finalized" in status:
+                    return status["finalized"], True
+                if "inblock" in status and not wait_for_finalization:
+                    return status["inblock"], False
+                if "usurped" in status or "finalitytimeout" in status:
+                    raise ChainTransactionError(
+                        f"Extrinsic failed: {status}", status
+                    )
+        finally:
+            conn.drop_subscription(subscription_id)
+            if not conn.closed:
+                try:
+                    await conn.request_batch(
+                        [("author_unwatchExtrinsic", [subscription_id])],
+                        self._timeout,
+                    )
+                except Exception:
+                    # must not mask the outcome of the extrinsic
+                    logger.warning(
+                        "Could not unwatch extrinsic subscription %s",
+                        subscription_id,
+                        exc_info=True,
+                    )
+
+    async def compose_call(
+        self,
+        fn: str,
+        params: dict[str, Any],
+        key: Keypair | None,
+        module: str = "Torus0",
+        wait_for_inclusion: bool = True,
+        wait_for_finalization: bool | None = None,
+        sudo: bool = False,
+        unsigned: bool = False,
+    ) -> ExtrinsicReceipt:
+        """
+        Composes and submits a call to the network node.
+
+        Args:
+            fn: The function name to call on the network.
+            params: A dictionary of parameters for the call.
+            key: The keypair for signing the extrinsic.
+            module: The module containing the function.
+            wait_for_inclusion: Wait for the call's inclusion in a block.
+            wait_for_finalization: Wait for the transaction's finalization.
+            sudo: Execute the call as a sudo (superuser) operation.
+
+        Returns:
+            The receipt of the submitted extrinsic. Its events are already
+              loaded when `wait_for_inclusion` is True, so it can be inspected
+              from the event loop.
+
+        Raises:
+            ChainTransactionError: If the transaction fails.
+        """
+        if key is None and not unsigned:
+            raise ValueError("Key must be provided for signed extrinsics.")
+        if wait_for_finalization is None:
+            wait_for_finalization = self.wait_for_finalization
+
+        def build_extrinsic(substrate: SubstrateInterface) -> Any:
+            call = substrate.compose_call(  # type: ignore
+                call_module=module, call_function=fn, call_params=params
+            )
+            if sudo:
+                call = substrate.compose_call(  # type: ignore
+                    call_module="Sudo",
+                    call_function="sudo",
+                    call_params={
+                        "call": call.value,  # type: ignore
+                    },
+                )
+            if not unsigned:
+                assert key is not None
+                return substrate.create_signed_extrinsic(  # type: ignore
+                    call=call,
+                    keypair=key,
+                )
+            return substrate.create_unsigned_extrinsic(call=call)  # type: ignore
+
+        extrinsic = await self._run_sync(build_extrinsic)
+        extrinsic_data = str(extrinsic.data)  # type: ignore
+        extrinsic_hash = f"0x{extrinsic.extrinsic_hash.hex()}"  # type: ignore
+        substrate = self._substrate
+        assert substrate is not None
+
+        if not (wait_for_inclusion or wait_for_finalization):
+            await self.rpc_request("author_submitExtrinsic", [extrinsic_data])
+            return ExtrinsicReceipt(
+                substrate=substrate, extrinsic_hash=extrinsic_hash
+            )
+
+        block_hash, finalized = await self._watch_extrinsic(
+            extrinsic_data, wait_for_finalization
+        )
+        response = ExtrinsicReceipt(
+            substrate=substrate,
+            extrinsic_hash=extrinsic_hash,
+            block_hash=block_hash,
+            finalized=finalized,
+        )
+        # loads the triggered events off the loop, so the receipt can be
+        # inspected without further RPC calls
+        is_success = await self._run_sync(lambda _: response.is_success)
+        if not is_success:
+            raise ChainTransactionError(
+                response.error_message,  # type: ignore
+                response,  # type: ignore
+            )
+        return response
@@ -1,5 +1,6 @@
 import os
 import re
+import time
 from dataclasses import dataclass
 from getpass import getpass
 from typing import Any, Callable, Mapping, TypeVar, cast
@@ -14,7 +15,12 @@ from rich.table import Table
 from torustrateinterface import Keypair
 from typer import Context
 
-from torusdk._common import CID_REGEX, TorusSettings, get_node_url
+from torusdk._common import (
+    CID_REGEX,
+    TorusSettings,
+    get_available_nodes,
+    get_node_url,
+)
 from torusdk.balance import dict_from_nano, from_rems, to_rems
 from torusdk.client import TorusClient
 from torusdk.errors import InvalidPasswordError, PasswordNotProvidedError
@@ -24,6 +30,7 @@ from torusdk.key import (
     load_keypair,
     resolve_key_ss58,
 )
+from torusdk.pool import ReconnectPolicy
 from torusdk.types.types import (
     AgentInfoWithOptionalBalance,
     Ss58Address,
@@ -153,22 +160,32 @@ class CustomCtx:
         use_testnet = self.get_use_testnet()
         return get_node_url(self.settings, use_testnet=use_testnet)
 
+    def get_node_urls(self) -> list[str]:
+        use_testnet = self.get_use_testnet()
+        return get_available_nodes(self.settings, use_testnet=use_testnet)
+
     def com_client(self) -> TorusClient:
         if self._com_client is None:
-            node_url = self.get_node_url()
-            self.info(f"Using node: {node_url}")
-            for _ in range(5):
+            node_urls = self.get_node_urls()
+            self.info(f"Using nodes: {', '.join(node_urls)}")
+            backoff = ReconnectPolicy(base_delay=0.5)
+            attempts = 5
+            for attempt in range(attempts):
                 try:
                     self._com_client = TorusClient(
-                        url=node_url,
+                        url=node_urls,
                         num_connections=1,
                         wait_for_finalization=False,
                         timeout=65,
+                        reconnect_policy=backoff,
                     )
                 except Exception:
-                    self.info(f"Failed to connect to node: {node_url}")
-                    node_url = self.get_node_url()
-                    self.info(f"Will retry with node {node_url}")
+                    self.info("Failed to connect to any node")
+                    if attempt == attempts - 1:
+                        break
+                    delay = backoff.delay(attempt)
+                    self.info(f"Will retry in {delay:.1f}s")
+                    time.sleep(delay)
                     continue
                 else:
                     break
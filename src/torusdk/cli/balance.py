@@ -75,8 +75,9 @@ def show(
     key_address = context.resolve_ss58(key)
 
     with context.progress_status(f"Getting value of key {key_address}..."):
-        staked_balance = sum(client.get_stakingto(key=key_address).values())
-        free_balance = client.get_balance(key_address)
+        snapshot = client.snapshot()
+        staked_balance = sum(snapshot.get_stakingto(key=key_address).values())
+        free_balance = snapshot.get_balance(key_address)
         balance_sum = free_balance + staked_balance
 
     print_table_from_plain_dict(
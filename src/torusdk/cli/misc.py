@@ -1,5 +1,3 @@
-from typing import cast
-
 import typer
 from typer import Context
 
@@ -12,7 +10,6 @@ from torusdk.cli._common import (
 from torusdk.client import TorusClient
 from torusdk.key import local_key_adresses
 from torusdk.misc import get_map_modules
-from torusdk.types.types import Ss58Address
 
 misc_app = typer.Typer(no_args_is_help=True)
 
@@ -22,13 +19,9 @@ def circulating_tokens(c_client: TorusClient) -> int:
     Gets total circulating supply
     """
 
-    # with c_client.get_conn(init=True) as substrate:
-    #     block_hash = substrate.get_block_hash()
-    # TODO: use pydantic models
-    block_hash = c_client.get_block()["header"]["hash"]  # type: ignore
-    block_hash = cast(Ss58Address, block_hash)
-    total_balance = c_client.get_total_free_issuance(block_hash=block_hash)
-    total_stake = c_client.get_total_stake(block_hash=block_hash)
+    snapshot = c_client.snapshot()
+    total_balance = snapshot.get_total_free_issuance()
+    total_stake = snapshot.get_total_stake()
     return total_stake + total_balance
 
 
@@ -1,20 +1,63 @@
-import gc
-import json
-import queue
+import itertools
 import threading
-from concurrent.futures import Future, ThreadPoolExecutor
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from contextlib import contextmanager
-from copy import deepcopy
 from dataclasses import dataclass
-from time import sleep
-from typing import Any, Mapping, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    Literal,
+    Mapping,
+    Sequence,
+    TypeVar,
+)
 
-import websocket
+from scalecodec.base import ScaleBytes
 from torustrateinterface import ExtrinsicReceipt, Keypair, SubstrateInterface
 from torustrateinterface.storage import StorageKey
 
 from torusdk._common import transform_stake_dmap
-from torusdk.errors import ChainTransactionError, NetworkQueryError
+from torusdk.codec import DEFAULT_CODEC, JsonCodec, hex_list_size, json_size
+from torusdk.decoding import (
+    DecodeExecutor,
+    DecoderRegistry,
+    InlineDecodeExecutor,
+    StorageDecoder,
+)
+from torusdk.diff import MapDiff
+from torusdk.errors import (
+    ChainTransactionError,
+    NetworkError,
+    NetworkQueryError,
+    NetworkTimeoutError,
+)
+from torusdk.memory import MemoryPolicy, NeverCollect
+from torusdk.metadata_cache import METADATA_CACHE_DIR
+from torusdk.pool import (
+    CONNECTION_ERRORS,
+    IDLE_TIMEOUT,
+    OVERSIZED_ERROR_CODES,
+    AdaptiveChunkSize,
+    BoundedExecutor,
+    ConnectionContainer,
+    ConnectionLiveness,
+    ConnectionPool,
+    EndpointStats,
+    ReconnectPolicy,
+)
+from torusdk.storage_cache import STORAGE_CACHE_BYTES, DiskSpill, StorageCache
+from torusdk.transport import (
+    RESPONSE_TIMEOUT,
+    HttpTransport,
+    MultiplexedWebsocket,
+    TrafficStats,
+    recv_json,
+    send_json,
+)
 from torusdk.types.proposal import Emission
 from torusdk.types.types import (
     Agent,
@@ -26,56 +69,80 @@ from torusdk.types.types import (
 # TODO: InsufficientBalanceError, MismatchedLengthError etc
 
 MAX_REQUEST_SIZE = 9_000_000
-
-
-@dataclass
-class ConnectionContainer:
-    substrate: SubstrateInterface
-    stop_event: threading.Event
-    lock: threading.Lock
+MAX_KEYS_PER_REQUEST = 35_000
+"""Storage keys per `state_queryStorageAt` request nodes accept by default."""
+KEYS_PAGE_SIZE = 1000
+"""Keys per `state_getKeysPaged` page, the most nodes serve at once."""
+MAX_PAGES_IN_FLIGHT = 4
+MIN_WORKERS = 4
+"""Threads fanning out multiplexed storage reads, however few connections."""
+CACHED_KEY_METHODS = ("state_getKeysPaged",)
+"""
+Key enumerations served from the storage cache when pinned to a block. Only
+pages are: a whole map enumerated by `state_getKeys` would be one large entry,
+split again on every hit, evicting many values at once.
+"""
+
+
+def _enumeration_key(method: str, params: list[Any]) -> str:
+    """The storage cache key of a key enumeration, without its block hash"""
+    return f"{method}{params[:-1]!r}"
+
+
+def _is_oversized(error: NetworkQueryError) -> bool:
+    """
+    Whether the node rejected a request, or its response, as too big.
+    """
+    details = error.args[0] if error.args else None
+    return (
+        isinstance(details, dict)
+        and details.get("code") in OVERSIZED_ERROR_CODES  # type: ignore
+    )
 
 
 @dataclass
 class Chunk:
     batch_requests: list[tuple[Any, Any]]
     prefix_list: list[list[str]]
-    fun_params: list[tuple[Any, Any, Any, Any, str]]
-
+    decoders: list[StorageDecoder]
 
-T1 = TypeVar("T1")
-T2 = TypeVar("T2")
 
+def _split_chunks(chunks: list[Chunk], max_keys: int) -> list[Chunk]:
+    """
+    Moves the requests of more than `max_keys` keys to chunks of their
+    own, each over a slice of the key list.
+    """
+    split_chunk_info: list[Chunk] = []
+    for chunk in chunks:
+        if all(
+            len(params[0]) <= max_keys for _, params in chunk.batch_requests
+        ):
+            split_chunk_info.append(chunk)
+            continue
+        kept = Chunk([], [], [])
+        slices: list[Chunk] = []
+        for request, prefix, decoder in zip(
+            chunk.batch_requests, chunk.prefix_list, chunk.decoders
+        ):
+            method, (keys, *other_params) = request
+            if len(keys) <= max_keys:
+                kept.batch_requests.append(request)
+                kept.prefix_list.append(prefix)
+                kept.decoders.append(decoder)
+                continue
+            for i in range(0, len(keys), max_keys):
+                key_slice = keys[i : i + max_keys]
+                sliced = (method, [key_slice, *other_params])
+                slices.append(Chunk([sliced], [prefix], [decoder]))
+        if kept.batch_requests:
+            split_chunk_info.append(kept)
+        split_chunk_info.extend(slices)
+    return split_chunk_info
 
-def send_heartbeat(
-    si: SubstrateInterface,
-    stop: threading.Event,
-    lock: threading.Lock,
-):
-    while not stop.is_set():
-        # uses torustrateinterface wrapper because its very stateful
-        # and we could mess with something by directly using the websocket
-        with lock:
-            _ = si.websocket.pong(b"")  # type: ignore
-        sleep(11)  # Send heartbeat every 30 seconds
-
-
-def _instantiate_substrateinterface(
-    url: str, ws_options: dict[str, bool | int], lock: threading.Lock
-):
-    ws = websocket.WebSocket()
-    ws.connect(url)  # type: ignore
-    stop_event = threading.Event()
-    si = SubstrateInterface(websocket=ws, ws_options=ws_options)
-    heartbeat_thread = threading.Thread(
-        target=send_heartbeat, args=(si, stop_event, lock), daemon=True
-    )
-    heartbeat_thread.start()
 
-    return ConnectionContainer(
-        si,
-        stop_event,
-        lock,
-    )
+T = TypeVar("T")
+T1 = TypeVar("T1")
+T2 = TypeVar("T2")
 
 
 class TorusClient:
@@ -93,44 +160,212 @@ class TorusClient:
     ```
 
     Raises:
-        AssertionError: If the maximum connections value is less than or equal
-          to zero.
+        AssertionError: If the minimum connections value is less than or equal
+          to zero, or greater than the maximum.
     """
 
     wait_for_finalization: bool
-    _num_connections: int
-    _connection_queue: queue.Queue[ConnectionContainer]
+    memory_policy: MemoryPolicy
+    reconnect_policy: ReconnectPolicy
+    decode_executor: DecodeExecutor
+    chunk_size: AdaptiveChunkSize
+    executor: BoundedExecutor
+    storage_cache: StorageCache | None
+    codec: JsonCodec
+    traffic: TrafficStats
+    _pool: ConnectionPool
     _ws_options: dict[str, int]
-    url: str
+    _timeout: int | None
+    _multiplex: bool
+    _multiplexed: MultiplexedWebsocket | None
+    _transport: Literal["websocket", "http"]
+    _http: dict[str, HttpTransport]
+    _decoders: DecoderRegistry
 
     def __init__(
         self,
-        url: str,
+        url: str | Sequence[str],
         num_connections: int = 1,
         wait_for_finalization: bool = False,
         timeout: int | None = None,
+        multiplex: bool = False,
+        min_connections: int = 1,
+        idle_timeout: float | None = IDLE_TIMEOUT,
+        prewarm: bool = False,
+        metadata_cache_dir: str | None = METADATA_CACHE_DIR,
+        memory_policy: MemoryPolicy | None = None,
+        reconnect_policy: ReconnectPolicy | None = None,
+        codec: JsonCodec = DEFAULT_CODEC,
+        max_frame_size: int | None = None,
+        max_message_size: int | None = None,
+        recv_buffer_size: int | None = None,
+        transport: Literal["websocket", "http"] = "websocket",
+        decode_executor: DecodeExecutor | None = None,
+        max_keys_per_request: int = MAX_KEYS_PER_REQUEST,
+        max_workers: int | None = None,
+        storage_cache_bytes: int | None = STORAGE_CACHE_BYTES,
+        storage_spill_path: str | None = None,
     ):
         """
         Args:
-            url: The URL of the network node to connect to.
-            num_connections: The number of websocket connections to be opened.
-        """
-        assert num_connections > 0
-        self._num_connections = num_connections
+            url: The URL of the network node to connect to, or a list of
+              node URLs to spread connections over. Requests are then routed
+              to the node with the best recent latency and error rate, and
+              fail over to the others when a socket dies.
+            num_connections: The maximum number of websocket connections to
+              be opened. Connections are opened on demand, when every open
+              one is busy.
+            multiplex: Send batched RPC requests over a single shared
+              websocket, demultiplexing responses by JSON-RPC id, instead of
+              holding a pooled connection for each round trip.
+            min_connections: The number of connections opened upfront and
+              kept open while idle.
+            idle_timeout: Seconds after which an idle connection above
+              `min_connections` is closed. None keeps them open.
+            prewarm: Open all `num_connections` upfront, in parallel.
+            metadata_cache_dir: Where to cache runtime metadata on disk,
+              keyed by genesis hash and spec version, so fresh processes
+              skip downloading it. None disables the cache.
+            memory_policy: When leasing a connection runs a full garbage
+              collection. Defaults to `NeverCollect`, leaving it to CPython.
+            reconnect_policy: Backoff between attempts to reopen dead
+              connections and retry failed requests. Nodes that keep failing
+              are additionally skipped by a per-node circuit breaker.
+            codec: The JSON codec of batched RPC requests. Defaults to the
+              fastest one installed: orjson, ujson, then the standard
+              library.
+            max_frame_size: Split outgoing messages into websocket frames of
+              at most this many bytes, for proxies limiting frame sizes.
+            max_message_size: The largest message accepted from the nodes,
+              in bytes. Larger ones close the connection and fail the
+              requests waiting on it. None accepts any size.
+            recv_buffer_size: Kernel receive buffer size of the sockets, in
+              bytes. Raising it speeds up full-map reads from remote nodes,
+              as it bounds the TCP window.
+            transport: How batched storage reads (`state_getKeys`,
+              `state_queryStorageAt`) are sent. "http" POSTs them to the
+              HTTP(S) JSON-RPC endpoint of the nodes, served on the same
+              port as their websocket, keeping up to `num_connections`
+              connections alive per node. Stateless requests are easier to
+              load-balance, and no socket is pinned to a thread. Metadata,
+              subscriptions and extrinsics always go over websockets.
+            decode_executor: Where storage map entries are decoded.
+              Defaults to `InlineDecodeExecutor`, decoding on the thread that
+              fetched them. A `ProcessDecodeExecutor` spreads decoding over
+              several cores. It is not closed by `close`.
+            max_keys_per_request: The most storage keys read by a single
+              `state_queryStorageAt` request, for nodes configured with
+              other limits. Below it, the keys per request adapt to the
+              node's response times and size limits, see `chunk_size`.
+            max_workers: The threads sending the requests of chunked and
+              paged storage reads, shared by every call. Defaults to
+              `num_connections`, as more threads would only wait for a
+              connection, but to at least `MIN_WORKERS` with `multiplex`,
+              where batches don't hold a connection and are in flight
+              together on the shared socket. Their load is in
+              `executor.stats`.
+            storage_cache_bytes: Memory kept for raw storage values and pages
+              of storage keys read at a block hash, which never change, so
+              reading them again at that block doesn't reach a node. None
+              disables the cache. Hit rates are in `storage_cache.stats`.
+            storage_spill_path: An SQLite file to move the entries evicted
+              from `storage_cache` to, instead of dropping them, e.g.
+              `STORAGE_SPILL_PATH`.
+
+        The websocket library doesn't implement permessage-deflate, so
+        compression is only available on `AsyncTorusClient`. Traffic volume
+        is counted in `traffic`.
+        """
+        assert 0 < min_connections <= num_connections
+        assert transport in ("websocket", "http")
+        assert max_keys_per_request > 0
+        assert storage_spill_path is None or storage_cache_bytes is not None
+        urls = [url] if isinstance(url, str) else list(url)
         self.wait_for_finalization = wait_for_finalization
-        self._connection_queue = queue.Queue(num_connections)
-        self.url = url
-
-        for _ in range(num_connections):
-            ws_options: dict[str, int] = {}
-            if timeout is not None:
-                ws_options["timeout"] = timeout
-            self._ws_options = ws_options
-            self._connection_queue.put(
-                _instantiate_substrateinterface(
-                    url, ws_options, threading.Lock()
-                )
-            )
+        self.memory_policy = memory_policy or NeverCollect()
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy()
+        self.decode_executor = decode_executor or InlineDecodeExecutor()
+        self.chunk_size = AdaptiveChunkSize(max_keys_per_request)
+        if max_workers is None:
+            max_workers = num_connections
+            if multiplex and transport == "websocket":
+                max_workers = max(max_workers, MIN_WORKERS)
+        self.executor = BoundedExecutor(max_workers, "torus-client")
+        self.storage_cache = None
+        if storage_cache_bytes is not None:
+            spill = None
+            if storage_spill_path is not None:
+                spill = DiskSpill(storage_spill_path)
+            self.storage_cache = StorageCache(storage_cache_bytes, spill)
+        self.codec = codec
+        self._timeout = timeout
+        self._multiplex = multiplex
+        self._multiplexed = None
+        self._multiplexed_lock = threading.Lock()
+        self._transport = transport
+        self._http = {}
+        self._http_lock = threading.Lock()
+        self._decoders = DecoderRegistry()
+
+        ws_options: dict[str, int] = {}
+        if timeout is not None:
+            ws_options["timeout"] = timeout
+        if max_frame_size is not None:
+            ws_options["max_frame_size"] = max_frame_size
+        if max_message_size is not None:
+            ws_options["max_message_size"] = max_message_size
+        if recv_buffer_size is not None:
+            ws_options["recv_buffer_size"] = recv_buffer_size
+        self._ws_options = ws_options
+        self.traffic = TrafficStats()
+        self._pool = ConnectionPool(
+            urls,
+            num_connections,
+            ws_options,
+            min_connections=min_connections,
+            idle_timeout=idle_timeout,
+            prewarm=prewarm,
+            metadata_cache_dir=metadata_cache_dir,
+            traffic=self.traffic,
+        )
+
+    @property
+    def url(self) -> str:
+        """
+        The URL of the healthiest network node.
+        """
+        return self._pool.best_url()
+
+    @property
+    def urls(self) -> list[str]:
+        """
+        The URLs of every network node in the connection pool.
+        """
+        return list(self._pool.urls)
+
+    @property
+    def endpoints(self) -> list[EndpointStats]:
+        """
+        Rolling latency and error stats of each network node, healthiest
+        first.
+        """
+        return self._pool.endpoints
+
+    @property
+    def circuit_states(self) -> dict[str, str]:
+        """
+        The circuit breaker state of each network node: closed, open or
+        half-open.
+        """
+        return self._pool.circuit_states()
+
+    @property
+    def liveness(self) -> list[ConnectionLiveness]:
+        """
+        Liveness of each pooled connection, as seen by the shared heartbeat
+        scheduler.
+        """
+        return self._pool.liveness()
 
     @property
     def connections(self) -> int:
@@ -138,16 +373,90 @@ class TorusClient:
         Gets the maximum allowed number of simultaneous connections to the
         network node.
         """
-        return self._num_connections
+        return self._pool.max_connections
+
+    @property
+    def open_connections(self) -> int:
+        """
+        The number of websocket connections currently open, leased or idle.
+        """
+        return self._pool.size
+
+    def close(self):
+        """
+        Closes the pooled connections, the multiplexed websocket and the HTTP
+        connections, if any, cancels the queued requests and drops the
+        storage cache.
+        """
+        self.executor.shutdown()
+        if self.storage_cache is not None:
+            self.storage_cache.close()
+        self._pool.close()
+        with self._http_lock:
+            for http in self._http.values():
+                http.close()
+            self._http = {}
+        with self._multiplexed_lock:
+            if self._multiplexed is not None:
+                self._multiplexed.close()
+                self._multiplexed = None
+
+    def _prepare_conn(
+        self, conn: ConnectionContainer, init: bool
+    ) -> ConnectionContainer:
+        """
+        Reopens the socket of a leased connection if it died, failing over to
+        the next healthiest node when it can't be reached. Attempts are
+        spaced out by the reconnect policy.
+        """
+        failed = False
+        attempts = len(self._pool.urls) + 1
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.reconnect_policy.delay(attempt - 1))
+            try:
+                if failed or not (
+                    conn.substrate.websocket  # type: ignore
+                    and conn.substrate.websocket.connected  # type: ignore
+                ):
+                    conn = self._pool.reconnect(conn, failed=failed)
+                if init:
+                    conn.substrate.init_runtime()  # type: ignore
+                return conn
+            except CONNECTION_ERRORS:
+                self._pool.mark_dead(conn)
+                failed = True
+            except NetworkError:
+                if attempt == attempts - 1:
+                    raise
+        time.sleep(self.reconnect_policy.delay(attempts - 1))
+        return self._pool.reconnect(conn, failed=True)
+
+    @contextmanager
+    def _lease(
+        self, timeout: float | None = None, init: bool = False
+    ) -> Generator[ConnectionContainer, None, None]:
+        conn = self._pool.acquire(timeout)
+        try:
+            conn = self._prepare_conn(conn, init)
+            self.memory_policy.on_lease()
+            with conn.lock:
+                yield conn
+        except CONNECTION_ERRORS:
+            # reopened on its next lease
+            self._pool.mark_dead(conn)
+            raise
+        finally:
+            self._pool.release(conn)
 
     @contextmanager
     def get_conn(self, timeout: float | None = None, init: bool = False):
         """
         Context manager to get a connection from the pool.
 
-        Tries to get a connection from the pool queue. If the queue is empty,
-        it blocks for `timeout` seconds until a connection is available. If
-        `timeout` is None, it blocks indefinitely.
+        Tries to get an idle connection from the pool, healthiest node first.
+        If there is none, it blocks for `timeout` seconds until a connection
+        is available. If `timeout` is None, it blocks indefinitely.
 
         Args:
             timeout: The maximum time in seconds to wait for a connection.
@@ -159,24 +468,155 @@ class TorusClient:
             QueueEmptyError: If no connection is available within the timeout
               period.
         """
-        conn = self._connection_queue.get(timeout=timeout)
-        if init:
-            conn.substrate.init_runtime()  # type: ignore
-        try:
-            gc.collect()
-            if conn.substrate.websocket and conn.substrate.websocket.connected:  # type: ignore
-                with conn.lock:
-                    yield conn.substrate
-            else:
-                # reconnects
-                conn.stop_event.set()
-                conn = _instantiate_substrateinterface(
-                    self.url, self._ws_options, threading.Lock()
+        with self._lease(timeout, init) as conn:
+            yield conn.substrate
+
+    @contextmanager
+    def _get_conn_at(self, block_hash: str | None):
+        """
+        Gets a connection from the pool with its runtime initialized at
+        `block_hash`, or at the chain head if None.
+
+        Connections remember the block they were initialized at, so pinned
+        reads at that block don't reach the node again.
+        """
+        with self.get_conn(init=block_hash is None) as substrate:
+            if block_hash is not None:
+                substrate.init_runtime(block_hash=block_hash)  # type: ignore
+            yield substrate
+
+    def _with_failover(
+        self, fn: Callable[[SubstrateInterface], T], init: bool = False
+    ) -> T:
+        """
+        Runs the read-only `fn` on a pooled connection, and again on the next
+        healthiest node if the socket dies mid-request, backing off between
+        attempts. The latency of successful runs is recorded for routing.
+        """
+        attempts = len(self._pool.urls) + 1
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.reconnect_policy.delay(attempt - 1))
+            try:
+                with self._lease(init=init) as conn:
+                    start = time.monotonic()
+                    result = fn(conn.substrate)
+                    self._pool.record_success(
+                        conn.url, time.monotonic() - start
+                    )
+                    return result
+            except CONNECTION_ERRORS:
+                if attempt == attempts - 1:
+                    raise
+        raise AssertionError("unreachable")
+
+    def get_multiplexed(self) -> MultiplexedWebsocket:
+        """
+        Gets the shared multiplexed websocket, reopening it on the healthiest
+        node if it was closed. Subscriptions are made on it, see
+        `torusdk.live.LiveMap`.
+
+        Raises:
+            NetworkError: If no node can be reached.
+        """
+        with self._multiplexed_lock:
+            if self._multiplexed is None or not self._multiplexed.connected:
+                self._multiplexed = self._open_multiplexed()
+            return self._multiplexed
+
+    def _open_multiplexed(self) -> MultiplexedWebsocket:
+        """
+        Opens a multiplexed websocket on the healthiest node that can be
+        reached, recording the failures of the others.
+        """
+        tried: list[str] = []
+        for _ in range(len(self._pool.urls)):
+            url = self._pool.best_url(exclude=tried)
+            try:
+                return MultiplexedWebsocket(
+                    url, self.codec, self._ws_options, self.traffic
                 )
-                with conn.lock:
-                    yield conn.substrate
-        finally:
-            self._connection_queue.put(conn)
+            except CONNECTION_ERRORS:
+                self._pool.record_failure(url)
+                tried.append(url)
+        raise NetworkError(f"Could not connect to any of {self._pool.urls}")
+
+    def _send_multiplexed(
+        self, batch_payload: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Sends a batch on the multiplexed websocket, and again on the next
+        healthiest node if the connection dies before it is answered,
+        backing off between attempts.
+        """
+        timeout = RESPONSE_TIMEOUT if self._timeout is None else self._timeout
+        attempts = len(self._pool.urls) + 1
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.reconnect_policy.delay(attempt - 1))
+            multiplexed = self.get_multiplexed()
+            start = time.monotonic()
+            try:
+                messages = [
+                    future.result(timeout)
+                    for future in multiplexed.send(batch_payload)
+                ]
+            except FutureTimeoutError:
+                raise NetworkTimeoutError(
+                    f"No response after {timeout} seconds"
+                )
+            except NetworkQueryError:
+                # the node is fine, the request isn't
+                raise
+            except NetworkError:
+                self._pool.record_failure(multiplexed.url)
+                if attempt == attempts - 1:
+                    raise
+                continue
+            self._pool.record_success(multiplexed.url, time.monotonic() - start)
+            return messages
+        raise AssertionError("unreachable")
+
+    def _get_http(self, url: str) -> HttpTransport:
+        with self._http_lock:
+            if url not in self._http:
+                self._http[url] = HttpTransport(
+                    url,
+                    self.codec,
+                    pool_size=self._pool.max_connections,
+                    timeout=self._timeout,
+                    traffic=self.traffic,
+                )
+            return self._http[url]
+
+    def _send_http(
+        self, batch_payload: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        POSTs a batch to the healthiest node, and again to the next
+        healthiest one if it fails, backing off between attempts.
+        """
+        tried: list[str] = []
+        attempts = len(self._pool.urls) + 1
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(self.reconnect_policy.delay(attempt - 1))
+            url = self._pool.best_url(exclude=tried)
+            start = time.monotonic()
+            try:
+                messages = self._get_http(url).send(batch_payload)
+            except NetworkQueryError:
+                # the node is fine, the request isn't
+                raise
+            except NetworkError:
+                self._pool.record_failure(url)
+                tried.append(url)
+                if attempt == attempts - 1:
+                    raise
+                continue
+            self._pool.record_success(url, time.monotonic() - start)
+            return messages
+        raise AssertionError("unreachable")
 
     def _get_storage_keys(
         self,
@@ -188,7 +628,7 @@ class TorusClient:
         prefix_list: list[Any] = []
 
         key_idx = 0
-        with self.get_conn(init=True) as substrate:
+        with self._get_conn_at(block_hash) as substrate:
             for function, params in queries:
                 storage_key = StorageKey.create_from_storage_function(  # type: ignore
                     storage,
@@ -204,54 +644,30 @@ class TorusClient:
                 key_idx += 1
         return send, prefix_list
 
-    def _get_lists(
+    def _get_decoders(
         self,
         storage_module: str,
         queries: list[tuple[str, list[Any]]],
         substrate: SubstrateInterface,
-    ) -> list[tuple[Any, Any, Any, Any, str]]:
+    ) -> list[StorageDecoder]:
         """
-        Generates a list of tuples containing parameters for each storage function based on the given functions and substrate interface.
+        Gets the compiled decoder of each storage map query, at the runtime
+        version `substrate` is initialized to.
 
         Args:
-            functions (dict[str, list[query_call]]): A dictionary where keys are storage module names and values are lists of tuples.
-                Each tuple consists of a storage function name and its parameters.
-            substrate: An instance of the SubstrateInterface class used to interact with the substrate.
+            storage_module: The pallet of the storage functions.
+            queries: Storage function names and their fixed leading keys.
+            substrate: An initialized SubstrateInterface.
 
         Returns:
-            A list of tuples in the format `(value_type, param_types, key_hashers, params, storage_function)` for each storage function in the given functions.
-
-        Example:
-            >>> _get_lists(
-                    functions={'storage_module': [('storage_function', ['param1', 'param2'])]},
-                    substrate=substrate_instance
-                )
-            [('value_type', 'param_types', 'key_hashers', ['param1', 'param2'], 'storage_function'), ...]
+            A decoder for each query, in order.
         """
-
-        function_parameters: list[tuple[Any, Any, Any, Any, str]] = []
-
-        metadata_pallet = substrate.metadata.get_metadata_pallet(  # type: ignore
-            storage_module
-        )
-        for storage_function, params in queries:
-            storage_item = metadata_pallet.get_storage_function(  # type: ignore
-                storage_function
-            )
-
-            value_type = storage_item.get_value_type_string()  # type: ignore
-            param_types = storage_item.get_params_type_string()  # type: ignore
-            key_hashers = storage_item.get_param_hashers()  # type: ignore
-            function_parameters.append(
-                (
-                    value_type,
-                    param_types,
-                    key_hashers,
-                    params,
-                    storage_function,
-                )  # type: ignore
+        return [
+            self._decoders.get(
+                substrate, storage_module, storage_function, params
             )
-        return function_parameters
+            for storage_function, params in queries
+        ]
 
     def _send_batch(
         self,
@@ -276,16 +692,39 @@ class TorusClient:
             No explicit return value as results are appended to the provided 'results' list.
         """
         results: list[str | dict[Any, Any]] = []
-        with self.get_conn(init=True) as substrate:
+        if self._multiplex or self._transport == "http":
+            if self._transport == "http":
+                messages = self._send_http(batch_payload)
+            else:
+                messages = self._send_multiplexed(batch_payload)
+            for message in messages:
+                if "error" in message:
+                    raise NetworkQueryError(message["error"])
+                if extract_result:
+                    try:
+                        results.append(message["result"])
+                    except Exception:
+                        raise RuntimeError(
+                            f"Error extracting result from message: {message}"
+                        )
+                else:
+                    results.append(message)
+            return results
+
+        def send(substrate: SubstrateInterface):
+            results: list[str | dict[Any, Any]] = []
             try:
-                substrate.websocket.send(  #  type: ignore
-                    json.dumps(batch_payload)
+                send_json(
+                    substrate.websocket,  # type: ignore
+                    self.codec,
+                    batch_payload,
                 )
             except NetworkQueryError:
                 pass
             while len(results) < len(request_ids):
-                received_messages = json.loads(
-                    substrate.websocket.recv()  # type: ignore
+                received_messages = recv_json(
+                    substrate.websocket,  # type: ignore
+                    self.codec,
                 )
                 if isinstance(received_messages, dict):
                     received_messages: list[dict[Any, Any]] = [
@@ -310,11 +749,94 @@ class TorusClient:
 
             return results
 
+        return self._with_failover(send, init=True)
+
+    def _send_cached(
+        self,
+        batch_payload: list[Any],
+        request_ids: list[int],
+        extract_result: bool = True,
+    ) -> list[Any]:
+        """
+        Sends a batch of requests like `_send_batch`, serving the storage
+        values and pages of storage keys pinned to a block hash from the
+        storage cache, and caching those the node returns.
+
+        Only the keys of a `state_queryStorageAt` request that aren't cached
+        are sent, and a batch entirely served from the cache isn't sent.
+        """
+        cache = self.storage_cache
+        if cache is None or not extract_result:
+            return self._send_batch(
+                batch_payload=batch_payload,
+                request_ids=request_ids,
+                extract_result=extract_result,
+            )
+        results: list[Any] = [None] * len(batch_payload)
+        cached_values: dict[int, dict[str, str | None]] = {}
+        send_payload: list[Any] = []
+        send_ids: list[int] = []
+        send_indexes: list[int] = []
+        for index, (request, request_id) in enumerate(
+            zip(batch_payload, request_ids)
+        ):
+            method, params = request["method"], request["params"]
+            block_hash = params[-1] if params else None
+            if block_hash and method == "state_queryStorageAt":
+                keys: list[str] = params[0]
+                found, missing = cache.lookup(block_hash, keys)
+                if not missing:
+                    changes = [[key, found[key]] for key in keys]
+                    results[index] = [{"block": block_hash, "changes": changes}]
+                    continue
+                cached_values[index] = found
+                request = {**request, "params": [missing, block_hash]}
+            elif block_hash and method in CACHED_KEY_METHODS:
+                key = _enumeration_key(method, params)
+                found, _ = cache.lookup(block_hash, [key])
+                if key in found:
+                    joined = found[key]
+                    results[index] = joined.split(",") if joined else []
+                    continue
+            send_payload.append(request)
+            send_ids.append(request_id)
+            send_indexes.append(index)
+        if not send_payload:
+            return results
+        response = self._send_batch(
+            batch_payload=send_payload, request_ids=send_ids
+        )
+        for index, request, result in zip(send_indexes, send_payload, response):
+            method, params = request["method"], request["params"]
+            block_hash = params[-1] if params else None
+            results[index] = result
+            if not block_hash:
+                continue
+            if method == "state_queryStorageAt":
+                fetched = [
+                    (key, value)
+                    for group in result  # type: ignore
+                    for key, value in group["changes"]  # type: ignore
+                ]
+                cache.store(block_hash, fetched)  # type: ignore
+                if index in cached_values:
+                    values = cached_values[index]
+                    values.update(fetched)  # type: ignore
+                    keys = batch_payload[index]["params"][0]
+                    changes = [
+                        [key, values[key]] for key in keys if key in values
+                    ]
+                    results[index] = [{"block": block_hash, "changes": changes}]
+            elif method in CACHED_KEY_METHODS:
+                key = _enumeration_key(method, params)
+                cache.store(block_hash, [(key, ",".join(result))])  # type: ignore
+        return results
+
     def _make_request_smaller(
         self,
         batch_request: list[tuple[T1, T2]],
         prefix_list: list[list[str]],
-        fun_params: list[tuple[Any, Any, Any, Any, str]],
+        decoders: list[StorageDecoder],
     ) -> tuple[list[list[tuple[T1, T2]]], list[Chunk]]:
         """
         Splits a batch of requests into smaller batches, each not exceeding the specified maximum size.
@@ -330,24 +852,27 @@ class TorusClient:
             >>> _make_request_smaller(batch_request=[('method1', 'params1'), ('method2', 'params2')], max_size=1000)
             [[('method1', 'params1')], [('method2', 'params2')]]
         """
-        assert len(prefix_list) == len(fun_params) == len(batch_request)
+        assert len(prefix_list) == len(decoders) == len(batch_request)
 
         def estimate_size(request: tuple[T1, T2]):
-            """Convert the batch request to a string and measure its length"""
-            return len(json.dumps(request))
+            """The encoded length of the request, from its key lengths"""
+            method, (keys, *other_params) = request  # type: ignore
+            size = json_size([method, other_params]) + hex_list_size(keys)  # type: ignore
+            # the comma after the keys
+            return size + 1 if other_params else size
 
         # Initialize variables
         result: list[list[tuple[T1, T2]]] = []
         current_batch = []
         current_prefix_batch = []
-        current_params_batch = []
+        current_decoders_batch = []
         current_size = 0
 
         chunk_list: list[Chunk] = []
 
         # Iterate through each request in the batch
-        for request, prefix, params in zip(
-            batch_request, prefix_list, fun_params
+        for request, prefix, decoder in zip(
+            batch_request, prefix_list, decoders
         ):
             request_size = estimate_size(request)
 
@@ -360,27 +885,27 @@ class TorusClient:
                     chunk = Chunk(
                         current_batch,
                         current_prefix_batch,
-                        current_params_batch,
+                        current_decoders_batch,
                     )
                     chunk_list.append(chunk)
                     result.append(current_batch)
 
                 current_batch = [request]
                 current_prefix_batch = [prefix]
-                current_params_batch = [params]
+                current_decoders_batch = [decoder]
                 current_size = request_size
             else:
                 # Otherwise, add to the current batch
                 current_batch.append(request)
                 current_size += request_size
                 current_prefix_batch.append(prefix)
-                current_params_batch.append(params)
+                current_decoders_batch.append(decoder)
 
         # Add the last batch if it's not empty
         if current_batch:
             result.append(current_batch)
             chunk = Chunk(
-                current_batch, current_prefix_batch, current_params_batch
+                current_batch, current_prefix_batch, current_decoders_batch
             )
             chunk_list.append(chunk)
 
@@ -413,37 +938,26 @@ class TorusClient:
             ['result1', 'result2', ...]
         """
 
-        chunk_results: list[Any] = []
-        # smaller_requests = self._make_request_smaller(batch_requests)
-        request_id = 0
-        with ThreadPoolExecutor() as executor:
-            futures: list[Future[list[str | dict[Any, Any]]]] = []
-            for chunk in [batch_requests]:
-                request_ids: list[int] = []
-                batch_payload: list[Any] = []
-                for method, params in chunk:
-                    request_id += 1
-                    request_ids.append(request_id)
-                    batch_payload.append(
-                        {
-                            "jsonrpc": "2.0",
-                            "method": method,
-                            "params": params,
-                            "id": request_id,
-                        }
-                    )
-
-                futures.append(
-                    executor.submit(
-                        self._send_batch,
-                        batch_payload=batch_payload,
-                        request_ids=request_ids,
-                        extract_result=extract_result,
-                    )
-                )
-            for future in futures:
-                resul = future.result()
-                chunk_results.append(resul)
+        request_ids: list[int] = []
+        batch_payload: list[Any] = []
+        for request_id, (method, params) in enumerate(batch_requests, 1):
+            request_ids.append(request_id)
+            batch_payload.append(
+                {
+                    "jsonrpc": "2.0",
+                    "method": method,
+                    "params": params,
+                    "id": request_id,
+                }
+            )
+        # a single batch, sent from the calling thread
+        chunk_results: list[Any] = [
+            self._send_cached(
+                batch_payload=batch_payload,
+                request_ids=request_ids,
+                extract_result=extract_result,
+            )
+        ]
         return chunk_results
 
     def _rpc_request_batch_chunked(
@@ -466,200 +980,309 @@ class TorusClient:
             ['result1', 'result2', ...]
         """
 
-        def split_chunks(
-            chunk: Chunk, chunk_info: list[Chunk], chunk_info_idx: int
-        ):
-            manhattam_chunks: list[tuple[Any, Any]] = []
-            mutaded_chunk_info = deepcopy(chunk_info)
-            max_n_keys = 35000
-            for query in chunk.batch_requests:
-                result_keys = query[1][0]
-                keys_amount = len(result_keys)
-                if keys_amount > max_n_keys:
-                    mutaded_chunk_info.pop(chunk_info_idx)
-                    for i in range(0, keys_amount, max_n_keys):
-                        new_chunk = deepcopy(chunk)
-                        splitted_keys = result_keys[i : i + max_n_keys]
-                        splitted_query = deepcopy(query)
-                        splitted_query[1][0] = splitted_keys
-                        new_chunk.batch_requests = [splitted_query]
-                        manhattam_chunks.append(splitted_query)
-                        mutaded_chunk_info.insert(chunk_info_idx, new_chunk)
-                else:
-                    manhattam_chunks.append(query)
-            return manhattam_chunks, mutaded_chunk_info
+        def halve(chunk: Chunk, keys: int) -> list[Chunk]:
+            if len(chunk.batch_requests) > 1:
+                half = len(chunk.batch_requests) // 2
+                return [
+                    Chunk(
+                        chunk.batch_requests[:half],
+                        chunk.prefix_list[:half],
+                        chunk.decoders[:half],
+                    ),
+                    Chunk(
+                        chunk.batch_requests[half:],
+                        chunk.prefix_list[half:],
+                        chunk.decoders[half:],
+                    ),
+                ]
+            return _split_chunks([chunk], (keys + 1) // 2)
+
+        request_ids = itertools.count(1)
+
+        def send_chunk(
+            chunk: Chunk,
+        ) -> list[tuple[Chunk, list[str | dict[Any, Any]]]]:
+            """
+            Sends a chunk, feeding its latency to the adaptive chunk size,
+            and halving it for as long as the node rejects it as too big.
+            """
+            ids: list[int] = []
+            batch_payload: list[Any] = []
+            for method, params in chunk.batch_requests:
+                request_id = next(request_ids)
+                ids.append(request_id)
+                batch_payload.append(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": method,
+                        "params": params,
+                        "id": request_id,
+                    }
+                )
+            keys = sum(len(params[0]) for _, params in chunk.batch_requests)
+            start = time.monotonic()
+            try:
+                result = self._send_cached(
+                    batch_payload=batch_payload,
+                    request_ids=ids,
+                    extract_result=extract_result,
+                )
+            except NetworkQueryError as e:
+                if not _is_oversized(e) or keys <= self.chunk_size.minimum:
+                    raise
+                self.chunk_size.record_oversized(keys)
+                return [
+                    sent
+                    for half in halve(chunk, keys)
+                    for sent in send_chunk(half)
+                ]
+            self.chunk_size.record_success(keys, time.monotonic() - start)
+            return [(chunk, result)]
 
         assert len(chunk_requests) > 0
-        mutated_chunk_info: list[Chunk] = []
+        split_chunk_info = _split_chunks(chunk_requests, self.chunk_size.size)
         chunk_results: list[Any] = []
-        # smaller_requests = self._make_request_smaller(batch_requests)
-        request_id = 0
-
-        with ThreadPoolExecutor() as executor:
-            futures: list[Future[list[str | dict[Any, Any]]]] = []
-            for idx, macro_chunk in enumerate(chunk_requests):
-                _, mutated_chunk_info = split_chunks(
-                    macro_chunk, chunk_requests, idx
-                )
-            for chunk in mutated_chunk_info:
-                request_ids: list[int] = []
-                batch_payload: list[Any] = []
-                for method, params in chunk.batch_requests:
-                    # for method, params in micro_chunk:
-                    request_id += 1
-                    request_ids.append(request_id)
-                    batch_payload.append(
-                        {
-                            "jsonrpc": "2.0",
-                            "method": method,
-                            "params": params,
-                            "id": request_id,
-                        }
-                    )
-                futures.append(
-                    executor.submit(
-                        self._send_batch,
-                        batch_payload=batch_payload,
-                        request_ids=request_ids,
-                        extract_result=extract_result,
-                    )
-                )
+        mutated_chunk_info: list[Chunk] = []
+
+        futures = [
+            self.executor.submit(send_chunk, chunk)
+            for chunk in split_chunk_info
+        ]
+        try:
             for future in futures:
-                resul = future.result()
-                chunk_results.append(resul)
+                for chunk, result in future.result():
+                    mutated_chunk_info.append(chunk)
+                    chunk_results.append(result)
+        finally:
+            # don't leave the rest of a failed read queued
+            for future in futures:
+                future.cancel()
         return chunk_results, mutated_chunk_info
 
+    def _submit_decode(
+        self,
+        response: list[str],
+        decoders: list[StorageDecoder],
+        prefix_list: list[Any],
+    ) -> list[tuple[str, Future[dict[Any, Any]]]]:
+        """
+        Submits the responses of a batch to the decode executor.
+
+        Returns:
+            The storage function name and decoded entries future of each
+            non-empty response.
+        """
+        assert len(response) == len(decoders) == len(prefix_list)
+        decoding: list[tuple[str, Future[dict[Any, Any]]]] = []
+        for res, decoder, prefix in zip(response, decoders, prefix_list):
+            if not res:
+                continue
+            res = res[0]
+            changes = res["changes"]  # type: ignore
+            decoding.append(
+                (
+                    decoder.storage_function,
+                    self.decode_executor.submit(decoder, changes, prefix),  # type: ignore
+                )
+            )
+        return decoding
+
+    @staticmethod
+    def _collect_decoded(
+        decoding: list[tuple[str, Future[dict[Any, Any]]]],
+    ) -> dict[str, dict[Any, Any]]:
+        result_dict: dict[str, dict[Any, Any]] = {}
+        for storage_function, future in decoding:
+            result_dict.setdefault(storage_function, {}).update(future.result())
+        return result_dict
+
     def _decode_response(
         self,
         response: list[str],
-        function_parameters: list[tuple[Any, Any, Any, Any, str]],
+        decoders: list[StorageDecoder],
         prefix_list: list[Any],
-        block_hash: str,
     ) -> dict[str, dict[Any, Any]]:
         """
         Decodes a response from the substrate interface and organizes the data into a dictionary.
 
         Args:
             response: A list of encoded responses from a substrate query.
-            function_parameters: A list of tuples containing the parameters for each storage function.
-            last_keys: A list of the last keys used in the substrate query.
+            decoders: The storage decoder of each response.
             prefix_list: A list of prefixes used in the substrate query.
-            substrate: An instance of the SubstrateInterface class.
-            block_hash: The hash of the block to be queried.
 
         Returns:
             A dictionary where each key is a storage function name and the value is another dictionary.
             This inner dictionary's key is the decoded key from the response and the value is the corresponding decoded value.
 
-        Raises:
-            ValueError: If an unsupported hash type is encountered in the `concat_hash_len` function.
-
         Example:
             >>> _decode_response(
                     response=[...],
-                    function_parameters=[...],
-                    last_keys=[...],
+                    decoders=[...],
                     prefix_list=[...],
-                    substrate=substrate_instance,
-                    block_hash="0x123..."
                 )
             {'storage_function_name': {decoded_key: decoded_value, ...}, ...}
         """
+        return self._collect_decoded(
+            self._submit_decode(response, decoders, prefix_list)
+        )
 
-        def get_item_key_value(
-            item_key: tuple[Any, ...] | Any,
-        ) -> tuple[Any, ...] | Any:
-            if isinstance(item_key, tuple):
-                return tuple(k.value for k in item_key)  # type: ignore
-            return item_key.value
-
-        def concat_hash_len(key_hasher: str) -> int:
-            """
-            Determines the length of the hash based on the given key hasher type.
-
-            Args:
-                key_hasher: The type of key hasher.
+    def _get_keys_page(
+        self,
+        prefix: str,
+        block_hash: str,
+        page_size: int,
+        start_key: str | None,
+    ) -> list[str]:
+        """
+        Enumerates up to `page_size` storage keys under `prefix`, after
+        `start_key`.
+        """
+        (keys,) = self._rpc_request_batch(
+            [
+                (
+                    "state_getKeysPaged",
+                    [prefix, page_size, start_key, block_hash],
+                )
+            ]
+        )[0]
+        return keys  # type: ignore
 
-            Returns:
-                The length of the hash corresponding to the given key hasher type.
+    def _describe_maps(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None,
+    ) -> tuple[list[tuple[str, list[Any]]], list[Any], list[StorageDecoder]]:
+        """
+        Gets the `state_getKeys` requests, storage prefixes and decoders of
+        the storage map queries of every module, in order.
+        """
+        send: list[tuple[str, list[Any]]] = []
+        prefix_list: list[Any] = []
+        decoders: list[StorageDecoder] = []
+        for storage, queries in functions.items():
+            storage_send, storage_prefixes = self._get_storage_keys(
+                storage, queries, block_hash
+            )
+            with self._get_conn_at(block_hash) as substrate:
+                decoders += self._get_decoders(storage, queries, substrate)
+            send += storage_send
+            prefix_list += storage_prefixes
+        return send, prefix_list, decoders
 
-            Raises:
-                ValueError: If the key hasher type is not supported.
+    def describe_maps(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str,
+    ) -> list[tuple[str, StorageDecoder]]:
+        """
+        Gets the storage prefixes of storage map queries, and the decoders of
+        the keys and values under them.
 
-            Example:
-                >>> concat_hash_len("Blake2_128Concat")
-                16
-            """
+        Args:
+            functions: A dictionary mapping module names to lists of storage
+              maps and their fixed leading keys, as for `query_batch_map`.
+            block_hash: The block whose runtime the maps are described with.
 
-            if key_hasher == "Blake2_128Concat":
-                return 16
-            elif key_hasher == "Twox64Concat":
-                return 8
-            elif key_hasher == "Identity":
-                return 0
-            else:
-                raise ValueError("Unsupported hash type")
+        Returns:
+            The prefix and decoder of every map queried, in order.
+        """
+        _, prefix_list, decoders = self._describe_maps(functions, block_hash)
+        return list(zip(prefix_list, decoders))
 
-        assert len(response) == len(function_parameters) == len(prefix_list)
-        result_dict: dict[str, dict[Any, Any]] = {}
-        for res, fun_params_tuple, prefix in zip(
-            response, function_parameters, prefix_list
+    def _query_map_pages(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str,
+        page_size: int,
+        max_pages_in_flight: int = MAX_PAGES_IN_FLIGHT,
+    ) -> Generator[dict[str, dict[Any, Any]], None, None]:
+        """
+        Fetches storage maps page by page, yielding the decoded entries of
+        each page, in key order within each map.
+
+        The keys of every map are enumerated concurrently, and the values of
+        each page are fetched, and handed to the decode executor, while the
+        next pages are enumerated, with up to `max_pages_in_flight` pages
+        running ahead of the consumer. Closing the generator cancels those
+        not started yet.
+        """
+        _, prefix_list, decoders = self._describe_maps(functions, block_hash)
+
+        def fetch_values(
+            keys: list[str], decoder: StorageDecoder, prefix: str
+        ) -> list[tuple[str, Future[dict[Any, Any]]]]:
+            payload = [
+                {
+                    "jsonrpc": "2.0",
+                    "method": "state_queryStorageAt",
+                    "params": [keys, block_hash],
+                    "id": 1,
+                }
+            ]
+            response = self._send_cached(payload, [1])
+            return self._submit_decode(response, [decoder], [prefix])  # type: ignore
+
+        def enumerate_next(
+            prefix: str, decoder: StorageDecoder, start_key: str | None
         ):
-            if not res:
-                continue
-            res = res[0]
-            changes = res["changes"]  # type: ignore
-            value_type, param_types, key_hashers, params, storage_function = (
-                fun_params_tuple
+            future = self.executor.submit(
+                self._get_keys_page, prefix, block_hash, page_size, start_key
             )
-            with self.get_conn(init=True) as substrate:
-                for item in changes:
-                    # Determine type string
-                    key_type_string: list[Any] = []
-                    for n in range(len(params), len(param_types)):
-                        key_type_string.append(
-                            f"[u8; {concat_hash_len(key_hashers[n])}]"
-                        )
-                        key_type_string.append(param_types[n])
+            enumerating[future] = (prefix, decoder)
 
-                    item_key_obj = substrate.decode_scale(  # type: ignore
-                        type_string=f"({', '.join(key_type_string)})",
-                        scale_bytes="0x" + item[0][len(prefix) :],
-                        return_scale_obj=True,
-                        block_hash=block_hash,
-                    )
-                    # strip key_hashers to use as item key
-                    if len(param_types) - len(params) == 1:
-                        item_key = item_key_obj.value_object[1]  # type: ignore
-                    else:
-                        item_key = tuple(  # type: ignore
-                            item_key_obj.value_object[key + 1]  # type: ignore
-                            for key in range(  # type: ignore
-                                len(params), len(param_types) + 1, 2
+        def decode_next() -> dict[str, dict[Any, Any]]:
+            return self._collect_decoded(pending.popleft().result())
+
+        enumerating: dict[Future[list[str]], tuple[str, StorageDecoder]] = {}
+        pending: deque[Future[list[tuple[str, Future[dict[Any, Any]]]]]] = (
+            deque()
+        )
+        try:
+            for prefix, decoder in zip(prefix_list, decoders):
+                enumerate_next(prefix, decoder, None)
+            while enumerating:
+                waiting_on = set(enumerating)
+                if pending:
+                    waiting_on.add(pending[0])  # type: ignore
+                done, _ = wait(waiting_on, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future not in enumerating:
+                        continue
+                    prefix, decoder = enumerating.pop(future)  # type: ignore
+                    keys = future.result()  # type: ignore
+                    if keys:
+                        pending.append(
+                            self.executor.submit(
+                                fetch_values, keys, decoder, prefix
                             )
                         )
-
-                    item_value = substrate.decode_scale(  # type: ignore
-                        type_string=value_type,
-                        scale_bytes=item[1],
-                        return_scale_obj=True,
-                        block_hash=block_hash,
-                    )
-                    result_dict.setdefault(storage_function, {})
-                    key = get_item_key_value(item_key)  # type: ignore
-                    result_dict[storage_function][key] = item_value.value  # type: ignore
-
-        return result_dict
+                    if len(keys) == page_size:  # type: ignore
+                        enumerate_next(prefix, decoder, keys[-1])  # type: ignore
+                # backpressure: enumeration waits for the consumer
+                while pending and (
+                    pending[0].done() or len(pending) >= max_pages_in_flight
+                ):
+                    yield decode_next()
+            while pending:
+                yield decode_next()
+        finally:
+            for future in itertools.chain(enumerating, pending):
+                future.cancel()
 
     def query_batch(
-        self, functions: dict[str, list[tuple[str, list[Any]]]]
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
     ) -> dict[str, str]:
         """
         Executes batch queries on a substrate and returns results in a dictionary format.
 
+        The storage values of every module are read at the same block, in a
+        single `state_queryStorageAt` request, through the storage cache.
+
         Args:
-            substrate: An instance of SubstrateInterface to interact with the substrate.
             functions (dict[str, list[query_call]]): A dictionary mapping module names to lists of query calls (function name and parameters).
+            block_hash: The block to query. Defaults to the chain head.
 
         Returns:
             A dictionary where keys are storage function names and values are the query results.
@@ -668,52 +1291,70 @@ class TorusClient:
             Exception: If no result is found from the batch queries.
 
         Example:
-            >>> query_batch(substrate_instance, {'module_name': [('function_name', ['param1', 'param2'])]})
+            >>> query_batch({'module_name': [('function_name', ['param1', 'param2'])]})
             {'function_name': 'query_result', ...}
         """
 
-        result: dict[str, str] = {}
         if not functions:
             raise Exception("No result")
-        with self.get_conn(init=True) as substrate:
-            for module, queries in functions.items():
-                storage_keys: list[Any] = []
-                for fn, params in queries:
-                    storage_function = substrate.create_storage_key(  # type: ignore
-                        pallet=module, storage_function=fn, params=params
-                    )
-                    storage_keys.append(storage_function)
 
-                block_hash = substrate.get_block_hash()
-                responses: list[Any] = substrate.query_multi(  # type: ignore
-                    storage_keys=storage_keys, block_hash=block_hash
+        def create_keys(substrate: SubstrateInterface) -> list[StorageKey]:
+            return [
+                substrate.create_storage_key(  # type: ignore
+                    pallet=module, storage_function=fn, params=params
                 )
+                for module, queries in functions.items()
+                for fn, params in queries
+            ]
 
-                for item in responses:
-                    fun = item[0]
-                    query = item[1]
-                    storage_fun = fun.storage_function
-                    result[storage_fun] = query.value
+        if not block_hash:
+            with self.get_conn(init=True) as substrate:
+                block_hash = substrate.get_block_hash()
+        assert block_hash is not None
+        with self._get_conn_at(block_hash) as substrate:
+            hex_keys = [key.to_hex() for key in create_keys(substrate)]
+        # read through the storage cache
+        (response,) = self._rpc_request_batch(
+            [("state_queryStorageAt", [hex_keys, block_hash])]
+        )[0]
 
+        result: dict[str, str] = {}
+        with self._get_conn_at(block_hash) as substrate:
+            key_map = {key.to_hex(): key for key in create_keys(substrate)}
+            for result_group in response:  # type: ignore
+                for change_key, change_data in result_group["changes"]:  # type: ignore
+                    storage_key = key_map[change_key]  # type: ignore
+                    value = storage_key.decode_scale_value(  # type: ignore
+                        change_data and ScaleBytes(change_data)  # type: ignore
+                    )
+                    result[storage_key.storage_function] = value.value  # type: ignore
         return result
 
     def query_batch_map(
         self,
         functions: dict[str, list[tuple[str, list[Any]]]],
         block_hash: str | None = None,
+        page_size: int | None = KEYS_PAGE_SIZE,
     ) -> dict[str, dict[Any, Any]]:
         """
         Queries multiple storage functions using a map batch approach and returns the combined result.
 
+        Every module is read at the same block, and their keys are
+        enumerated and their values fetched concurrently.
+
         Args:
-            substrate: An instance of SubstrateInterface for substrate interaction.
             functions (dict[str, list[query_call]]): A dictionary mapping module names to lists of query calls.
+            block_hash: The block to query. Defaults to the chain head.
+            page_size: Enumerate keys with `state_getKeysPaged`, this many at
+              a time, fetching the values of each page while the next one is
+              enumerated. None fetches every key in one `state_getKeys`
+              response instead.
 
         Returns:
             The combined result of the map batch query.
 
         Example:
-            >>> query_batch_map(substrate_instance, {'module_name': [('function_name', ['param1', 'param2'])]})
+            >>> query_batch_map({'module_name': [('function_name', ['param1', 'param2'])]})
             # Returns the combined result of the map batch query
         """
         multi_result: dict[str, dict[Any, Any]] = {}
@@ -730,13 +1371,9 @@ class TorusClient:
             return d  # type: ignore
 
         def get_page():
-            send, prefix_list = self._get_storage_keys(
-                storage, queries, block_hash
+            send, prefix_list, decoders = self._describe_maps(
+                functions, block_hash
             )
-            with self.get_conn(init=True) as substrate:
-                function_parameters = self._get_lists(
-                    storage, queries, substrate
-                )
             responses = self._rpc_request_batch(send)
             # assumption because send is just the storage_function keys
             # so it should always be really small regardless of the amount of queries
@@ -748,7 +1385,7 @@ class TorusClient:
                     ("state_queryStorageAt", [result_keys, block_hash])
                 )
             _, chunks_info = self._make_request_smaller(
-                built_payload, prefix_list, function_parameters
+                built_payload, prefix_list, decoders
             )
             chunks_response, chunks_info = self._rpc_request_batch_chunked(
                 chunks_info
@@ -758,19 +1395,26 @@ class TorusClient:
         if not block_hash:
             with self.get_conn(init=True) as substrate:
                 block_hash = substrate.get_block_hash()
-        for storage, queries in functions.items():
-            chunks, chunks_info = get_page()
-            # if this doesn't happen something is wrong on the code
-            # and we won't be able to decode the data properly
-            assert len(chunks) == len(chunks_info)
-            for chunk_info, response in zip(chunks_info, chunks):
-                storage_result = self._decode_response(
-                    response,
-                    chunk_info.fun_params,
-                    chunk_info.prefix_list,
-                    block_hash,
-                )
-                multi_result = recursive_update(multi_result, storage_result)
+        assert block_hash is not None
+        if page_size is not None:
+            for page in self._query_map_pages(functions, block_hash, page_size):
+                multi_result = recursive_update(multi_result, page)
+            return multi_result
+        chunks, chunks_info = get_page()
+        # if this doesn't happen something is wrong on the code
+        # and we won't be able to decode the data properly
+        assert len(chunks) == len(chunks_info)
+        # every chunk is submitted before the first one is waited on, so
+        # a pooled decode executor decodes them in parallel
+        decoding = [
+            self._submit_decode(
+                response, chunk_info.decoders, chunk_info.prefix_list
+            )
+            for chunk_info, response in zip(chunks_info, chunks)
+        ]
+        for chunk_decoding in decoding:
+            storage_result = self._collect_decoded(chunk_decoding)
+            multi_result = recursive_update(multi_result, storage_result)
 
         return multi_result
 
@@ -791,6 +1435,7 @@ class TorusClient:
             name: The name of the storage function to query.
             params: The parameters to pass to the storage function.
             module: The module where the storage function is located.
+            block_hash: The block to query. Defaults to the chain head.
 
         Returns:
             The result of the query from the network.
@@ -799,7 +1444,7 @@ class TorusClient:
             NetworkQueryError: If the query fails or is invalid.
         """
 
-        result = self.query_batch({module: [(name, params)]})
+        result = self.query_batch({module: [(name, params)]}, block_hash)
 
         return result[name]
 
@@ -810,6 +1455,7 @@ class TorusClient:
         module: str = "Torus0",
         extract_value: bool = True,
         block_hash: str | None = None,
+        page_size: int | None = KEYS_PAGE_SIZE,
     ) -> dict[Any, Any]:
         """
         Queries a storage map from a network node.
@@ -818,6 +1464,9 @@ class TorusClient:
             name: The name of the storage map to query.
             params: A list of parameters for the query.
             module: The module in which the storage map is located.
+            extract_value: Return the entries of the map, instead of a
+              dictionary mapping its name to them.
+            page_size: Keys enumerated per page, see `query_batch_map`.
 
         Returns:
             A dictionary representing the key-value pairs
@@ -827,13 +1476,237 @@ class TorusClient:
             QueryError: If the query to the network fails or is invalid.
         """
 
-        result = self.query_batch_map({module: [(name, params)]}, block_hash)
+        result = self.query_batch_map(
+            {module: [(name, params)]}, block_hash, page_size
+        )
 
         if extract_value:
-            return {k.value: v.value for k, v in result}  # type: ignore
+            return result.get(name, {})
 
         return result
 
+    def iter_map(
+        self,
+        name: str,
+        params: list[Any] = [],
+        module: str = "Torus0",
+        block_hash: str | None = None,
+        page_size: int = KEYS_PAGE_SIZE,
+        prefetch: int = MAX_PAGES_IN_FLIGHT,
+    ) -> Generator[tuple[Any, Any], None, None]:
+        """
+        Iterates over the entries of a storage map, page by page.
+
+        Entries are yielded as soon as their page is fetched and decoded,
+        so the first ones arrive before the map is enumerated, and only
+        `prefetch` pages are ever held in memory. Breaking out of the loop
+        (or closing the generator) stops the fetching.
+
+        Args:
+            name: The name of the storage map to query.
+            params: A list of parameters for the query.
+            module: The module in which the storage map is located.
+            block_hash: The block to read the map at. Defaults to the
+              current head, pinned when the iteration starts.
+            page_size: Keys enumerated per page.
+            prefetch: Pages fetched ahead of the consumer.
+
+        Yields:
+            The decoded `(key, value)` entries of the map.
+
+        Raises:
+            NetworkQueryError: If the query to the network fails or is
+              invalid.
+        """
+        assert prefetch > 0
+        if not block_hash:
+            with self.get_conn(init=True) as substrate:
+                block_hash = substrate.get_block_hash()
+        assert block_hash is not None
+        pages = self._query_map_pages(
+            {module: [(name, params)]}, block_hash, page_size, prefetch
+        )
+        try:
+            for page in pages:
+                yield from page.get(name, {}).items()
+        finally:
+            pages.close()
+
+    def enumerate_keys(self, prefix: str, block_hash: str) -> list[str]:
+        """
+        Enumerates every storage key under `prefix`, page by page.
+
+        Args:
+            prefix: A storage prefix, e.g. from `describe_maps`.
+            block_hash: The block to read the keys at.
+        """
+        keys: list[str] = []
+        start_key = None
+        while True:
+            page = self._get_keys_page(
+                prefix, block_hash, KEYS_PAGE_SIZE, start_key
+            )
+            keys += page
+            if len(page) < KEYS_PAGE_SIZE:
+                return keys
+            start_key = page[-1]
+
+    def _read_raw(
+        self,
+        keys: list[str],
+        block_hash: str,
+        prefix: str,
+        decoder: StorageDecoder,
+    ) -> dict[str, str | None]:
+        """
+        Reads the raw values of storage keys at a block, in adaptive chunks
+        and through the storage cache.
+        """
+        if not keys:
+            return {}
+        request = ("state_queryStorageAt", [keys, block_hash])
+        responses, _ = self._rpc_request_batch_chunked(
+            [Chunk([request], [prefix], [decoder])]  # type: ignore
+        )
+        return {
+            key: value
+            for response in responses
+            for result in response
+            for change_set in result
+            for key, value in change_set["changes"]
+        }
+
+    def _read_raw_range(
+        self, keys: list[str], from_block: str, to_block: str
+    ) -> tuple[dict[str, str | None], dict[str, str | None]]:
+        """
+        Reads the raw values of storage keys at two blocks with
+        `state_queryStorage`, whose first change set holds the values at
+        `from_block`, and the next ones only what changed since. Both are
+        stored in the storage cache.
+        """
+        step = self.chunk_size.size
+        requests = [
+            ("state_queryStorage", [keys[i : i + step], from_block, to_block])
+            for i in range(0, len(keys), step)
+        ]
+        futures = [
+            self.executor.submit(self._rpc_request_batch, [request])
+            for request in requests
+        ]
+        before: dict[str, str | None] = {}
+        after: dict[str, str | None] = {}
+        try:
+            for future in futures:
+                ((change_sets,),) = future.result()
+                if not change_sets:
+                    continue
+                initial, *changes = change_sets  # type: ignore
+                before.update(initial["changes"])  # type: ignore
+                after.update(initial["changes"])  # type: ignore
+                for change_set in changes:
+                    after.update(change_set["changes"])  # type: ignore
+        finally:
+            for future in futures:
+                future.cancel()
+        if self.storage_cache is not None:
+            self.storage_cache.store(from_block, before.items())
+            self.storage_cache.store(to_block, after.items())
+        return before, after
+
+    def query_map_diff(
+        self,
+        name: str,
+        from_block: str,
+        to_block: str | None = None,
+        params: list[Any] = [],
+        module: str = "Torus0",
+    ) -> MapDiff:
+        """
+        Gets the entries of a storage map added, changed and removed between
+        two blocks, to refresh a map read at `from_block` with
+        `MapDiff.apply` instead of reading it again.
+
+        The key sets of both blocks are compared, and the values of the keys
+        in both are compared raw, from the storage cache when the map was
+        read at `from_block` through this client, or with a
+        `state_queryStorage` range read otherwise. Only the entries that
+        differ are decoded.
+
+        Args:
+            name: The name of the storage map.
+            from_block: The block the map was read at.
+            to_block: The block to refresh the map to. Defaults to the
+              chain head. It must descend from `from_block`.
+            params: A list of parameters for the query.
+            module: The module in which the storage map is located.
+
+        Raises:
+            NetworkQueryError: If the query to the network fails or is
+              invalid.
+        """
+        if not to_block:
+            to_block = self.get_block_hash()
+        _, (prefix,), (decoder,) = self._describe_maps(
+            {module: [(name, params)]}, to_block
+        )
+        keys_before = set(self.enumerate_keys(prefix, from_block))
+        keys_after = self.enumerate_keys(prefix, to_block)
+        common = [key for key in keys_after if key in keys_before]
+        added = [key for key in keys_after if key not in keys_before]
+        removed = keys_before.difference(keys_after)
+
+        before: dict[str, str | None] = {}
+        cold = common
+        if self.storage_cache is not None:
+            before, cold = self.storage_cache.lookup(from_block, common)
+        cold_before, after = self._read_raw_range(cold, from_block, to_block)
+        before.update(cold_before)
+        unread = itertools.chain(common, added)
+        warm = [key for key in unread if key not in after]
+        after.update(self._read_raw(warm, to_block, prefix, decoder))
+
+        # keys emptied between their enumeration and their read
+        removed.update(key for key in common if after.get(key) is None)
+        changed = [
+            key
+            for key in common
+            if after.get(key) is not None and after[key] != before.get(key)
+        ]
+        added = [key for key in added if after.get(key) is not None]
+        decoded_added = self.decode_executor.submit(
+            decoder, [(key, after[key]) for key in added], prefix
+        )
+        decoded_changed = self.decode_executor.submit(
+            decoder, [(key, after[key]) for key in changed], prefix
+        )
+        return MapDiff(
+            decoder.storage_function,
+            from_block,
+            to_block,
+            added=decoded_added.result(),
+            changed=decoded_changed.result(),
+            removed={decoder.decode_key(key, prefix) for key in removed},
+        )
+
+    def snapshot(self, block_hash: str | None = None) -> "Snapshot":
+        """
+        Pins reads to one block.
+
+        Every query, map query and `get_*` call made through the returned
+        snapshot reads the same block, and repeated reads of a storage
+        value or map are served from the snapshot instead of the node.
+
+        Args:
+            block_hash: The block to pin. Defaults to the current head.
+
+        Returns:
+            A snapshot sharing the connections of this client.
+        """
+        if not block_hash:
+            block_hash = self.get_block_hash()
+        return Snapshot(self, block_hash)
+
     def compose_call(
         self,
         fn: str,
@@ -3265,6 +4138,24 @@ class TorusClient:
 
         return result["data"]["free"]
 
+    def get_block_hash(self, block_number: int | None = None) -> str:
+        """
+        Retrieves the hash of a block.
+
+        Args:
+            block_number: The number of the block. Defaults to the chain
+              head.
+
+        Raises:
+            NetworkQueryError: If there is no such block.
+        """
+        block_hash = self._with_failover(
+            lambda substrate: substrate.get_block_hash(block_number)  # type: ignore
+        )
+        if not block_hash:
+            raise NetworkQueryError(f"No block numbered {block_number}")
+        return block_hash
+
     def get_block(self, block_hash: str | None = None) -> dict[Any, Any] | None:
         """
         Retrieves information about a specific block in the network.
@@ -3281,10 +4172,9 @@ class TorusClient:
             QueryError: If the query to the network fails or is invalid.
         """
 
-        with self.get_conn() as substrate:
-            block: dict[Any, Any] | None = substrate.get_block(  # type: ignore
-                block_hash  # type: ignore
-            )
+        block: dict[Any, Any] | None = self._with_failover(  # type: ignore
+            lambda substrate: substrate.get_block(block_hash)  # type: ignore
+        )
 
         return block
 
@@ -3338,6 +4228,193 @@ class TorusClient:
         )
 
 
+def _query_key(
+    module: str, name: str, params: list[Any]
+) -> tuple[str, str, str]:
+    return module, name, repr(params)
+
+
+class Snapshot(TorusClient):
+    """
+    A view of a `TorusClient` with every read pinned to one block.
+
+    Reads through a snapshot are consistent with each other, and as pinned
+    storage never changes, the values and maps read are cached for the
+    lifetime of the snapshot. Connections, executors and decoders are those
+    of the client; closing a snapshot only drops its cache. Reads asking
+    for another block raise `ValueError`.
+
+    Get one with `TorusClient.snapshot`.
+    """
+
+    client: TorusClient
+    block_hash: str
+
+    def __init__(self, client: TorusClient, block_hash: str):
+        # state is the client's: attributes set later go to it, see
+        # `__setattr__`
+        object.__setattr__(self, "client", client)
+        object.__setattr__(self, "block_hash", block_hash)
+        object.__setattr__(self, "_values", {})
+        object.__setattr__(self, "_maps", {})
+        object.__setattr__(self, "_cache_lock", threading.Lock())
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self.client, name, value)
+
+    def _pin(self, block_hash: str | None) -> str:
+        if block_hash not in (None, self.block_hash):
+            raise ValueError(
+                f"Snapshot is pinned to block {self.block_hash}, "
+                f"not {block_hash}"
+            )
+        return self.block_hash
+
+    @staticmethod
+    def _missing(
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        cache: dict[tuple[str, str, str], Any],
+    ) -> dict[str, list[tuple[str, list[Any]]]]:
+        missing: dict[str, list[tuple[str, list[Any]]]] = {}
+        for module, queries in functions.items():
+            for name, params in queries:
+                if _query_key(module, name, params) not in cache:
+                    missing.setdefault(module, []).append((name, params))
+        return missing
+
+    @staticmethod
+    def _store(
+        missing: dict[str, list[tuple[str, list[Any]]]],
+        result: Mapping[str, Any],
+        cache: dict[tuple[str, str, str], Any],
+    ):
+        names = [name for queries in missing.values() for name, _ in queries]
+        for module, queries in missing.items():
+            for name, params in queries:
+                # results are keyed by storage function only, so a function
+                # queried with several params can't be told apart
+                if name in result and names.count(name) == 1:
+                    cache[_query_key(module, name, params)] = result[name]
+
+    def close(self):
+        """
+        Drops the cache of the snapshot, leaving the client open.
+        """
+        with self._cache_lock:
+            self._values.clear()
+            self._maps.clear()
+
+    def query_batch(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
+    ) -> dict[str, str]:
+        block_hash = self._pin(block_hash)
+        with self._cache_lock:
+            missing = self._missing(functions, self._values)
+        if missing:
+            fetched = self.client.query_batch(missing, block_hash)
+            with self._cache_lock:
+                self._store(missing, fetched, self._values)
+        else:
+            fetched = {}
+        result: dict[str, str] = {}
+        with self._cache_lock:
+            for module, queries in functions.items():
+                for name, params in queries:
+                    key = _query_key(module, name, params)
+                    if key in self._values:
+                        result[name] = self._values[key]
+                    elif name in fetched:
+                        result[name] = fetched[name]
+        return result
+
+    def query_batch_map(
+        self,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
+        page_size: int | None = KEYS_PAGE_SIZE,
+    ) -> dict[str, dict[Any, Any]]:
+        block_hash = self._pin(block_hash)
+        with self._cache_lock:
+            missing = self._missing(functions, self._maps)
+        fetched: dict[str, dict[Any, Any]] = {}
+        if missing:
+            fetched = self.client.query_batch_map(
+                missing, block_hash, page_size
+            )
+            with self._cache_lock:
+                # storage functions without entries are left out of results
+                self._store(
+                    missing,
+                    {
+                        name: fetched.get(name, {})
+                        for queries in missing.values()
+                        for name, _ in queries
+                    },
+                    self._maps,
+                )
+        result: dict[str, dict[Any, Any]] = {}
+        with self._cache_lock:
+            for module, queries in functions.items():
+                for name, params in queries:
+                    key = _query_key(module, name, params)
+                    entries = self._maps.get(key, fetched.get(name))
+                    if entries:
+                        result.setdefault(name, {}).update(entries)
+        return result
+
+    def iter_map(
+        self,
+        name: str,
+        params: list[Any] = [],
+        module: str = "Torus0",
+        block_hash: str | None = None,
+        page_size: int = KEYS_PAGE_SIZE,
+        prefetch: int = MAX_PAGES_IN_FLIGHT,
+    ) -> Generator[tuple[Any, Any], None, None]:
+        block_hash = self._pin(block_hash)
+        with self._cache_lock:
+            entries = self._maps.get(_query_key(module, name, params))
+        if entries is not None:
+            yield from list(entries.items())
+            return
+        yield from self.client.iter_map(
+            name, params, module, block_hash, page_size, prefetch
+        )
+
+    def get_block_hash(self, block_number: int | None = None) -> str:
+        if block_number is None:
+            return self.block_hash
+        return self.client.get_block_hash(block_number)
+
+    def get_block(self, block_hash: str | None = None) -> dict[Any, Any] | None:
+        return self.client.get_block(self._pin(block_hash))
+
+    def get_existential_deposit(self, block_hash: str | None = None) -> int:
+        return self.client.get_existential_deposit(self._pin(block_hash))
+
+    def query_map_diff(
+        self,
+        name: str,
+        from_block: str,
+        to_block: str | None = None,
+        params: list[Any] = [],
+        module: str = "Torus0",
+    ) -> MapDiff:
+        return self.client.query_map_diff(
+            name, from_block, self._pin(to_block), params, module
+        )
+
+    def snapshot(self, block_hash: str | None = None) -> "Snapshot":
+        if block_hash in (None, self.block_hash):
+            return self
+        return self.client.snapshot(block_hash)
+
+
 if __name__ == "__main__":
     from time import sleep
 
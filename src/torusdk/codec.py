@@ -0,0 +1,147 @@
+"""
+JSON codecs for the JSON-RPC transports.
+
+Encoding and decoding multi-megabyte storage responses is a large share of
+the CPU time of map fetches. Codecs work on bytes, which go to and come from
+the websockets as they are, and use the fastest JSON library installed.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable
+
+CODEC_PREFERENCE = ("orjson", "ujson", "json")
+
+
+@dataclass(frozen=True)
+class JsonCodec:
+    """
+    A JSON implementation working on bytes.
+
+    `loads` also accepts `str`, as some transports only hand out text.
+    """
+
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes | str], Any]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+STDLIB_CODEC = JsonCodec("json", _stdlib_dumps, json.loads)
+
+
+def _orjson_codec() -> JsonCodec:
+    import orjson  # type: ignore
+
+    def dumps(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)  # type: ignore
+        except TypeError:
+            # e.g. integers beyond 64 bits
+            return _stdlib_dumps(obj)
+
+    # node responses carry big numbers as hex strings, so the 64-bit integer
+    # limit of orjson doesn't bite on loads
+    return JsonCodec("orjson", dumps, orjson.loads)  # type: ignore
+
+
+def _ujson_codec() -> JsonCodec:
+    import ujson  # type: ignore
+
+    def dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj).encode()  # type: ignore
+
+    return JsonCodec("ujson", dumps, ujson.loads)  # type: ignore
+
+
+_FACTORIES: dict[str, Callable[[], JsonCodec]] = {
+    "orjson": _orjson_codec,
+    "ujson": _ujson_codec,
+    "json": lambda: STDLIB_CODEC,
+}
+
+
+def get_json_codec(name: str | None = None) -> JsonCodec:
+    """
+    Gets a JSON codec by library name.
+
+    Args:
+        name: One of `CODEC_PREFERENCE`. If None, the first one installed is
+          used.
+
+    Raises:
+        ValueError: If the name is unknown.
+        ImportError: If the named library is not installed.
+    """
+    if name is not None:
+        if name not in _FACTORIES:
+            raise ValueError(
+                f"Unknown JSON codec {name!r}, expected one of "
+                f"{', '.join(CODEC_PREFERENCE)}"
+            )
+        return _FACTORIES[name]()
+    for candidate in CODEC_PREFERENCE:
+        try:
+            return _FACTORIES[candidate]()
+        except ImportError:
+            continue
+    return STDLIB_CODEC
+
+
+DEFAULT_CODEC = get_json_codec()
+"""The fastest codec installed."""
+
+
+def _needs_escaping(value: str) -> bool:
+    return not (
+        value.isascii()
+        and value.isprintable()
+        and '"' not in value
+        and "\\" not in value
+    )
+
+
+def _str_size(value: str) -> int:
+    if _needs_escaping(value):
+        return len(_stdlib_dumps(value))
+    return len(value) + 2
+
+
+def json_size(obj: Any) -> int:
+    """
+    The length of the compact JSON encoding of `obj`, computed without
+    encoding it.
+
+    Strings that need escaping are measured as the standard library escapes
+    them, so other codecs may differ slightly on those.
+    """
+    if isinstance(obj, str):
+        return _str_size(obj)
+    if isinstance(obj, (list, tuple)):
+        if not obj:
+            return 2
+        # brackets and commas
+        return 1 + sum(json_size(item) + 1 for item in obj)  # type: ignore
+    if isinstance(obj, dict):
+        if not obj:
+            return 2
+        # braces, colons and commas
+        return 1 + sum(
+            _str_size(str(key)) + json_size(value) + 2  # type: ignore
+            for key, value in obj.items()  # type: ignore
+        )
+    return len(_stdlib_dumps(obj))
+
+
+def hex_list_size(values: list[str]) -> int:
+    """
+    The length of the compact JSON array of hex strings `values`, which need
+    no escaping. Linear in the number of strings, not in their length.
+    """
+    if not values:
+        return 2
+    # quotes and commas, plus brackets
+    return sum(map(len, values)) + 3 * len(values) + 1
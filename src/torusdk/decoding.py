@@ -0,0 +1,530 @@
+"""
+Compiled decoders of storage map entries.
+
+`SubstrateInterface.decode_scale` resolves the type string of every key and
+value it decodes again, and reaches the type registry through a connection.
+A `StorageDecoder` resolves the decoder classes of a storage function once,
+against a type registry owned by its `CompiledRuntime`, so the entries of a
+map decode without leasing a connection.
+
+Keys made of account ids and integers behind concatenating hashers, which is
+most maps of the chain, skip SCALE decoding altogether: each key is sliced out
+of the raw storage key and converted directly.
+
+Decoding is pure Python, so it holds the GIL. A `DecodeExecutor` decides
+where it runs: inline, in worker threads overlapping it with network reads,
+or in worker processes using several cores.
+"""
+
+import hashlib
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Iterable
+
+from scalecodec.base import RuntimeConfigurationObject, ScaleBytes
+from scalecodec.type_registry import load_type_registry_preset  # type: ignore
+from scalecodec.types import (
+    I8,
+    I16,
+    I32,
+    I64,
+    I128,
+    U8,
+    U16,
+    U32,
+    U64,
+    U128,
+    GenericAccountId,
+    MultiAccountId,
+)
+from scalecodec.utils.ss58 import ss58_encode
+from torustrateinterface import SubstrateInterface
+
+_INTEGERS: dict[type, tuple[int, bool]] = {
+    U8: (1, False),
+    U16: (2, False),
+    U32: (4, False),
+    U64: (8, False),
+    U128: (16, False),
+    I8: (1, True),
+    I16: (2, True),
+    I32: (4, True),
+    I64: (8, True),
+    I128: (16, True),
+}
+"""Byte width and signedness of the integer key types sliced directly."""
+
+ACCOUNT_ID_SIZE = 32
+
+
+def concat_hash_len(key_hasher: str) -> int:
+    """
+    The length of the hash a concatenating key hasher puts before the key.
+
+    Raises:
+        ValueError: If the key hasher does not concatenate the key.
+
+    Example:
+        >>> concat_hash_len("Blake2_128Concat")
+        16
+    """
+    if key_hasher == "Blake2_128Concat":
+        return 16
+    elif key_hasher == "Twox64Concat":
+        return 8
+    elif key_hasher == "Identity":
+        return 0
+    else:
+        raise ValueError("Unsupported hash type")
+
+
+@lru_cache(maxsize=65_536)
+def _ss58_address(public_key: bytes, ss58_format: int | None) -> str:
+    # the same accounts key most maps, e.g. both sides of StakingTo/StakedBy
+    if ss58_format is not None:
+        try:
+            return ss58_encode(public_key, ss58_format=ss58_format)
+        except ValueError:
+            pass
+    return f"0x{public_key.hex()}"
+
+
+def _key_reader(
+    key_class: Any, ss58_format: int | None
+) -> tuple[int, Callable[[bytes], Any]] | None:
+    """
+    The byte size and converter of a key type that can be sliced out of raw
+    storage keys, or None if it has to be SCALE-decoded.
+    """
+    if key_class in _INTEGERS:
+        size, signed = _INTEGERS[key_class]
+        return size, lambda raw: int.from_bytes(raw, "little", signed=signed)
+    if issubclass(key_class, GenericAccountId) and not issubclass(
+        key_class, MultiAccountId
+    ):
+        return ACCOUNT_ID_SIZE, lambda raw: _ss58_address(raw, ss58_format)
+    return None
+
+
+def _core_runtime_config() -> RuntimeConfigurationObject:
+    runtime_config = RuntimeConfigurationObject()
+    runtime_config.update_type_registry(  # type: ignore
+        load_type_registry_preset(name="core")  # type: ignore
+    )
+    return runtime_config
+
+
+class CompiledRuntime:
+    """
+    The type registry of a runtime version, built from its metadata, and the
+    storage decoders compiled against it.
+    """
+
+    spec_version: int
+    metadata: Any
+    runtime_config: RuntimeConfigurationObject
+    _decoders: dict[tuple[str, str, int], "StorageDecoder"]
+    _digest: str | None
+
+    def __init__(
+        self,
+        metadata: Any,
+        spec_version: int,
+        ss58_format: int | None,
+        runtime_config: RuntimeConfigurationObject | None = None,
+    ):
+        """
+        Args:
+            metadata: The decoded `MetadataVersioned` of the runtime.
+            spec_version: The spec version of the runtime.
+            ss58_format: The address format account ids are encoded to.
+            runtime_config: A type registry with the core types loaded, to
+              add the types of the runtime to. Defaults to a new one.
+        """
+        if runtime_config is None:
+            runtime_config = _core_runtime_config()
+        runtime_config.ss58_format = ss58_format
+        runtime_config.implements_scale_info = True
+        runtime_config.add_portable_registry(metadata)  # type: ignore
+        runtime_config.set_active_spec_version_id(spec_version)  # type: ignore
+        self.spec_version = spec_version
+        self.metadata = metadata
+        self.runtime_config = runtime_config
+        self._decoders = {}
+        self._lock = threading.Lock()
+        self._digest = None
+
+    @classmethod
+    def from_raw(
+        cls, raw_metadata: bytes, spec_version: int, ss58_format: int | None
+    ) -> "CompiledRuntime":
+        """
+        Builds the runtime from SCALE-encoded metadata.
+        """
+        runtime_config = _core_runtime_config()
+        metadata = runtime_config.create_scale_object(  # type: ignore
+            "MetadataVersioned", data=ScaleBytes(bytearray(raw_metadata))
+        )
+        metadata.decode()  # type: ignore
+        # the storage entries of the metadata resolve their types through
+        # the registry that decoded them
+        return cls(metadata, spec_version, ss58_format, runtime_config)
+
+    @property
+    def raw_metadata(self) -> bytes:
+        return bytes(self.metadata.data.data)  # type: ignore
+
+    @property
+    def digest(self) -> str:
+        """
+        Identifies the runtime across processes, whatever the chain.
+        """
+        if self._digest is None:
+            self._digest = hashlib.blake2b(
+                self.raw_metadata, digest_size=16
+            ).hexdigest()
+        return self._digest
+
+    def decoder(
+        self, pallet: str, storage_function: str, fixed_keys: int
+    ) -> "StorageDecoder":
+        """
+        Gets the decoder of a storage map queried with its `fixed_keys`
+        leading keys fixed.
+        """
+        key = (pallet, storage_function, fixed_keys)
+        with self._lock:
+            if key not in self._decoders:
+                self._decoders[key] = StorageDecoder(
+                    self, pallet, storage_function, fixed_keys
+                )
+            return self._decoders[key]
+
+
+class StorageDecoder:
+    """
+    Decodes the entries of a storage map queried with some of its keys fixed.
+    """
+
+    runtime: CompiledRuntime
+    pallet: str
+    storage_function: str
+    fixed_keys: int
+
+    def __init__(
+        self,
+        runtime: CompiledRuntime,
+        pallet: str,
+        storage_function: str,
+        fixed_keys: int,
+    ):
+        """
+        Args:
+            runtime: The runtime version to decode with.
+            pallet: The pallet of the storage function.
+            storage_function: The name of the storage function.
+            fixed_keys: How many leading keys the query fixes.
+        """
+        self.runtime = runtime
+        self.pallet = pallet
+        self.storage_function = storage_function
+        self.fixed_keys = fixed_keys
+        self._runtime_config = runtime.runtime_config
+        self._metadata = runtime.metadata
+
+        storage_item = runtime.metadata.get_metadata_pallet(  # type: ignore
+            pallet
+        ).get_storage_function(storage_function)
+        value_type: str = storage_item.get_value_type_string()  # type: ignore
+        param_types: list[str] = storage_item.get_params_type_string()  # type: ignore
+        key_hashers: list[str] = storage_item.get_param_hashers()  # type: ignore
+
+        key_type_string: list[str] = []
+        for n in range(fixed_keys, len(param_types)):
+            key_type_string.append(f"[u8; {concat_hash_len(key_hashers[n])}]")
+            key_type_string.append(param_types[n])
+        self._key_class = self._runtime_config.get_decoder_class(  # type: ignore
+            f"({', '.join(key_type_string)})"
+        )
+        self._value_class = self._runtime_config.get_decoder_class(value_type)  # type: ignore
+        # each free key follows its hash in the decoded tuple
+        self._key_indexes = range(1, len(key_type_string), 2)
+        self._key_slices = self._compile_key_slices(
+            self._runtime_config,
+            param_types[fixed_keys:],
+            key_hashers[fixed_keys:],
+        )
+
+    @staticmethod
+    def _compile_key_slices(
+        runtime_config: RuntimeConfigurationObject,
+        param_types: list[str],
+        key_hashers: list[str],
+    ) -> list[tuple[int, int, Callable[[bytes], Any]]] | None:
+        """
+        Where each free key lies in the raw storage key, after the prefix,
+        and how to convert it. None if any of them has to be SCALE-decoded.
+        """
+        slices: list[tuple[int, int, Callable[[bytes], Any]]] = []
+        offset = 0
+        for param_type, key_hasher in zip(param_types, key_hashers):
+            reader = _key_reader(
+                runtime_config.get_decoder_class(param_type),  # type: ignore
+                runtime_config.ss58_format,  # type: ignore
+            )
+            if reader is None:
+                return None
+            size, convert = reader
+            offset += concat_hash_len(key_hasher)
+            slices.append((offset, offset + size, convert))
+            offset += size
+        return slices
+
+    def decode_key(self, storage_key: str, prefix: str) -> Any:
+        """
+        Decodes the free keys of a hex storage key starting with `prefix`.
+        A single free key is returned as is, several as a tuple.
+        """
+        if self._key_slices:
+            raw = bytes.fromhex(storage_key[len(prefix) :])
+            # anything longer or shorter goes through SCALE, which raises
+            if len(raw) == self._key_slices[-1][1]:
+                if len(self._key_slices) == 1:
+                    start, end, convert = self._key_slices[0]
+                    return convert(raw[start:end])
+                return tuple(
+                    convert(raw[start:end])
+                    for start, end, convert in self._key_slices
+                )
+        key_obj = self._key_class(  # type: ignore
+            data=ScaleBytes("0x" + storage_key[len(prefix) :]),
+            metadata=self._metadata,
+            runtime_config=self._runtime_config,
+        )
+        key_obj.decode()  # type: ignore
+        if len(self._key_indexes) == 1:
+            return key_obj.value_object[1].value  # type: ignore
+        return tuple(key_obj.value_object[n].value for n in self._key_indexes)  # type: ignore
+
+    def decode_value(self, value: str) -> Any:
+        """
+        Decodes a hex storage value.
+        """
+        value_obj = self._value_class(  # type: ignore
+            data=ScaleBytes(value),
+            metadata=self._metadata,
+            runtime_config=self._runtime_config,
+        )
+        value_obj.decode()  # type: ignore
+        return value_obj.value  # type: ignore
+
+    def decode_changes(
+        self, changes: Iterable[tuple[str, str]], prefix: str
+    ) -> dict[Any, Any]:
+        """
+        Decodes the `[key, value]` changes of a `state_queryStorageAt`
+        response into `{key: value}` entries.
+        """
+        return {
+            self.decode_key(storage_key, prefix): self.decode_value(value)
+            for storage_key, value in changes
+        }
+
+
+class DecoderRegistry:
+    """
+    The storage decoders of a chain, compiled once per storage function,
+    number of fixed keys and runtime version.
+    """
+
+    _runtimes: dict[int, CompiledRuntime]
+
+    def __init__(self):
+        self._runtimes = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        substrate: SubstrateInterface,
+        pallet: str,
+        storage_function: str,
+        params: list[Any],
+    ) -> StorageDecoder:
+        """
+        Gets the decoder of a storage map queried with `params` as its
+        leading keys, at the runtime version `substrate` is initialized to.
+        """
+        spec_version: int = substrate.runtime_version  # type: ignore
+        with self._lock:
+            if spec_version not in self._runtimes:
+                self._runtimes[spec_version] = CompiledRuntime(
+                    substrate.metadata,  # type: ignore
+                    spec_version,
+                    substrate.ss58_format,  # type: ignore
+                )
+            runtime = self._runtimes[spec_version]
+        return runtime.decoder(pallet, storage_function, len(params))
+
+
+class DecodeExecutor:
+    """
+    Base decode executor, decoding inline on the submitting thread.
+    """
+
+    def submit(
+        self, decoder: StorageDecoder, changes: list[Any], prefix: str
+    ) -> Future[dict[Any, Any]]:
+        """
+        Decodes the `[key, value]` changes of a `state_queryStorageAt`
+        response.
+
+        Returns:
+            A future of the decoded `{key: value}` entries.
+        """
+        future: Future[dict[Any, Any]] = Future()
+        try:
+            future.set_result(decoder.decode_changes(changes, prefix))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        """
+        Releases the workers of the executor.
+        """
+
+
+class InlineDecodeExecutor(DecodeExecutor):
+    """
+    Decodes on the thread that received the response.
+    """
+
+
+class ThreadDecodeExecutor(DecodeExecutor):
+    """
+    Decodes in a thread pool, overlapping decoding with network reads.
+
+    Decoding holds the GIL, so this uses a single core.
+    """
+
+    def __init__(self, max_workers: int | None = None):
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="torus-decode"
+        )
+
+    def submit(
+        self, decoder: StorageDecoder, changes: list[Any], prefix: str
+    ) -> Future[dict[Any, Any]]:
+        return self._executor.submit(decoder.decode_changes, changes, prefix)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _RuntimeMissing(Exception):
+    """
+    Raised by a worker process that hasn't compiled a runtime yet.
+    """
+
+
+_worker_runtimes: dict[str, CompiledRuntime] = {}
+"""The runtimes compiled in a worker process, by metadata digest."""
+
+
+def _decode_in_worker(
+    digest: str,
+    spec_version: int,
+    ss58_format: int | None,
+    raw_metadata: bytes | None,
+    pallet: str,
+    storage_function: str,
+    fixed_keys: int,
+    changes: list[Any],
+    prefix: str,
+) -> dict[Any, Any]:
+    runtime = _worker_runtimes.get(digest)
+    if runtime is None:
+        if raw_metadata is None:
+            raise _RuntimeMissing(digest)
+        runtime = CompiledRuntime.from_raw(
+            raw_metadata, spec_version, ss58_format
+        )
+        _worker_runtimes[digest] = runtime
+    decoder = runtime.decoder(pallet, storage_function, fixed_keys)
+    return decoder.decode_changes(changes, prefix)
+
+
+class ProcessDecodeExecutor(DecodeExecutor):
+    """
+    Decodes in a process pool, using several cores.
+
+    Decoders can't cross process boundaries, so each worker compiles its own
+    from the runtime metadata. The metadata is only sent to a worker that
+    doesn't have it yet, the first time it decodes with that runtime.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        mp_context: BaseContext | None = None,
+    ):
+        """
+        Args:
+            max_workers: The number of worker processes. Defaults to the
+              number of CPUs.
+            mp_context: The multiprocessing context starting the workers.
+              Defaults to the platform's.
+        """
+        self._executor = ProcessPoolExecutor(max_workers, mp_context)
+
+    def _submit(
+        self,
+        decoder: StorageDecoder,
+        changes: list[Any],
+        prefix: str,
+        with_metadata: bool,
+    ) -> Future[dict[Any, Any]]:
+        runtime = decoder.runtime
+        return self._executor.submit(
+            _decode_in_worker,
+            runtime.digest,
+            runtime.spec_version,
+            runtime.runtime_config.ss58_format,  # type: ignore
+            runtime.raw_metadata if with_metadata else None,
+            decoder.pallet,
+            decoder.storage_function,
+            decoder.fixed_keys,
+            changes,
+            prefix,
+        )
+
+    def submit(
+        self, decoder: StorageDecoder, changes: list[Any], prefix: str
+    ) -> Future[dict[Any, Any]]:
+        result: Future[dict[Any, Any]] = Future()
+
+        def forward(attempt: Future[dict[Any, Any]]):
+            if attempt.cancelled():
+                result.cancel()
+                return
+            exception = attempt.exception()
+            if isinstance(exception, _RuntimeMissing):
+                try:
+                    retry = self._submit(decoder, changes, prefix, True)
+                except RuntimeError as e:
+                    # shut down meanwhile
+                    result.set_exception(e)
+                    return
+                retry.add_done_callback(forward)
+            elif exception is not None:
+                result.set_exception(exception)
+            else:
+                result.set_result(attempt.result())
+
+        self._submit(decoder, changes, prefix, False).add_done_callback(forward)
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,46 @@
+"""
+Differences between the entries of a storage map at two blocks.
+
+Refreshing a materialized map by applying a `MapDiff` only decodes and
+touches the entries that were added, changed or removed in between, see
+`torusdk.client.TorusClient.query_map_diff`.
+"""
+
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class MapDiff:
+    """
+    The entries of a storage map added, changed and removed between two
+    blocks.
+    """
+
+    storage_function: str
+    from_block: str
+    to_block: str
+    added: dict[Any, Any]
+    changed: dict[Any, Any]
+    removed: set[Any]
+
+    @property
+    def churn(self) -> int:
+        """
+        The number of entries that differ between the two blocks.
+        """
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def apply(self, entries: dict[Any, Any]) -> dict[Any, Any]:
+        """
+        Updates, in place, the entries of the map at `from_block` to those
+        at `to_block`.
+
+        Returns:
+            The updated `entries`.
+        """
+        for key in self.removed:
+            entries.pop(key, None)
+        entries.update(self.added)
+        entries.update(self.changed)
+        return entries
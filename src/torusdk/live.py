@@ -0,0 +1,517 @@
+"""
+Live in-memory replicas of storage maps.
+
+A `LiveMap` reads the keys of storage maps once, then follows their values
+with `state_subscribeStorage` notifications, so long-running services answer
+reads from memory instead of polling the chain.
+"""
+
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+from queue import Empty, Queue
+from typing import Any, Iterable, Iterator, Mapping
+
+from torusdk.client import TorusClient
+from torusdk.decoding import StorageDecoder
+from torusdk.errors import (
+    NetworkError,
+    NetworkQueryError,
+    NetworkTimeoutError,
+)
+from torusdk.transport import MultiplexedWebsocket
+
+RESCAN_INTERVAL = 60.0
+"""Seconds between two enumerations of the keys of a live map."""
+POLL_INTERVAL = 1.0
+SHARDS = 64
+"""Shards of a live map, each copied whole when one of its entries changes."""
+KEYS_PER_SUBSCRIPTION = 1000
+"""Storage keys per `state_subscribeStorage`, well under what nodes accept."""
+SUBSCRIBE_METHOD = "state_subscribeStorage"
+UNSUBSCRIBE_METHOD = "state_unsubscribeStorage"
+SUBSCRIBE_HEADS_METHOD = "chain_subscribeNewHeads"
+UNSUBSCRIBE_HEADS_METHOD = "chain_unsubscribeNewHeads"
+REMOVED = object()
+"""The value removing a key in `ShardedMap.updated`."""
+_HEADS = -1
+
+
+class ShardedMap(Mapping[Any, Any]):
+    """
+    An immutable mapping split in shards by key hash.
+
+    `updated` copies the shards holding the changed entries and shares the
+    others with the original, so a change costs the size of a shard, about
+    `len(self) / SHARDS` entries, instead of the whole map.
+    """
+
+    _shards: tuple[dict[Any, Any], ...]
+    _size: int
+
+    def __init__(
+        self, shards: tuple[dict[Any, Any], ...] | None = None, size: int = 0
+    ):
+        self._shards = shards or tuple({} for _ in range(SHARDS))
+        self._size = size
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._shards[hash(key) % SHARDS][key]
+
+    def __iter__(self) -> Iterator[Any]:
+        for shard in self._shards:
+            yield from shard
+
+    def __len__(self) -> int:
+        return self._size
+
+    def updated(self, changes: Iterable[tuple[Any, Any]]) -> "ShardedMap":
+        """
+        A copy of the map with `(key, value)` changes applied, where a value
+        of `REMOVED` removes the key.
+        """
+        shards = list(self._shards)
+        copied: set[int] = set()
+        size = self._size
+        for key, value in changes:
+            index = hash(key) % SHARDS
+            if index not in copied:
+                shards[index] = dict(shards[index])
+                copied.add(index)
+            shard = shards[index]
+            if value is REMOVED:
+                if shard.pop(key, REMOVED) is not REMOVED:
+                    size -= 1
+            else:
+                if key not in shard:
+                    size += 1
+                shard[key] = value
+        return ShardedMap(tuple(shards), size)
+
+
+_EMPTY = ShardedMap()
+
+
+class LiveMap:
+    """
+    An in-memory replica of storage maps, kept up to date by a storage
+    subscription.
+
+    Nodes only notify changes of the keys subscribed to, so new entries are
+    picked up by enumerating the keys again every `rescan_interval` seconds
+    and subscribing to the new ones. Removed entries and changed values are
+    applied as soon as their block is notified.
+
+    The keys are spread over several subscriptions, notified independently,
+    and a subscription is only notified of the blocks changing its keys.
+    Changes are therefore held back until every subscription is known to
+    have reached their block: either it was notified of that block or a
+    later one, or the head following it was notified, as nodes notify the
+    storage changes of a block before the next head. All the changes up to
+    that block are then applied at once, so the replica always reflects a
+    single block, and `block_number` never goes back. It usually lags the
+    chain head by a block. Reorganizations of the chain aren't followed:
+    the changes of the blocks notified are kept.
+
+    Reads don't lock: every update swaps in new `ShardedMap`s, so the
+    mapping returned for a storage function never changes under its reader.
+    An update copies the shards its changes touch, a fraction of each map.
+
+    Example:
+    ```py
+    live = LiveMap(client, {"Torus0": [("StakingTo", [])]})
+    live.start()
+    live["StakingTo"].get((staker, agent))
+    ```
+    """
+
+    client: TorusClient
+    functions: dict[str, list[tuple[str, list[Any]]]]
+    rescan_interval: float | None
+    timeout: float | None
+    keys_per_subscription: int
+    last_error: Exception | None
+    _maps: dict[str, ShardedMap]
+    _block_hash: str | None
+    _block_number: int | None
+    _targets: list[tuple[str, StorageDecoder]]
+    _keys: set[str]
+    _ws: MultiplexedWebsocket | None
+    _subscriptions: list[Any]
+    _heads: Any
+    _building: bool
+    _since: dict[int, int]
+    _reached: dict[int, int]
+    _settled: tuple[int, str] | None
+    _pending: dict[tuple[int, str], list[list[Any]]]
+    _numbers: dict[str, int]
+    _notifications: Queue[tuple[int, int, Any]]
+    _thread: threading.Thread | None
+
+    def __init__(
+        self,
+        client: TorusClient,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        rescan_interval: float | None = RESCAN_INTERVAL,
+        timeout: float | None = 60.0,
+        keys_per_subscription: int = KEYS_PER_SUBSCRIPTION,
+    ):
+        """
+        Args:
+            client: The client to read the maps with. Notifications arrive on
+              its multiplexed websocket.
+            functions: A dictionary mapping module names to lists of storage
+              maps and their fixed leading keys, as for `query_batch_map`.
+            rescan_interval: Seconds between two enumerations of the keys of
+              the maps, to find new entries. None never looks for them.
+            timeout: Seconds to wait for the node to accept a subscription,
+              and to send the initial values of the maps.
+            keys_per_subscription: The most storage keys subscribed to at
+              once. Nodes reject subscriptions to many more keys than
+              they serve in a page.
+        """
+        assert functions
+        assert rescan_interval is None or rescan_interval > 0
+        assert keys_per_subscription > 0
+        self.client = client
+        self.functions = functions
+        self.rescan_interval = rescan_interval
+        self.timeout = timeout
+        self.keys_per_subscription = keys_per_subscription
+        self.last_error = None
+        self._maps = {}
+        self._block_hash = None
+        self._block_number = None
+        self._targets = []
+        self._keys = set()
+        self._ws = None
+        self._subscriptions = []
+        self._heads = None
+        self._generation = 0
+        self._building = True
+        self._since = {}
+        self._reached = {}
+        self._settled = None
+        self._pending = {}
+        self._numbers = {}
+        self._notifications = Queue()
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def block_hash(self) -> str | None:
+        """
+        The hash of the block the replica reflects.
+        """
+        return self._block_hash
+
+    @property
+    def block_number(self) -> int | None:
+        """
+        The number of the block the replica reflects.
+        """
+        return self._block_number
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def __getitem__(self, storage_function: str) -> Mapping[Any, Any]:
+        """
+        The entries of a storage map, as of `block_number`.
+        """
+        return self._maps.get(storage_function, _EMPTY)
+
+    def get(self, storage_function: str, key: Any, default: Any = None) -> Any:
+        return self._maps.get(storage_function, _EMPTY).get(key, default)
+
+    def wait(
+        self, timeout: float | None = None, block_hash: str | None = None
+    ) -> bool:
+        """
+        Waits for the replica to be updated to a new block.
+
+        Args:
+            timeout: Seconds to wait. None waits until it is updated.
+            block_hash: The block to move past. Defaults to the current one,
+              pass the one last read from so as not to miss an update.
+
+        Returns:
+            Whether it was updated within `timeout` seconds.
+        """
+        with self._updated:
+            if block_hash is None:
+                block_hash = self._block_hash
+            return self._updated.wait_for(
+                lambda: self._block_hash != block_hash, timeout
+            )
+
+    def start(self):
+        """
+        Subscribes to the maps and waits for their initial values, then
+        follows their changes from a daemon thread.
+
+        Raises:
+            NetworkError: If the maps can't be read or subscribed to.
+        """
+        assert self._thread is None, "LiveMap already started"
+        self._subscribe()
+        deadline = (
+            None if self.timeout is None else time.monotonic() + self.timeout
+        )
+        while self._block_hash is None:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close()
+                    raise NetworkError("No initial values notified")
+            try:
+                self._apply(*self._notifications.get(timeout=remaining))
+            except Empty:
+                continue
+        self._thread = threading.Thread(
+            target=self._run, name="torus-live", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops following the maps and cancels the subscriptions. The replica
+        stays readable.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._unsubscribe()
+
+    def _unsubscribe(self):
+        ws, subscriptions = self._ws, self._subscriptions
+        heads, self._heads = self._heads, None
+        self._subscriptions = []
+        if ws is None:
+            return
+        cancelled = [(UNSUBSCRIBE_METHOD, sub) for sub in subscriptions]
+        if heads is not None:
+            cancelled.append((UNSUBSCRIBE_HEADS_METHOD, heads))
+        for method, subscription in cancelled:
+            try:
+                ws.unsubscribe(method, subscription)
+            except Exception:
+                pass
+
+    def _subscribe_keys(self, ws: MultiplexedWebsocket, keys: list[str]):
+        step = self.keys_per_subscription
+        for start in range(0, len(keys), step):
+            index = len(self._subscriptions)
+            callback = partial(self._queue, self._generation, index)
+            self._subscriptions.append(
+                ws.subscribe(
+                    SUBSCRIBE_METHOD,
+                    [keys[start : start + step]],
+                    callback,
+                    self.timeout,
+                )
+            )
+
+    def _subscribe(self):
+        """
+        Enumerates the keys of the maps at the chain head and subscribes to
+        them, starting a new generation of subscriptions, whose notifications
+        build a new replica replacing the current one.
+        """
+        self._unsubscribe()
+        block_hash = self.client.get_block_hash()
+        targets = self.client.describe_maps(self.functions, block_hash)
+        # longest prefixes first, so fixed keys win over their whole map
+        self._targets = sorted(targets, key=lambda target: -len(target[0]))
+        keys = [
+            key
+            for prefix, _ in targets
+            for key in self.client.enumerate_keys(prefix, block_hash)
+        ]
+        self._generation += 1
+        self._building = True
+        self._since = {}
+        self._reached = {}
+        self._settled = None
+        self._pending = {}
+        self._keys = set(keys)
+        self._ws = self.client.get_multiplexed()
+        self._heads = self._ws.subscribe(
+            SUBSCRIBE_HEADS_METHOD,
+            [],
+            partial(self._queue, self._generation, _HEADS),
+            self.timeout,
+        )
+        self._subscribe_keys(self._ws, keys)
+        if not self._subscriptions:
+            # nothing to follow until a rescan finds keys
+            self._building = False
+            self._replace({}, block_hash, self._get_block_number(block_hash))
+
+    def _queue(self, generation: int, index: int, result: Any):
+        self._notifications.put((generation, index, result))
+
+    def _rescan(self):
+        block_hash = self._block_hash
+        assert block_hash is not None and self._ws is not None
+        new_keys = [
+            key
+            for prefix, _ in self._targets
+            for key in self.client.enumerate_keys(prefix, block_hash)
+            if key not in self._keys
+        ]
+        if new_keys:
+            self._keys.update(new_keys)
+            self._subscribe_keys(self._ws, new_keys)
+
+    def _target(self, key: str) -> tuple[str, StorageDecoder] | None:
+        for prefix, decoder in self._targets:
+            if key.startswith(prefix):
+                return prefix, decoder
+        return None
+
+    def _decode(
+        self, maps: dict[str, ShardedMap], change_sets: list[list[Any]]
+    ) -> dict[str, ShardedMap]:
+        """
+        Applies raw `[key, value]` change sets, in order, to copies of the
+        maps they touch.
+        """
+        changes: dict[str, list[tuple[Any, Any]]] = {}
+        for change_set in change_sets:
+            for key, value in change_set:
+                target = self._target(key)
+                if target is None:
+                    continue
+                prefix, decoder = target
+                decoded_key = decoder.decode_key(key, prefix)
+                changes.setdefault(decoder.storage_function, []).append(
+                    (
+                        decoded_key,
+                        REMOVED
+                        if value is None
+                        else decoder.decode_value(value),
+                    )
+                )
+        updated = {
+            name: maps.get(name, _EMPTY).updated(entries)
+            for name, entries in changes.items()
+        }
+        return {**maps, **updated}
+
+    def _get_block_number(self, block_hash: str) -> int:
+        if block_hash in self._numbers:
+            return self._numbers[block_hash]
+        assert self._ws is not None
+        request = {
+            "jsonrpc": "2.0",
+            "method": "chain_getHeader",
+            "params": [block_hash],
+        }
+        (future,) = self._ws.send([request])
+        try:
+            message = future.result(self.timeout)
+        except FutureTimeoutError:
+            raise NetworkTimeoutError(
+                f"No response after {self.timeout} seconds"
+            )
+        if "error" in message:
+            raise NetworkQueryError(message["error"])
+        number = int(message["result"]["number"], 16)
+        self._numbers[block_hash] = number
+        return number
+
+    def _replace(
+        self, maps: dict[str, ShardedMap], block_hash: str, block_number: int
+    ):
+        with self._updated:
+            self._maps = maps
+            self._block_hash = block_hash
+            self._block_number = block_number
+            self._updated.notify_all()
+
+    def _apply(self, generation: int, index: int, result: Any):
+        if generation != self._generation:
+            return
+        if index == _HEADS:
+            # the parent of a new head is settled
+            number = int(result["number"], 16) - 1
+            parent = result["parentHash"]
+            self._numbers[parent] = number
+            if self._settled is None or number > self._settled[0]:
+                self._settled = (number, parent)
+        else:
+            block_hash = result["block"]
+            number = self._get_block_number(block_hash)
+            block = (number, block_hash)
+            self._pending.setdefault(block, []).append(result["changes"])
+            # the first notification holds the values the subscription
+            # starts from
+            self._since.setdefault(index, number)
+            self._reached[index] = max(self._reached.get(index, number), number)
+        self._publish()
+
+    def _publish(self):
+        """
+        Applies the changes of the blocks every subscription has reached.
+        """
+        if not self._subscriptions or len(self._reached) < len(
+            self._subscriptions
+        ):
+            return
+        settled = -1 if self._settled is None else self._settled[0]
+        ready = min(max(number, settled) for number in self._reached.values())
+        if ready < max(self._since.values()):
+            # some keys have no values that early
+            return
+        if not self._building and ready <= (self._block_number or -1):
+            return
+        hashes = {number: block for block, number in self._numbers.items()}
+        if ready not in hashes:
+            return
+        blocks = sorted(block for block in self._pending if block[0] <= ready)
+        change_sets = [
+            change_set
+            for block in blocks
+            for change_set in self._pending.pop(block)
+        ]
+        maps = self._decode({} if self._building else self._maps, change_sets)
+        self._building = False
+        self._numbers = {
+            block: number
+            for block, number in self._numbers.items()
+            if number >= ready
+        }
+        self._replace(maps, hashes[ready], ready)
+
+    def _run(self):
+        last_scan = time.monotonic()
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                try:
+                    notification = self._notifications.get(
+                        timeout=POLL_INTERVAL
+                    )
+                except Empty:
+                    notification = None
+                if notification is not None:
+                    self._apply(*notification)
+                elif self._ws is None or not self._ws.connected:
+                    time.sleep(self.client.reconnect_policy.delay(attempt))
+                    attempt += 1
+                    self._subscribe()
+                    attempt = 0
+                elif (
+                    self.rescan_interval is not None
+                    and time.monotonic() - last_scan >= self.rescan_interval
+                ):
+                    last_scan = time.monotonic()
+                    self._rescan()
+            except Exception as e:
+                # kept for inspection; the next poll tries again
+                self.last_error = e
@@ -0,0 +1,147 @@
+"""
+Memory management policies of `torusdk.client.TorusClient`.
+
+Decoding large storage maps leaves many short-lived reference cycles
+behind. CPython's generational collector eventually frees them, but
+long-running processes may want to run full collections themselves. A policy
+decides when a connection lease triggers one, and keeps count of the time
+spent collecting.
+"""
+
+import gc
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+
+
+@dataclass
+class MemoryStats:
+    """
+    Counters of a memory policy. Times are in seconds.
+    """
+
+    leases: int = 0
+    collections: int = 0
+    collect_time: float = 0.0
+    max_collect_time: float = 0.0
+
+
+def current_rss() -> int:
+    """
+    The resident set size of this process, in bytes.
+
+    Falls back to the peak resident set size where the current one can't be
+    read, and to 0 where neither can, e.g. on Windows.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Unix only
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryPolicy:
+    """
+    Base memory policy, never collecting.
+    """
+
+    def __init__(self):
+        self._stats = MemoryStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> MemoryStats:
+        with self._lock:
+            return MemoryStats(**vars(self._stats))
+
+    def should_collect(self, leases: int) -> bool:
+        """
+        Whether the `leases`-th connection lease runs a full collection.
+        """
+        return False
+
+    def on_lease(self):
+        """
+        Called every time a connection is leased.
+        """
+        with self._lock:
+            self._stats.leases += 1
+            leases = self._stats.leases
+        if self.should_collect(leases):
+            self.collect()
+
+    def collect(self):
+        """
+        Runs a full garbage collection, timing it.
+        """
+        start = perf_counter()
+        gc.collect()
+        elapsed = perf_counter() - start
+        with self._lock:
+            self._stats.collections += 1
+            self._stats.collect_time += elapsed
+            self._stats.max_collect_time = max(
+                self._stats.max_collect_time, elapsed
+            )
+
+
+class NeverCollect(MemoryPolicy):
+    """
+    Leaves garbage collection to CPython.
+    """
+
+
+class CollectEveryN(MemoryPolicy):
+    """
+    Runs a full collection every `n` connection leases.
+    """
+
+    n: int
+
+    def __init__(self, n: int):
+        assert n > 0
+        super().__init__()
+        self.n = n
+
+    def should_collect(self, leases: int) -> bool:
+        return leases % self.n == 0
+
+
+class CollectAboveRSS(MemoryPolicy):
+    """
+    Runs a full collection on lease while the resident set size is above a
+    threshold.
+
+    The resident set size is sampled every `check_every` leases, as reading
+    it costs a system call.
+    """
+
+    threshold: int
+    check_every: int
+
+    def __init__(self, threshold: int, check_every: int = 100):
+        """
+        Args:
+            threshold: Resident set size in bytes.
+            check_every: Leases between two resident set size samples.
+        """
+        assert threshold > 0 and check_every > 0
+        super().__init__()
+        self.threshold = threshold
+        self.check_every = check_every
+
+    def should_collect(self, leases: int) -> bool:
+        if leases % self.check_every != 0:
+            return False
+        return current_rss() > self.threshold
@@ -0,0 +1,186 @@
+"""
+On-disk cache of chain runtime metadata.
+
+Downloading and decoding the runtime metadata is the bulk of the work done
+before the first storage key can be encoded. The cache keeps the raw metadata
+under `~/.torus/metadata/<genesis hash>/<spec version>.scale`, so fresh
+processes skip the download, and keeps the decoded metadata in memory, so
+pooled connections decode it once per process. A runtime upgrade bumps the
+spec version, which misses the cache and stores the new metadata.
+"""
+
+import os
+import re
+import threading
+from typing import Any
+
+from scalecodec.base import RuntimeConfigurationObject, ScaleBytes
+from scalecodec.type_registry import load_type_registry_preset  # type: ignore
+from torustrateinterface import SubstrateInterface
+
+from torusdk.key import TORUS_HOME
+
+METADATA_CACHE_DIR = os.path.join(TORUS_HOME, "metadata")
+KEEP_SPEC_VERSIONS = 2
+"""Spec versions kept on disk per chain, newest first."""
+
+_METADATA_KEY = re.compile(r"METADATA_(\d+)")
+
+
+class MetadataCache:
+    """
+    Runtime metadata cache of a single chain.
+
+    Implements the `get`/`set` subset of a Dogpile cache region, which
+    `SubstrateInterface` consults in `init_runtime` before downloading the
+    metadata of a spec version.
+    """
+
+    genesis_hash: str
+    directory: str
+    keep_versions: int
+    _decoded: dict[int, Any]
+
+    def __init__(
+        self,
+        genesis_hash: str,
+        directory: str = METADATA_CACHE_DIR,
+        keep_versions: int = KEEP_SPEC_VERSIONS,
+    ):
+        """
+        Args:
+            genesis_hash: The genesis block hash of the chain.
+            directory: The directory holding the metadata of every chain.
+            keep_versions: How many spec versions to keep on disk.
+        """
+        self.genesis_hash = genesis_hash
+        self.directory = os.path.join(
+            os.path.expanduser(directory), genesis_hash
+        )
+        self.keep_versions = keep_versions
+        self._decoded = {}
+        self._lock = threading.Lock()
+        self._runtime_config = RuntimeConfigurationObject()
+        self._runtime_config.update_type_registry(  # type: ignore
+            load_type_registry_preset(name="core")  # type: ignore
+        )
+
+    def _path(self, spec_version: int) -> str:
+        return os.path.join(self.directory, f"{spec_version}.scale")
+
+    def _decode(self, raw: bytes) -> Any:
+        metadata = self._runtime_config.create_scale_object(  # type: ignore
+            "MetadataVersioned", data=ScaleBytes(bytearray(raw))
+        )
+        metadata.decode()  # type: ignore
+        return metadata  # type: ignore
+
+    def get(self, key: str) -> Any:
+        """
+        Gets the decoded metadata stored under a `METADATA_<spec version>`
+        key, or None on a miss.
+        """
+        match = _METADATA_KEY.fullmatch(key)
+        if match is None:
+            return None
+        spec_version = int(match.group(1))
+        with self._lock:
+            if spec_version in self._decoded:
+                return self._decoded[spec_version]
+            path = self._path(spec_version)
+            try:
+                with open(path, "rb") as file:
+                    raw = file.read()
+            except OSError:
+                return None
+            try:
+                metadata = self._decode(raw)
+            except Exception:
+                # truncated or corrupted, it gets downloaded again
+                self._remove(path)
+                return None
+            self._decoded[spec_version] = metadata
+            return metadata
+
+    def set(self, key: str, metadata: Any):
+        """
+        Stores freshly downloaded metadata under a `METADATA_<spec version>`
+        key, pruning older spec versions.
+        """
+        match = _METADATA_KEY.fullmatch(key)
+        if match is None:
+            return
+        spec_version = int(match.group(1))
+        raw = bytes(metadata.data.data)  # type: ignore
+        with self._lock:
+            self._decoded[spec_version] = metadata
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(spec_version)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as file:
+                    file.write(raw)
+                # atomic, so concurrent processes never read a partial file
+                os.replace(tmp_path, path)
+                self._prune()
+            except OSError:
+                # the cache is an optimization, a read-only home is fine
+                pass
+
+    def _prune(self):
+        versions = sorted(
+            (
+                int(name[: -len(".scale")])
+                for name in os.listdir(self.directory)
+                if name.endswith(".scale") and name[: -len(".scale")].isdigit()
+            ),
+            reverse=True,
+        )
+        for spec_version in versions[self.keep_versions :]:
+            self._remove(self._path(spec_version))
+            self._decoded.pop(spec_version, None)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_caches: dict[tuple[str, str], MetadataCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_metadata_cache(
+    genesis_hash: str, directory: str = METADATA_CACHE_DIR
+) -> MetadataCache:
+    """
+    Gets the process-wide metadata cache of a chain.
+    """
+    with _caches_lock:
+        key = (directory, genesis_hash)
+        if key not in _caches:
+            _caches[key] = MetadataCache(genesis_hash, directory)
+        return _caches[key]
+
+
+def attach_metadata_cache(
+    substrate: SubstrateInterface,
+    directory: str = METADATA_CACHE_DIR,
+    genesis_hash: str | None = None,
+) -> MetadataCache:
+    """
+    Makes `substrate` load runtime metadata through the on-disk cache.
+
+    Args:
+        substrate: The interface to attach the cache to.
+        directory: The directory holding the metadata of every chain.
+        genesis_hash: The genesis block hash of the chain, if known. It is
+          queried from the node otherwise.
+    """
+    if genesis_hash is None:
+        genesis_hash = substrate.get_block_hash(0)  # type: ignore
+    cache = get_metadata_cache(genesis_hash, directory)  # type: ignore
+    substrate.cache_region = cache
+    return cache
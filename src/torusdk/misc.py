@@ -206,17 +206,12 @@ def local_keys_to_freebalance(
     c_client: TorusClient,
     local_keys: dict[str, Ss58Address],
 ) -> dict[str, int]:
-    query_all = c_client.query_batch_map(
-        {
-            "System": [("Account", [])],
-        }
-    )
-    balance_map = query_all["Account"]
-
+    # streamed, so only the balances of local keys are kept in memory
+    addresses = set(local_keys.values())
     format_balances: dict[str, int] = {
         key: value["data"]["free"]
-        for key, value in balance_map.items()
-        if "data" in value and "free" in value["data"]
+        for key, value in c_client.iter_map("Account", module="System")
+        if key in addresses and "data" in value and "free" in value["data"]
     }
 
     key2balance: dict[str, int] = concat_to_local_keys(
@@ -0,0 +1,929 @@
+"""
+Websocket connection pool used by `torusdk.client.TorusClient`.
+"""
+
+import inspect
+import queue
+import random
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+from typing import Any, Callable, Sequence, TypeVar
+
+import websocket
+from torustrateinterface import SubstrateInterface
+
+from torusdk.errors import NetworkError
+from torusdk.metadata_cache import METADATA_CACHE_DIR, attach_metadata_cache
+from torusdk.transport import TrafficStats, open_websocket
+
+CONNECTION_ERRORS = (websocket.WebSocketException, OSError)
+"""Errors meaning the socket to a node is unusable."""
+
+LATENCY_SMOOTHING = 0.2
+ERROR_SMOOTHING = 0.2
+ERROR_PENALTY = 5.0
+"""Seconds added to an endpoint score for a 100% recent error rate."""
+HEARTBEAT_INTERVAL = 11
+IDLE_TIMEOUT = 300
+FAILURE_THRESHOLD = 5
+"""Consecutive failures after which an endpoint circuit opens."""
+RESET_TIMEOUT = 30.0
+"""Seconds an endpoint circuit stays open before it is probed."""
+TARGET_CHUNK_LATENCY = 5.0
+"""Seconds a chunked storage read should take at most."""
+MIN_CHUNK_KEYS = 100
+OVERSIZED_ERROR_CODES = (-32007, -32008, -32010, -32011)
+"""JSON-RPC errors of nodes rejecting a request or response as too big."""
+
+T = TypeVar("T")
+Callback = TypeVar("Callback", bound=Callable[..., None])
+
+
+@dataclass
+class ConnectionContainer:
+    substrate: SubstrateInterface
+    lock: threading.Lock
+    url: str
+    last_used: float = field(default_factory=monotonic)
+    last_heartbeat: float | None = None
+    alive: bool = True
+
+
+@dataclass
+class ConnectionLiveness:
+    """
+    Liveness of a pooled connection. Times are in seconds.
+    """
+
+    url: str
+    alive: bool
+    idle_for: float
+    since_heartbeat: float | None
+
+
+@dataclass
+class EndpointStats:
+    """
+    Rolling health of a node endpoint.
+
+    Latency and error rate are exponentially weighted moving averages, so
+    recent requests dominate.
+    """
+
+    url: str
+    latency: float | None = None
+    error_rate: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def record_success(self, elapsed: float):
+        self.requests += 1
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+        self.error_rate -= ERROR_SMOOTHING * self.error_rate
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        self.error_rate += ERROR_SMOOTHING * (1 - self.error_rate)
+
+    @property
+    def score(self) -> float:
+        """
+        Lower is healthier. Endpoints without measurements score by errors
+        alone, so they get tried.
+        """
+        return (self.latency or 0.0) + ERROR_PENALTY * self.error_rate
+
+
+@dataclass
+class ReconnectPolicy:
+    """
+    Exponential backoff with full jitter between reconnection attempts.
+
+    The n-th retry waits a random time between zero and
+    `min(max_delay, base_delay * multiplier ** n)` seconds, so clients that
+    lost a node at the same moment spread their reconnections out.
+    """
+
+    base_delay: float = 0.1
+    max_delay: float = 10.0
+    multiplier: float = 2.0
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait before the retry following the `attempt`-th failure,
+        counting from zero.
+        """
+        # bounded exponent, so huge attempt counts can't overflow
+        cap = self.base_delay * self.multiplier ** min(attempt, 64)
+        return random.uniform(0, min(self.max_delay, cap))
+
+
+class CircuitBreaker:
+    """
+    Sheds load from an endpoint that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and the
+    endpoint is skipped. Once `reset_timeout` seconds have passed, a single
+    probe is let through (half-open): its success closes the circuit, its
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    failure_threshold: int
+    reset_timeout: float
+    _failures: int
+    _opened_at: float | None
+    _probe_started: float | None
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+    ):
+        assert failure_threshold > 0
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if monotonic() - self._opened_at < self.reset_timeout:
+                return self.OPEN
+            return self.HALF_OPEN
+
+    def _probe_in_flight(self, now: float) -> bool:
+        # a probe that never reported back doesn't block the endpoint forever
+        return (
+            self._probe_started is not None
+            and now - self._probe_started < self.reset_timeout
+        )
+
+    def available(self) -> bool:
+        """
+        Whether a request would currently be let through.
+        """
+        now = monotonic()
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            return (
+                now - self._opened_at >= self.reset_timeout
+                and not self._probe_in_flight(now)
+            )
+
+    def allow(self) -> bool:
+        """
+        Lets a request through, claiming the probe if the circuit is
+        half-open.
+        """
+        now = monotonic()
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            if self._probe_in_flight(now):
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (
+                self._opened_at is not None
+                or self._failures >= self.failure_threshold
+            ):
+                self._opened_at = monotonic()
+                self._probe_started = None
+
+
+class AdaptiveChunkSize:
+    """
+    The number of storage keys read per request, adapted to what the node
+    serves.
+
+    Additive increase, multiplicative decrease: the size grows by a tenth of
+    `maximum` after each full chunk answered within `target_latency`, shrinks
+    in proportion when a chunk takes longer, and halves when the node
+    rejects a chunk as too big.
+    """
+
+    maximum: int
+    minimum: int
+    target_latency: float
+    _size: int
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = MIN_CHUNK_KEYS,
+        target_latency: float = TARGET_CHUNK_LATENCY,
+    ):
+        assert 0 < minimum <= maximum
+        self.maximum = maximum
+        self.minimum = minimum
+        self.target_latency = target_latency
+        self._size = maximum
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._size
+
+    def _shrink_to(self, size: int):
+        self._size = max(self.minimum, min(self._size, size))
+
+    def record_success(self, keys: int, latency: float):
+        """
+        Records a chunk of `keys` keys answered after `latency` seconds.
+        """
+        with self._lock:
+            if latency > self.target_latency:
+                self._shrink_to(int(keys * self.target_latency / latency))
+            elif keys >= self._size:
+                step = max(1, self.maximum // 10)
+                self._size = min(self.maximum, self._size + step)
+
+    def record_oversized(self, keys: int):
+        """
+        Records a chunk of `keys` keys rejected as too big.
+        """
+        with self._lock:
+            self._shrink_to(keys // 2)
+
+
+@dataclass
+class ExecutorStats:
+    """
+    Load of a `BoundedExecutor`.
+    """
+
+    max_workers: int
+    queued: int
+    running: int
+    completed: int
+
+
+class BoundedExecutor:
+    """
+    A fixed-size thread pool shared by every fan-out of a client, so bursts
+    of requests queue up instead of spawning threads that would only wait
+    for a pooled connection.
+
+    Tasks submitted from one of its own workers run inline, so a task
+    fanning out again can't deadlock the pool.
+    """
+
+    max_workers: int
+    _queued: int
+    _running: int
+    _completed: int
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "torus"):
+        assert max_workers > 0
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix)
+        self._local = threading.local()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return ExecutorStats(
+                self.max_workers, self._queued, self._running, self._completed
+            )
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Tasks waiting for a worker.
+        """
+        with self._lock:
+            return self._queued
+
+    def _run(self, fn: Callable[..., T], args: Any, kwargs: Any) -> T:
+        self._local.worker = True
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def _forget_cancelled(self, future: Future[Any]):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def submit(
+        self, fn: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> Future[T]:
+        if getattr(self._local, "worker", False):
+            future: Future[T] = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            self._queued += 1
+        try:
+            future = self._executor.submit(self._run, fn, args, kwargs)
+        except RuntimeError:
+            # shut down
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(self._forget_cancelled)
+        return future
+
+    def shutdown(self):
+        """
+        Cancels the queued tasks, and lets the running ones finish.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _instantiate_substrateinterface(
+    url: str,
+    ws_options: dict[str, int],
+    lock: threading.Lock,
+    traffic: TrafficStats | None = None,
+):
+    ws = open_websocket(url, ws_options, traffic)
+    si = SubstrateInterface(websocket=ws, ws_options=ws_options)
+
+    return ConnectionContainer(
+        si,
+        lock,
+        url,
+    )
+
+
+def _weak(callback: Callback) -> Callable[[], Callback | None]:
+    """
+    A reference to `callback`, weak if it is a bound method, so registering
+    it with the scheduler doesn't keep its object alive.
+    """
+    if inspect.ismethod(callback):
+        return weakref.WeakMethod(callback)  # type: ignore
+    return lambda: callback
+
+
+def _close_quietly(conn: ConnectionContainer):
+    try:
+        conn.substrate.websocket.close()  # type: ignore
+    except Exception:
+        pass
+
+
+class HeartbeatScheduler:
+    """
+    Keeps websocket connections alive from a single daemon thread.
+
+    A connection only gets a heartbeat when it has neither carried traffic
+    nor had a heartbeat for `interval` seconds. Connections busy with a
+    request are skipped rather than waited on, so heartbeats never contend
+    with real traffic. Periodic housekeeping tasks, such as reaping idle
+    connections, run on the same thread. The thread exits when no
+    connections or tasks are registered.
+
+    Bound methods given as tasks or failure callbacks are held weakly: once
+    their object is collected, the task is dropped, and so are the
+    connections reporting to it, closing them.
+    """
+
+    interval: float
+    _connections: dict[
+        int,
+        tuple[
+            ConnectionContainer,
+            Callable[[], Callable[[ConnectionContainer], None] | None] | None,
+        ],
+    ]
+    _tasks: list[Callable[[], Callable[[], None] | None]]
+    _thread: threading.Thread | None
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL):
+        """
+        Args:
+            interval: Seconds of silence after which a connection gets a
+              heartbeat.
+        """
+        self.interval = interval
+        self._connections = {}
+        self._tasks = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_running(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def register(
+        self,
+        conn: ConnectionContainer,
+        on_failure: Callable[[ConnectionContainer], None] | None = None,
+    ):
+        """
+        Starts keeping `conn` alive. `on_failure` is called from the
+        scheduler thread if a heartbeat finds its socket dead.
+        """
+        ref = None if on_failure is None else _weak(on_failure)
+        with self._lock:
+            self._connections[id(conn)] = (conn, ref)
+            self._ensure_running()
+
+    def unregister(self, conn: ConnectionContainer):
+        with self._lock:
+            self._connections.pop(id(conn), None)
+
+    def add_task(self, task: Callable[[], None]):
+        """
+        Runs `task` on every scheduler tick, until it is removed.
+        """
+        with self._lock:
+            self._tasks.append(_weak(task))
+            self._ensure_running()
+
+    def remove_task(self, task: Callable[[], None]):
+        with self._lock:
+            self._tasks = [ref for ref in self._tasks if ref() != task]
+
+    def _beat(
+        self,
+        conn: ConnectionContainer,
+        on_failure: Callable[[ConnectionContainer], None] | None,
+    ):
+        now = monotonic()
+        last_activity = max(conn.last_used, conn.last_heartbeat or 0.0)
+        if now - last_activity < self.interval:
+            return
+        if not conn.lock.acquire(blocking=False):
+            # busy with a request, which keeps it alive anyway
+            return
+        try:
+            ws = conn.substrate.websocket  # type: ignore
+            if not (ws and ws.connected):  # type: ignore
+                if conn.alive and on_failure is not None:
+                    # reported once, not on every tick until it's reopened
+                    on_failure(conn)
+                conn.alive = False
+                return
+            # uses torustrateinterface wrapper because its very stateful
+            # and we could mess with something by directly using the websocket
+            ws.pong(b"")  # type: ignore
+            conn.last_heartbeat = now
+            conn.alive = True
+        except CONNECTION_ERRORS:
+            conn.alive = False
+            _close_quietly(conn)
+            if on_failure is not None:
+                on_failure(conn)
+        finally:
+            conn.lock.release()
+
+    def _tick(self) -> bool:
+        """
+        Beats the registered connections and runs the tasks once.
+
+        Returns:
+            Whether anything is left registered.
+        """
+        orphans: list[ConnectionContainer] = []
+        with self._lock:
+            for key, (conn, ref) in list(self._connections.items()):
+                if ref is not None and ref() is None:
+                    # its pool was collected without being closed
+                    del self._connections[key]
+                    orphans.append(conn)
+            self._tasks = [ref for ref in self._tasks if ref() is not None]
+            if not self._connections and not self._tasks:
+                self._thread = None
+            connections = list(self._connections.values())
+            tasks = list(self._tasks)
+        for conn in orphans:
+            _close_quietly(conn)
+        for conn, ref in connections:
+            self._beat(conn, None if ref is None else ref())
+        for ref in tasks:
+            task = ref()
+            if task is None:
+                continue
+            try:
+                task()
+            except Exception:
+                # housekeeping must not take the heartbeats down with it
+                pass
+        return bool(connections or tasks)
+
+    def _run(self):
+        # the references taken by a tick are dropped before sleeping, so
+        # they don't keep a pool alive
+        while self._tick():
+            sleep(self.interval / 4)
+
+
+DEFAULT_HEARTBEAT_SCHEDULER = HeartbeatScheduler()
+"""Scheduler shared by every pool that isn't given its own."""
+
+
+class ConnectionPool:
+    """
+    An elastic pool of websocket connections spread over one or more node
+    endpoints.
+
+    Connections are opened on demand, up to `max_connections`. Connections
+    idle for longer than `idle_timeout` are closed, down to a warm minimum
+    of `min_connections`. Idle connections are leased healthiest endpoint
+    first, according to the rolling latency and error rate recorded for each
+    endpoint, and new ones are opened on the healthiest endpoint. Dead
+    connections are reopened, failing over to the next healthiest endpoint
+    when their own is unreachable.
+    """
+
+    urls: list[str]
+    ws_options: dict[str, int]
+    traffic: TrafficStats | None
+    max_connections: int
+    min_connections: int
+    idle_timeout: float | None
+    metadata_cache_dir: str | None
+    _genesis_hashes: dict[str, str]
+    _stats: dict[str, EndpointStats]
+    _breakers: dict[str, CircuitBreaker]
+    _idle: list[ConnectionContainer]
+    _open_conns: list[ConnectionContainer]
+    _heartbeat: HeartbeatScheduler
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        max_connections: int,
+        ws_options: dict[str, int] | None = None,
+        heartbeat: HeartbeatScheduler | None = None,
+        min_connections: int = 1,
+        idle_timeout: float | None = IDLE_TIMEOUT,
+        prewarm: bool = False,
+        metadata_cache_dir: str | None = METADATA_CACHE_DIR,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        traffic: TrafficStats | None = None,
+    ):
+        """
+        Args:
+            urls: The node endpoints to connect to.
+            max_connections: The maximum number of websocket connections to
+              be opened.
+            heartbeat: The scheduler keeping the connections alive. Defaults
+              to `DEFAULT_HEARTBEAT_SCHEDULER`.
+            min_connections: The number of connections opened upfront and
+              kept open while idle.
+            idle_timeout: Seconds after which an idle connection above
+              `min_connections` is closed. None keeps them open.
+            prewarm: Open all `max_connections` upfront, in parallel.
+            metadata_cache_dir: Where to cache runtime metadata on disk.
+              None disables the cache.
+            failure_threshold: Consecutive failures after which the circuit
+              of an endpoint opens, and no new connection is opened to it.
+            reset_timeout: Seconds after which an open circuit lets a probe
+              connection through.
+            traffic: Counters to record the traffic of every connection in.
+        """
+        assert urls, "at least one node url is required"
+        assert 0 < min_connections <= max_connections
+        self.urls = list(urls)
+        self.ws_options = ws_options or {}
+        self.traffic = traffic
+        self.max_connections = max_connections
+        self.min_connections = min_connections
+        self.idle_timeout = idle_timeout
+        self.metadata_cache_dir = metadata_cache_dir
+        self._genesis_hashes = {}
+        self._heartbeat = heartbeat or DEFAULT_HEARTBEAT_SCHEDULER
+        self._stats = {url: EndpointStats(url) for url in self.urls}
+        self._breakers = {
+            url: CircuitBreaker(failure_threshold, reset_timeout)
+            for url in self.urls
+        }
+        self._idle = []
+        self._open_conns = []
+        self._slots = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._idle = self._open_warm(
+            max_connections if prewarm else min_connections
+        )
+        self._slots = len(self._idle)
+        if idle_timeout is not None:
+            self._heartbeat.add_task(self.reap_idle)
+
+    def _open_warm(self, amount: int) -> list[ConnectionContainer]:
+        """
+        Opens `amount` connections in parallel, spread over the endpoints.
+
+        Raises:
+            NetworkError: If no endpoint can be reached.
+        """
+
+        def open_nth(n: int) -> ConnectionContainer | None:
+            return self._try_open(self.urls[n % len(self.urls)])
+
+        if amount == 1:
+            opened = [open_nth(0)]
+        else:
+            with ThreadPoolExecutor(amount) as executor:
+                opened = list(executor.map(open_nth, range(amount)))
+        warm = [conn for conn in opened if conn is not None]
+        if not warm:
+            warm.append(self._open_best())
+        return warm
+
+    @property
+    def size(self) -> int:
+        """
+        The number of open connections, leased or idle.
+        """
+        with self._cond:
+            return self._slots
+
+    @property
+    def endpoints(self) -> list[EndpointStats]:
+        """
+        Endpoint stats, healthiest first.
+        """
+        with self._cond:
+            return sorted(self._stats.values(), key=lambda s: s.score)
+
+    def circuit_states(self) -> dict[str, str]:
+        """
+        The circuit breaker state of each endpoint.
+        """
+        return {url: breaker.state for url, breaker in self._breakers.items()}
+
+    def best_url(self, exclude: Sequence[str] = ()) -> str:
+        """
+        The healthiest endpoint not in `exclude`, skipping open circuits
+        while any other is available, and preferring the one with fewer open
+        connections on ties.
+        """
+        with self._cond:
+            load = Counter(conn.url for conn in self._open_conns)
+            candidates = [
+                s for s in self._stats.values() if s.url not in exclude
+            ] or list(self._stats.values())
+            return min(
+                candidates,
+                key=lambda s: (
+                    not self._breakers[s.url].available(),
+                    s.score,
+                    load[s.url],
+                ),
+            ).url
+
+    def record_success(self, url: str, elapsed: float):
+        with self._cond:
+            self._stats[url].record_success(elapsed)
+        self._breakers[url].record_success()
+
+    def record_failure(self, url: str):
+        with self._cond:
+            self._stats[url].record_failure()
+        self._breakers[url].record_failure()
+
+    def liveness(self) -> list[ConnectionLiveness]:
+        """
+        Liveness of every open connection, as last seen by its heartbeats
+        and requests.
+        """
+        now = monotonic()
+        with self._cond:
+            return [
+                ConnectionLiveness(
+                    conn.url,
+                    conn.alive,
+                    now - conn.last_used,
+                    None
+                    if conn.last_heartbeat is None
+                    else now - conn.last_heartbeat,
+                )
+                for conn in self._open_conns
+            ]
+
+    def _open(self, url: str) -> ConnectionContainer:
+        conn = _instantiate_substrateinterface(
+            url,
+            self.ws_options,
+            threading.Lock(),  # type: ignore
+            self.traffic,
+        )
+        if self.metadata_cache_dir is not None:
+            try:
+                cache = attach_metadata_cache(
+                    conn.substrate,
+                    self.metadata_cache_dir,
+                    self._genesis_hashes.get(url),
+                )
+            except BaseException:
+                _close_quietly(conn)
+                raise
+            self._genesis_hashes[url] = cache.genesis_hash
+        with self._cond:
+            self._open_conns.append(conn)
+        self._heartbeat.register(conn, on_failure=self._heartbeat_failed)
+        return conn
+
+    def _heartbeat_failed(self, conn: ConnectionContainer):
+        self.record_failure(conn.url)
+
+    def _forget(self, conn: ConnectionContainer):
+        self._heartbeat.unregister(conn)
+        with self._cond:
+            if conn in self._open_conns:
+                self._open_conns.remove(conn)
+
+    def _try_open(self, url: str) -> ConnectionContainer | None:
+        """
+        Opens a connection to `url`, unless its circuit is open. Failures
+        are recorded against the endpoint.
+        """
+        breaker = self._breakers[url]
+        if not breaker.allow():
+            return None
+        try:
+            conn = self._open(url)
+        except CONNECTION_ERRORS:
+            self.record_failure(url)
+            return None
+        breaker.record_success()
+        return conn
+
+    def _open_best(self, tried: Sequence[str] = ()) -> ConnectionContainer:
+        """
+        Opens a connection to the healthiest endpoint that can be reached.
+
+        Raises:
+            NetworkError: If no endpoint can be reached, or the circuits of
+              all the reachable ones are open.
+        """
+        tried = list(tried)
+        for _ in range(len(self.urls)):
+            url = self.best_url(exclude=tried)
+            conn = self._try_open(url)
+            if conn is not None:
+                return conn
+            tried.append(url)
+        raise NetworkError(f"Could not connect to any of {self.urls}")
+
+    def acquire(self, timeout: float | None = None) -> ConnectionContainer:
+        """
+        Leases the idle connection on the healthiest endpoint, or opens a new
+        one if none is idle and the pool can grow.
+
+        Blocks for up to `timeout` seconds for a connection to be released.
+        If `timeout` is None, it blocks indefinitely.
+
+        Raises:
+            queue.Empty: If no connection is available within the timeout
+              period.
+            NetworkError: If a new connection is needed and no endpoint can
+              be reached.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise NetworkError("Connection pool is closed")
+                if self._idle:
+                    conn = min(
+                        self._idle, key=lambda c: self._stats[c.url].score
+                    )
+                    self._idle.remove(conn)
+                    return conn
+                if self._slots < self.max_connections:
+                    self._slots += 1
+                    break
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+        try:
+            return self._open_best()
+        except BaseException:
+            with self._cond:
+                self._slots -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: ConnectionContainer):
+        conn.last_used = monotonic()
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+            self._slots -= 1
+        self._forget(conn)
+        _close_quietly(conn)
+
+    def reap_idle(self):
+        """
+        Closes connections idle for longer than `idle_timeout`, oldest first,
+        keeping `min_connections` open.
+        """
+        if self.idle_timeout is None:
+            return
+        now = monotonic()
+        reaped: list[ConnectionContainer] = []
+        with self._cond:
+            for conn in sorted(self._idle, key=lambda c: c.last_used):
+                if self._slots <= self.min_connections:
+                    break
+                if now - conn.last_used < self.idle_timeout:
+                    break
+                self._idle.remove(conn)
+                self._slots -= 1
+                reaped.append(conn)
+        for conn in reaped:
+            self._forget(conn)
+            _close_quietly(conn)
+
+    def close(self):
+        """
+        Closes every idle connection. Leased connections are closed when they
+        are released.
+        """
+        self._heartbeat.remove_task(self.reap_idle)
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._slots -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._forget(conn)
+            _close_quietly(conn)
+
+    def mark_dead(self, conn: ConnectionContainer):
+        """
+        Records a failure for the endpoint of `conn` and closes its socket,
+        so it is reopened on its next lease.
+        """
+        self.record_failure(conn.url)
+        conn.alive = False
+        _close_quietly(conn)
+
+    def reconnect(
+        self, conn: ConnectionContainer, failed: bool = False
+    ) -> ConnectionContainer:
+        """
+        Replaces a leased connection whose socket died with a fresh one.
+
+        Args:
+            conn: The leased connection to replace.
+            failed: Whether `conn` died mid-request. Its endpoint is then
+              tried last.
+
+        Raises:
+            NetworkError: If no endpoint can be reached.
+        """
+        self._forget(conn)
+        _close_quietly(conn)
+        if not failed:
+            reopened = self._try_open(conn.url)
+            if reopened is not None:
+                return reopened
+        return self._open_best(tried=[conn.url])
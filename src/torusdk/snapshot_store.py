@@ -0,0 +1,461 @@
+"""
+Persistent store of decoded storage maps, for offline analysis.
+
+A `SnapshotStore` writes the maps read at a block to an SQLite file, with
+the leading keys of their entries indexed, so that reports and backtests
+read them back as dict-like `StoredMap`s without a node.
+
+Example:
+```py
+store = SnapshotStore()
+snapshot = store.export(client, {"Torus0": [("StakingTo", [])]})
+...
+staking_to = SnapshotStore().open(snapshot.block_hash)["StakingTo"]
+staking_to.by_key(staker)
+```
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, ItemsView, Iterator, Mapping, ValuesView
+
+from torusdk.client import TorusClient
+from torusdk.key import TORUS_HOME
+
+SNAPSHOT_STORE_PATH = os.path.join(TORUS_HOME, "snapshots.sqlite")
+_TUPLE_TAG = "__tuple__"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS snapshots ("
+    "id INTEGER PRIMARY KEY, block_hash TEXT NOT NULL UNIQUE, "
+    "block_number INTEGER, created_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS maps ("
+    "snapshot INTEGER NOT NULL, module TEXT NOT NULL, "
+    "storage_function TEXT NOT NULL, params TEXT NOT NULL, "
+    "size INTEGER NOT NULL, PRIMARY KEY (snapshot, storage_function))",
+    "CREATE TABLE IF NOT EXISTS entries ("
+    "snapshot INTEGER NOT NULL, storage_function TEXT NOT NULL, "
+    "key TEXT NOT NULL, key0, key1, value TEXT NOT NULL, "
+    "PRIMARY KEY (snapshot, storage_function, key)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS entries_key0 "
+    "ON entries (snapshot, storage_function, key0)",
+    "CREATE INDEX IF NOT EXISTS entries_key1 "
+    "ON entries (snapshot, storage_function, key1)",
+)
+
+
+def _pack(value: Any) -> Any:
+    # JSON has no tuples, but decoded keys and values use them
+    if isinstance(value, tuple):
+        return {_TUPLE_TAG: [_pack(item) for item in value]}  # type: ignore
+    if isinstance(value, list):
+        return [_pack(item) for item in value]  # type: ignore
+    if isinstance(value, dict):
+        return {key: _pack(item) for key, item in value.items()}  # type: ignore
+    return value
+
+
+def _unpack_object(obj: dict[str, Any]) -> Any:
+    if len(obj) == 1 and _TUPLE_TAG in obj:
+        return tuple(obj[_TUPLE_TAG])
+    return obj
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(_pack(value), separators=(",", ":"))
+
+
+def _loads(data: str) -> Any:
+    return json.loads(data, object_hook=_unpack_object)
+
+
+def _indexed(component: Any) -> Any:
+    """
+    The column value indexing a key component. Addresses and numbers are
+    stored as they are, anything else as JSON.
+    """
+    if isinstance(component, int) and not -(2**63) <= component < 2**63:
+        # beyond SQLite integers
+        return _dumps(component)
+    if component is None or isinstance(component, (str, int, float)):
+        return component
+    return _dumps(component)
+
+
+def _leading_keys(key: Any) -> tuple[Any, Any]:
+    if isinstance(key, tuple):
+        components: list[Any] = list(key)  # type: ignore
+        second = components[1] if len(components) > 1 else None
+        return _indexed(components[0]), _indexed(second)
+    return _indexed(key), None
+
+
+@dataclass
+class SnapshotInfo:
+    """
+    A snapshot held by a `SnapshotStore`, and the maps it holds with their
+    number of entries.
+    """
+
+    block_hash: str
+    block_number: int | None
+    created_at: float
+    maps: dict[str, int]
+
+
+class StoredMap(Mapping[Any, Any]):
+    """
+    A storage map of a stored snapshot, read from the store on access.
+
+    Behaves as the dict returned by `query_map` for the same storage
+    function and block. Entries can also be looked up by the first or
+    second key of a double map with `by_key`, through an index.
+    """
+
+    store: "SnapshotStore"
+    module: str
+    storage_function: str
+    params: list[Any]
+    _snapshot: int
+    _size: int
+
+    def __init__(
+        self,
+        store: "SnapshotStore",
+        snapshot: int,
+        module: str,
+        storage_function: str,
+        params: list[Any],
+        size: int,
+    ):
+        self.store = store
+        self.module = module
+        self.storage_function = storage_function
+        self.params = params
+        self._snapshot = snapshot
+        self._size = size
+
+    def __getitem__(self, key: Any) -> Any:
+        rows = self.store.query(
+            "SELECT value FROM entries WHERE snapshot = ? "
+            "AND storage_function = ? AND key = ?",
+            (self._snapshot, self.storage_function, _dumps(key)),
+        )
+        if not rows:
+            raise KeyError(key)
+        return _loads(rows[0][0])
+
+    def __iter__(self) -> Iterator[Any]:
+        for key, _ in self._entries():
+            yield key
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def _entries(
+        self, where: str = "", params: tuple[Any, ...] = ()
+    ) -> Iterator[tuple[Any, Any]]:
+        rows = self.store.query(
+            "SELECT key, value FROM entries WHERE snapshot = ? "
+            f"AND storage_function = ?{where}",
+            (self._snapshot, self.storage_function, *params),
+        )
+        for key, value in rows:
+            yield _loads(key), _loads(value)
+
+    def items(self) -> ItemsView[Any, Any]:
+        return _StoredItems(self)
+
+    def values(self) -> ValuesView[Any]:
+        return _StoredValues(self)
+
+    def by_key(self, key: Any, position: int = 0) -> dict[Any, Any]:
+        """
+        Gets the entries whose key starts with, or has as second key, `key`,
+        e.g. the stakes of an account in a double map of stakers to agents.
+
+        Args:
+            key: The key component to look for.
+            position: 0 for the first key of the entries, 1 for the second.
+        """
+        assert position in (0, 1)
+        where = f" AND key{position} = ?"
+        return dict(self._entries(where, (_indexed(key),)))
+
+    def to_dict(self) -> dict[Any, Any]:
+        """
+        Reads the whole map into memory.
+        """
+        return dict(self._entries())
+
+
+class _StoredItems(ItemsView[Any, Any]):
+    _mapping: StoredMap
+
+    def __iter__(self) -> Iterator[tuple[Any, Any]]:
+        # one query, instead of one per key
+        return self._mapping._entries()  # type: ignore
+
+
+class _StoredValues(ValuesView[Any]):
+    _mapping: StoredMap
+
+    def __iter__(self) -> Iterator[Any]:
+        for _, value in self._mapping._entries():  # type: ignore
+            yield value
+
+
+class StoredSnapshot:
+    """
+    The maps stored for one block, by storage function name.
+    """
+
+    store: "SnapshotStore"
+    block_hash: str
+    block_number: int | None
+    _id: int
+    _maps: dict[str, StoredMap]
+
+    def __init__(
+        self,
+        store: "SnapshotStore",
+        snapshot: int,
+        block_hash: str,
+        block_number: int | None,
+    ):
+        self.store = store
+        self.block_hash = block_hash
+        self.block_number = block_number
+        self._id = snapshot
+        self._maps = {}
+        rows = store.query(
+            "SELECT module, storage_function, params, size FROM maps "
+            "WHERE snapshot = ?",
+            (snapshot,),
+        )
+        for module, storage_function, params, size in rows:
+            self._maps[storage_function] = StoredMap(
+                store, snapshot, module, storage_function, _loads(params), size
+            )
+
+    @property
+    def storage_functions(self) -> list[str]:
+        return list(self._maps)
+
+    def __getitem__(self, storage_function: str) -> StoredMap:
+        return self._maps[storage_function]
+
+    def __contains__(self, storage_function: str) -> bool:
+        return storage_function in self._maps
+
+    def query_map(self, name: str) -> dict[Any, Any]:
+        """
+        Reads a whole stored map, as `TorusClient.query_map` would at the
+        block of the snapshot.
+
+        Raises:
+            KeyError: If the map isn't stored.
+        """
+        return self._maps[name].to_dict()
+
+
+class SnapshotStore:
+    """
+    SQLite store of storage maps decoded at given blocks.
+
+    Each snapshot is identified by its block hash. Entries are stored as
+    JSON, keyed by storage function and key, with the first and second
+    keys of every entry indexed.
+    """
+
+    path: str
+
+    def __init__(self, path: str = SNAPSHOT_STORE_PATH):
+        """
+        Args:
+            path: The SQLite file, created if missing.
+        """
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._db.execute(statement)
+
+    def query(self, sql: str, params: tuple[Any, ...] = ()) -> list[Any]:
+        """
+        Runs an SQL query on the store, for analyses the maps don't cover.
+        Keys and values are stored as JSON, with addresses and numbers of
+        the first and second keys as they are in `key0` and `key1`.
+        """
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def save(
+        self,
+        block_hash: str,
+        maps: Mapping[str, Mapping[Any, Any]],
+        block_number: int | None = None,
+        functions: dict[str, list[tuple[str, list[Any]]]] | None = None,
+    ) -> StoredSnapshot:
+        """
+        Stores decoded maps read at `block_hash`, replacing the maps of the
+        same names already stored for that block.
+
+        Args:
+            block_hash: The block the maps were read at.
+            maps: The maps by storage function name, as returned by
+              `query_batch_map`.
+            block_number: The number of the block.
+            functions: The query the maps come from, recording their module
+              and fixed leading keys.
+        """
+        origins: dict[str, tuple[str, list[Any]]] = {}
+        for module, queries in (functions or {}).items():
+            for storage_function, params in queries:
+                origins[storage_function] = (module, params)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO snapshots (block_hash, block_number, created_at) "
+                "VALUES (?, ?, ?) ON CONFLICT (block_hash) DO UPDATE SET "
+                "block_number = COALESCE(excluded.block_number, block_number)",
+                (block_hash, block_number, time.time()),
+            )
+            ((snapshot, block_number),) = self._db.execute(
+                "SELECT id, block_number FROM snapshots WHERE block_hash = ?",
+                (block_hash,),
+            ).fetchall()
+            for storage_function, entries in maps.items():
+                module, params = origins.get(storage_function, ("", []))
+                key = (snapshot, storage_function)
+                self._db.execute(
+                    "DELETE FROM entries WHERE snapshot = ? "
+                    "AND storage_function = ?",
+                    key,
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO maps VALUES (?, ?, ?, ?, ?)",
+                    (
+                        snapshot,
+                        module,
+                        storage_function,
+                        _dumps(params),
+                        len(entries),
+                    ),
+                )
+                rows = (
+                    (*key, _dumps(k), *_leading_keys(k), _dumps(v))
+                    for k, v in entries.items()
+                )
+                self._db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+        return StoredSnapshot(self, snapshot, block_hash, block_number)
+
+    def export(
+        self,
+        client: TorusClient,
+        functions: dict[str, list[tuple[str, list[Any]]]],
+        block_hash: str | None = None,
+    ) -> StoredSnapshot:
+        """
+        Reads maps from the network at one block and stores them.
+
+        Args:
+            client: The client to read the maps with.
+            functions: A dictionary mapping module names to lists of storage
+              maps and their fixed leading keys, as for `query_batch_map`.
+            block_hash: The block to read at. Defaults to the chain head.
+        """
+        snapshot = client.snapshot(block_hash)
+        maps = snapshot.query_batch_map(functions)
+        block = snapshot.get_block()
+        block_number = None
+        if block is not None:
+            block_number = block["header"]["number"]
+        return self.save(snapshot.block_hash, maps, block_number, functions)
+
+    def snapshots(self) -> list[SnapshotInfo]:
+        """
+        Lists the stored snapshots, oldest block first.
+        """
+        rows = self.query(
+            "SELECT s.id, s.block_hash, s.block_number, s.created_at, "
+            "m.storage_function, m.size FROM snapshots s "
+            "LEFT JOIN maps m ON m.snapshot = s.id "
+            "ORDER BY s.block_number, s.created_at"
+        )
+        infos: dict[int, SnapshotInfo] = {}
+        for id, block_hash, block_number, created_at, name, size in rows:
+            if id not in infos:
+                infos[id] = SnapshotInfo(
+                    block_hash, block_number, created_at, {}
+                )
+            if name is not None:
+                infos[id].maps[name] = size
+        return list(infos.values())
+
+    def open(self, block_hash: str | None = None) -> StoredSnapshot:
+        """
+        Opens a stored snapshot.
+
+        Args:
+            block_hash: The block of the snapshot. Defaults to the latest
+              block stored.
+
+        Raises:
+            KeyError: If there is no such snapshot.
+        """
+        if block_hash is None:
+            rows = self.query(
+                "SELECT id, block_hash, block_number FROM snapshots "
+                "ORDER BY block_number DESC, created_at DESC LIMIT 1"
+            )
+        else:
+            rows = self.query(
+                "SELECT id, block_hash, block_number FROM snapshots "
+                "WHERE block_hash = ?",
+                (block_hash,),
+            )
+        if not rows:
+            raise KeyError(f"No snapshot stored for block {block_hash}")
+        ((snapshot, stored_hash, block_number),) = rows
+        return StoredSnapshot(self, snapshot, stored_hash, block_number)
+
+    def delete(self, block_hash: str):
+        """
+        Drops a stored snapshot and its maps.
+        """
+        with self._lock, self._db:
+            rows = self._db.execute(
+                "SELECT id FROM snapshots WHERE block_hash = ?", (block_hash,)
+            ).fetchall()
+            for (snapshot,) in rows:
+                self._db.execute(
+                    "DELETE FROM entries WHERE snapshot = ?", (snapshot,)
+                )
+                self._db.execute(
+                    "DELETE FROM maps WHERE snapshot = ?", (snapshot,)
+                )
+                self._db.execute(
+                    "DELETE FROM snapshots WHERE id = ?", (snapshot,)
+                )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,245 @@
+"""
+Cache of raw storage read at pinned blocks.
+
+Storage read at a given block hash never changes, so the raw values returned
+by `state_queryStorageAt` can be served again without asking a node. Values
+are keyed by block hash and storage key, kept in memory up to a byte budget,
+least recently used first out, and optionally spilled to an SQLite file
+instead of being dropped.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+from torusdk.key import TORUS_HOME
+
+STORAGE_CACHE_BYTES = 32 * 1024 * 1024
+STORAGE_SPILL_PATH = os.path.join(TORUS_HOME, "storage.sqlite")
+STORAGE_SPILL_BYTES = 1024 * 1024 * 1024
+ENTRY_OVERHEAD = 160
+"""Rough size in bytes of the Python objects holding a cached entry."""
+_SQLITE_VARIABLES = 500
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters of a storage cache. `size` is the memory held, in bytes.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    disk_hits: int = 0
+    evictions: int = 0
+    spilled: int = 0
+    size: int = 0
+
+
+def _entry_size(key: str, value: str | None) -> int:
+    return len(key) + len(value or "") + ENTRY_OVERHEAD
+
+
+class DiskSpill:
+    """
+    SQLite store of the entries evicted from a `StorageCache`.
+
+    Entries are dropped oldest first once the file holds more than
+    `max_bytes` of keys and values.
+    """
+
+    path: str
+    max_bytes: int
+    _size: int
+
+    def __init__(
+        self,
+        path: str = STORAGE_SPILL_PATH,
+        max_bytes: int = STORAGE_SPILL_BYTES,
+    ):
+        """
+        Args:
+            path: The SQLite file, created if missing.
+            max_bytes: Bytes of keys and values kept in the file.
+        """
+        assert max_bytes > 0
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS storage ("
+                "block_hash TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+                "size INTEGER NOT NULL, PRIMARY KEY (block_hash, key))"
+            )
+        (self._size,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM storage"
+        ).fetchone()
+
+    def get_many(
+        self, block_hash: str, keys: list[str]
+    ) -> dict[str, str | None]:
+        """
+        Gets the entries of `keys` stored at `block_hash`, leaving out those
+        not stored.
+        """
+        found: dict[str, str | None] = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_VARIABLES):
+                batch = keys[start : start + _SQLITE_VARIABLES]
+                rows = self._db.execute(
+                    "SELECT key, value FROM storage WHERE block_hash = ? "
+                    f"AND key IN ({','.join('?' * len(batch))})",
+                    [block_hash, *batch],
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, entries: Iterable[tuple[str, str, str | None]]):
+        """
+        Stores `(block_hash, key, value)` entries.
+        """
+        with self._lock, self._db:
+            for block_hash, key, value in entries:
+                size = len(key) + len(value or "")
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO storage VALUES (?, ?, ?, ?)",
+                    (block_hash, key, value, size),
+                ).rowcount
+                if inserted:
+                    self._size += size
+            while self._size > self.max_bytes:
+                oldest = self._db.execute(
+                    "SELECT rowid, size FROM storage ORDER BY rowid LIMIT ?",
+                    (_SQLITE_VARIABLES,),
+                ).fetchall()
+                if not oldest:
+                    self._size = 0
+                    break
+                self._db.execute(
+                    "DELETE FROM storage WHERE rowid IN "
+                    f"({','.join('?' * len(oldest))})",
+                    [rowid for rowid, _ in oldest],
+                )
+                self._size -= sum(size for _, size in oldest)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class StorageCache:
+    """
+    LRU cache of raw storage values, keyed by block hash and storage key,
+    with a byte budget.
+
+    A value of None records storage known to be empty at that block. Entries
+    evicted from memory go to `spill` when there is one, and are promoted
+    back on their next lookup.
+    """
+
+    max_bytes: int
+    spill: DiskSpill | None
+    _entries: OrderedDict[tuple[str, str], str | None]
+
+    def __init__(
+        self,
+        max_bytes: int = STORAGE_CACHE_BYTES,
+        spill: DiskSpill | None = None,
+    ):
+        """
+        Args:
+            max_bytes: Memory held by cached entries, approximately.
+            spill: Where to move the entries evicted from memory. If None,
+              they are dropped.
+        """
+        assert max_bytes > 0
+        self.max_bytes = max_bytes
+        self.spill = spill
+        self._entries = OrderedDict()
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+    def lookup(
+        self, block_hash: str, keys: list[str]
+    ) -> tuple[dict[str, str | None], list[str]]:
+        """
+        Looks up the values of `keys` at `block_hash`.
+
+        Returns:
+            The cached values by key, and the keys that aren't cached, in
+            order.
+        """
+        found: dict[str, str | None] = {}
+        missing: list[str] = []
+        with self._lock:
+            for key in keys:
+                entry = (block_hash, key)
+                if entry in self._entries:
+                    self._entries.move_to_end(entry)
+                    found[key] = self._entries[entry]
+                else:
+                    missing.append(key)
+        if missing and self.spill is not None:
+            spilled = self.spill.get_many(block_hash, missing)
+            if spilled:
+                found.update(spilled)
+                missing = [key for key in missing if key not in spilled]
+                self.store(block_hash, spilled.items())
+                with self._lock:
+                    self._stats.disk_hits += len(spilled)
+        with self._lock:
+            self._stats.hits += len(found)
+            self._stats.misses += len(missing)
+        return found, missing
+
+    def store(self, block_hash: str, values: Iterable[tuple[str, str | None]]):
+        """
+        Caches the values of storage keys at `block_hash`.
+        """
+        evicted: list[tuple[str, str, str | None]] = []
+        with self._lock:
+            for key, value in values:
+                entry = (block_hash, key)
+                if entry in self._entries:
+                    self._entries.move_to_end(entry)
+                    continue
+                self._entries[entry] = value
+                self._stats.size += _entry_size(key, value)
+            while self._stats.size > self.max_bytes and self._entries:
+                (old_hash, old_key), old_value = self._entries.popitem(
+                    last=False
+                )
+                self._stats.size -= _entry_size(old_key, old_value)
+                self._stats.evictions += 1
+                evicted.append((old_hash, old_key, old_value))
+            if self.spill is not None:
+                self._stats.spilled += len(evicted)
+        if evicted and self.spill is not None:
+            self.spill.put_many(evicted)
+
+    def clear(self):
+        """
+        Drops the entries held in memory.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._stats.size = 0
+
+    def close(self):
+        self.clear()
+        if self.spill is not None:
+            self.spill.close()
@@ -0,0 +1,691 @@
+"""
+JSON-RPC transports used by `torusdk.client.TorusClient`.
+"""
+
+import http.client
+import itertools
+import select
+import socket
+import ssl
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, cast
+from urllib.parse import urlsplit
+
+import websocket
+
+from torusdk.codec import DEFAULT_CODEC, JsonCodec
+from torusdk.errors import NetworkError, NetworkQueryError, NetworkTimeoutError
+
+KEEPALIVE_INTERVAL = 11
+MAX_UNCLAIMED_NOTIFICATIONS = 64
+"""Notifications kept for subscriptions whose id isn't known yet."""
+RESPONSE_TIMEOUT = 120.0
+"""Seconds to wait for a multiplexed response when no timeout is given."""
+REQUEST_TOO_LARGE = -32007
+"""The JSON-RPC error code of nodes rejecting a request as too large."""
+
+
+@dataclass
+class TrafficStats:
+    """
+    Websocket traffic counters.
+
+    Byte counts are of message payloads, before framing and compression.
+    """
+
+    messages_sent: int = 0
+    bytes_sent: int = 0
+    messages_received: int = 0
+    bytes_received: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record_sent(self, size: int):
+        with self._lock:
+            self.messages_sent += 1
+            self.bytes_sent += size
+
+    def record_received(self, size: int):
+        with self._lock:
+            self.messages_received += 1
+            self.bytes_received += size
+
+
+class TorusWebSocket(websocket.WebSocket):
+    """
+    `websocket.WebSocket` counting its data traffic, splitting outgoing
+    messages into frames of at most `max_frame_size` bytes, and refusing
+    incoming messages larger than `max_message_size` bytes.
+
+    The incoming size is checked frame by frame, so a fragmented message is
+    refused as soon as its frames add up past the limit, but a single frame
+    is read whole before being checked.
+
+    Sends must be serialized by the caller, as the frames of a fragmented
+    message are sent one by one.
+    """
+
+    traffic: TrafficStats | None
+    max_frame_size: int | None
+    max_message_size: int | None
+    _message_size: int
+
+    def __init__(
+        self,
+        traffic: TrafficStats | None = None,
+        max_frame_size: int | None = None,
+        max_message_size: int | None = None,
+        **kwargs: Any,
+    ):
+        assert max_frame_size is None or max_frame_size > 0
+        assert max_message_size is None or max_message_size > 0
+        super().__init__(**kwargs)  # type: ignore
+        self.traffic = traffic
+        self.max_frame_size = max_frame_size
+        self.max_message_size = max_message_size
+        self._message_size = 0
+
+    def send(  # type: ignore
+        self, payload: bytes | str, opcode: int = websocket.ABNF.OPCODE_TEXT
+    ) -> int:
+        if opcode not in (
+            websocket.ABNF.OPCODE_TEXT,
+            websocket.ABNF.OPCODE_BINARY,
+        ):
+            # control frames, which can't be fragmented
+            return super().send(payload, opcode)  # type: ignore
+        data = payload.encode() if isinstance(payload, str) else payload
+        if self.traffic is not None:
+            self.traffic.record_sent(len(data))
+        if self.max_frame_size is None or len(data) <= self.max_frame_size:
+            return super().send(data, opcode)  # type: ignore
+        sent = 0
+        for start in range(0, len(data), self.max_frame_size):
+            chunk = data[start : start + self.max_frame_size]
+            fin = int(start + self.max_frame_size >= len(data))
+            frame = websocket.ABNF.create_frame(  # type: ignore
+                chunk,
+                opcode if start == 0 else websocket.ABNF.OPCODE_CONT,
+                fin,
+            )
+            sent += self.send_frame(frame)  # type: ignore
+        return sent
+
+    def recv_frame(self) -> websocket.ABNF:
+        """
+        Raises:
+            websocket.WebSocketPayloadException: If the message being
+              received is larger than `max_message_size`. The connection is
+              closed, as the rest of the message can't be skipped.
+        """
+        frame = super().recv_frame()
+        if self.max_message_size is None:
+            return frame
+        if frame.opcode in (
+            websocket.ABNF.OPCODE_TEXT,
+            websocket.ABNF.OPCODE_BINARY,
+        ):
+            self._message_size = 0
+        elif frame.opcode != websocket.ABNF.OPCODE_CONT:
+            return frame
+        self._message_size += len(frame.data)
+        if self._message_size > self.max_message_size:
+            size = self._message_size
+            self._message_size = 0
+            self.shutdown()
+            raise websocket.WebSocketPayloadException(
+                f"Message of at least {size} bytes exceeds the "
+                f"{self.max_message_size} bytes limit"
+            )
+        return frame
+
+    def recv_data(  # type: ignore
+        self, control_frame: bool = False
+    ) -> tuple[int, bytes]:
+        opcode, data = super().recv_data(control_frame)  # type: ignore
+        if self.traffic is not None and opcode in (
+            websocket.ABNF.OPCODE_TEXT,
+            websocket.ABNF.OPCODE_BINARY,
+        ):
+            self.traffic.record_received(len(data))  # type: ignore
+        return opcode, data  # type: ignore
+
+
+def open_websocket(
+    url: str,
+    ws_options: dict[str, int] | None = None,
+    traffic: TrafficStats | None = None,
+) -> TorusWebSocket:
+    """
+    Opens a websocket to a node.
+
+    Args:
+        url: The URL of the network node to connect to.
+        ws_options: Socket tuning. `max_frame_size` is the largest outgoing
+          frame in bytes, `max_message_size` the largest incoming message
+          in bytes, and `recv_buffer_size` the kernel receive buffer size in
+          bytes, which bounds the TCP window of bandwidth-bound transfers.
+        traffic: Counters to record the traffic of the websocket in.
+    """
+    ws_options = ws_options or {}
+    sockopt: list[tuple[int, int, int]] = []
+    if ws_options.get("recv_buffer_size"):
+        sockopt.append(
+            (
+                socket.SOL_SOCKET,
+                socket.SO_RCVBUF,
+                ws_options["recv_buffer_size"],
+            )
+        )
+    ws = TorusWebSocket(
+        traffic=traffic,
+        max_frame_size=ws_options.get("max_frame_size"),
+        max_message_size=ws_options.get("max_message_size"),
+        sockopt=sockopt,
+    )
+    ws.connect(url)  # type: ignore
+    return ws
+
+
+def recv_json(ws: websocket.WebSocket, codec: JsonCodec) -> Any:
+    """
+    Receives a JSON message, decoding the raw frame bytes with `codec`
+    rather than going through `str`.
+
+    Raises:
+        websocket.WebSocketConnectionClosedException: If the node closed
+          the connection.
+    """
+    opcode, data = ws.recv_data()  # type: ignore
+    if opcode == websocket.ABNF.OPCODE_CLOSE:
+        raise websocket.WebSocketConnectionClosedException(
+            "Connection closed by the node"
+        )
+    return codec.loads(data)  # type: ignore
+
+
+def send_json(ws: websocket.WebSocket, codec: JsonCodec, payload: Any):
+    """
+    Sends `payload` as a JSON text frame encoded with `codec`.
+    """
+    ws.send(codec.dumps(payload))  # type: ignore
+
+
+class MultiplexedWebsocket:
+    """
+    A websocket shared by any number of threads.
+
+    Requests get a connection-wide unique JSON-RPC id and are sent right
+    away; a dedicated reader thread routes each response to the `Future`
+    waiting on its id. Callers never hold the socket for a round trip, so
+    many batches can be in flight on a single connection.
+
+    Subscription notifications are routed by subscription id to the
+    callback given to `subscribe`, on the reader thread.
+    """
+
+    url: str
+    _ws: websocket.WebSocket
+    _codec: JsonCodec
+    _pending: dict[int, Future[dict[str, Any]]]
+    _batches: dict[int, list[int]]
+    _subscriptions: dict[Any, Callable[[Any], None]]
+    _unclaimed: dict[Any, list[Any]]
+
+    def __init__(
+        self,
+        url: str,
+        codec: JsonCodec = DEFAULT_CODEC,
+        ws_options: dict[str, int] | None = None,
+        traffic: TrafficStats | None = None,
+    ):
+        """
+        Args:
+            url: The URL of the network node to connect to.
+            codec: The JSON codec of the traffic.
+            ws_options: Socket tuning, as taken by `open_websocket`.
+            traffic: Counters to record the traffic of the websocket in.
+        """
+        self.url = url
+        self._codec = codec
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._batches = {}
+        self._subscriptions = {}
+        self._unclaimed = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._ws = open_websocket(url, ws_options, traffic)
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def connected(self) -> bool:
+        return not self._closed.is_set()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of requests waiting for a response.
+        """
+        return len(self._pending)
+
+    def _fail_pending(self, error: Exception):
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._batches.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _resolve(self, request_id: Any) -> Future[dict[str, Any]] | None:
+        with self._pending_lock:
+            self._batches.pop(request_id, None)
+            return self._pending.pop(request_id, None)
+
+    def _fail_unmatched(self, error: Any, answered: list[list[int]]):
+        """
+        Fails the requests a JSON-RPC error without a known id answers, e.g.
+        a parse error or a request too large, which nodes send with a null
+        id. It is tied to the batch of the responses received with it, or to
+        the only batch in flight; otherwise every pending request fails.
+        """
+        with self._pending_lock:
+            batch = answered[0] if answered else None
+            if batch is None:
+                batches = {id(ids): ids for ids in self._batches.values()}
+                if len(batches) == 1:
+                    (batch,) = batches.values()
+            failed = list(self._pending) if batch is None else batch
+            futures = [self._pending.pop(i, None) for i in failed]
+            for request_id in failed:
+                self._batches.pop(request_id, None)
+        for future in futures:
+            if future is not None and not future.done():
+                future.set_exception(NetworkQueryError(error))
+
+    def _notify(self, message: dict[str, Any]):
+        params = message.get("params")
+        if not isinstance(params, dict) or "subscription" not in params:
+            return
+        subscription = params["subscription"]  # type: ignore
+        result = params.get("result")  # type: ignore
+        # under the lock, so callbacks see notifications in order, even
+        # those received before `subscribe` registered them
+        with self._pending_lock:
+            callback = self._subscriptions.get(subscription)
+            if callback is not None:
+                callback(result)
+                return
+            if len(self._unclaimed) >= MAX_UNCLAIMED_NOTIFICATIONS:
+                del self._unclaimed[next(iter(self._unclaimed))]
+            self._unclaimed.setdefault(subscription, []).append(result)
+
+    def _wait_readable(self) -> bool:
+        """
+        Waits up to `KEEPALIVE_INTERVAL` seconds for data to read, without
+        touching the socket timeout, which also bounds sends.
+        """
+        sock = cast(socket.socket | None, self._ws.sock)  # type: ignore
+        if sock is None:
+            raise websocket.WebSocketConnectionClosedException(
+                "Connection closed"
+            )
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            # decrypted already, select wouldn't see it
+            return True
+        readable, _, _ = select.select([sock], (), (), KEEPALIVE_INTERVAL)
+        return bool(readable)
+
+    def _read_loop(self):
+        error = NetworkError(f"Websocket connection to {self.url} closed")
+        try:
+            while not self._closed.is_set():
+                if not self._wait_readable():
+                    # keeps idle sockets alive
+                    with self._send_lock:
+                        self._ws.pong(b"")  # type: ignore
+                    continue
+                received: Any = recv_json(self._ws, self._codec)
+                if isinstance(received, dict):
+                    received = [received]
+                answered: list[list[int]] = []
+                unmatched: list[Any] = []
+                for message in received:
+                    if "id" not in message:
+                        self._notify(message)
+                        continue
+                    with self._pending_lock:
+                        batch = self._batches.get(message["id"])
+                    future = self._resolve(message["id"])
+                    if future is None:
+                        if "error" in message:
+                            unmatched.append(message["error"])
+                        continue
+                    if batch is not None:
+                        answered.append(batch)
+                    if not future.done():
+                        future.set_result(message)
+                for error in unmatched:
+                    self._fail_unmatched(error, answered)
+        except Exception as e:
+            if not self._closed.is_set():
+                error = NetworkError(
+                    f"Websocket connection to {self.url} failed: {e}"
+                )
+        finally:
+            self._closed.set()
+            self._fail_pending(error)
+
+    def send(
+        self, batch_payload: list[dict[str, Any]]
+    ) -> list[Future[dict[str, Any]]]:
+        """
+        Sends a batch of JSON-RPC requests.
+
+        The ids in `batch_payload` are replaced by connection-wide unique ones
+        on copies of the requests, so callers can number their batches freely.
+
+        Returns:
+            One future per request, in request order, resolving to the whole
+            response message. The futures fail with `NetworkError` if the
+            connection is closed, and with `NetworkQueryError` if the node
+            answers the batch with an error it can't tie to a request.
+        """
+        futures: list[Future[dict[str, Any]]] = []
+        payload: list[dict[str, Any]] = []
+        batch: list[int] = []
+        with self._pending_lock:
+            for message in batch_payload:
+                request_id = next(self._ids)
+                future: Future[dict[str, Any]] = Future()
+                self._pending[request_id] = future
+                self._batches[request_id] = batch
+                batch.append(request_id)
+                futures.append(future)
+                payload.append({**message, "id": request_id})
+        if self._closed.is_set():
+            # the reader may have failed the pending requests already
+            self._fail_pending(
+                NetworkError(f"Websocket connection to {self.url} closed")
+            )
+            return futures
+        try:
+            with self._send_lock:
+                send_json(self._ws, self._codec, payload)
+        except Exception as e:
+            self.close()
+            self._fail_pending(
+                NetworkError(f"Websocket connection to {self.url} failed: {e}")
+            )
+        return futures
+
+    def subscribe(
+        self,
+        method: str,
+        params: list[Any],
+        callback: Callable[[Any], None],
+        timeout: float | None = RESPONSE_TIMEOUT,
+    ) -> Any:
+        """
+        Subscribes to notifications, e.g. with `state_subscribeStorage`.
+
+        Args:
+            method: The subscription method.
+            params: Its parameters.
+            callback: Called with the result of every notification, in
+              order, on the reader thread, so it must not block.
+            timeout: Seconds to wait for the node to accept the
+              subscription.
+
+        Returns:
+            The subscription id, to unsubscribe with.
+
+        Raises:
+            NetworkQueryError: If the node refuses the subscription.
+            NetworkTimeoutError: If it doesn't answer within `timeout`.
+            NetworkError: If the connection is closed.
+        """
+        request = {"jsonrpc": "2.0", "method": method, "params": params}
+        (future,) = self.send([request])
+        try:
+            message = future.result(timeout)
+        except FutureTimeoutError:
+            raise NetworkTimeoutError(f"No response after {timeout} seconds")
+        if "error" in message:
+            raise NetworkQueryError(message["error"])
+        subscription = message["result"]
+        with self._pending_lock:
+            self._subscriptions[subscription] = callback
+            for result in self._unclaimed.pop(subscription, []):
+                callback(result)
+        return subscription
+
+    def unsubscribe(self, method: str, subscription: Any):
+        """
+        Stops routing the notifications of a subscription, and asks the node
+        to cancel it with `method`, without waiting for its answer.
+        """
+        with self._pending_lock:
+            self._subscriptions.pop(subscription, None)
+        if self.connected:
+            request = {
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": [subscription],
+            }
+            self.send([request])
+
+    def close(self):
+        """
+        Closes the websocket, failing every request still in flight.
+        """
+        self._closed.set()
+        try:
+            self._ws.close()  # type: ignore
+        except Exception:
+            pass
+
+
+def http_url(url: str) -> str:
+    """
+    The HTTP(S) JSON-RPC endpoint served next to a node websocket endpoint.
+    """
+    for ws_scheme, http_scheme in (
+        ("wss://", "https://"),
+        ("ws://", "http://"),
+    ):
+        if url.startswith(ws_scheme):
+            return http_scheme + url[len(ws_scheme) :]
+    return url
+
+
+class HttpTransport:
+    """
+    Stateless JSON-RPC over HTTP(S), for read-only calls.
+
+    Batches are POSTed over a pool of keep-alive connections, so concurrent
+    batches are in flight on separate connections and nothing is pinned to a
+    thread. Subscriptions are not supported.
+    """
+
+    url: str
+    _codec: JsonCodec
+    _timeout: float | None
+    _traffic: TrafficStats | None
+    _idle: list[http.client.HTTPConnection]
+
+    def __init__(
+        self,
+        url: str,
+        codec: JsonCodec = DEFAULT_CODEC,
+        pool_size: int = 10,
+        timeout: float | None = None,
+        traffic: TrafficStats | None = None,
+    ):
+        """
+        Args:
+            url: The URL of the network node, either its HTTP(S) endpoint or
+              its websocket one, served on the same port.
+            codec: The JSON codec of the traffic.
+            pool_size: The maximum number of idle keep-alive connections.
+            timeout: Seconds to wait for each response before giving up.
+            traffic: Counters to record the traffic in.
+        """
+        assert pool_size > 0
+        self.url = http_url(url)
+        parts = urlsplit(self.url)
+        assert parts.scheme in ("http", "https") and parts.hostname
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += "?" + parts.query
+        self._codec = codec
+        self._timeout = timeout
+        self._traffic = traffic
+        self._pool_size = pool_size
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._https:
+            return http.client.HTTPSConnection(
+                self._host, self._port, timeout=self._timeout
+            )
+        return http.client.HTTPConnection(
+            self._host, self._port, timeout=self._timeout
+        )
+
+    def _post(self, body: bytes) -> tuple[int, bytes]:
+        headers = {"Content-Type": "application/json"}
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.request("POST", self._path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (
+                http.client.RemoteDisconnected,
+                ConnectionResetError,
+                BrokenPipeError,
+            ):
+                connection.close()
+                if not reused:
+                    raise
+                # the node closed the idle connection, try a fresh one
+                connection, reused = None, False
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            break
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                if len(self._idle) < self._pool_size:
+                    self._idle.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+        return response.status, data
+
+    def _error(self, received: Any, ids: list[int]) -> Any:
+        """
+        The JSON-RPC error of a response not answering any request, as sent
+        for requests too large, parse errors or rate limits.
+        """
+        messages: list[Any] = []
+        if isinstance(received, dict):
+            messages = [received]
+        elif isinstance(received, list):
+            messages = received  # type: ignore
+        for message in messages:
+            if (
+                isinstance(message, dict)
+                and "error" in message
+                and message.get("id") not in ids  # type: ignore
+            ):
+                return message["error"]  # type: ignore
+        return None
+
+    def send(self, batch_payload: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Sends a batch of JSON-RPC requests in a single POST.
+
+        The ids in `batch_payload` are replaced by unique ones on copies of
+        the requests, like `MultiplexedWebsocket.send`.
+
+        Returns:
+            The response messages, in request order.
+
+        Raises:
+            NetworkQueryError: If the node answers the whole batch with a
+              JSON-RPC error, e.g. as too large, which HTTP 413 also maps to.
+            NetworkTimeoutError: If the node doesn't respond in time.
+            NetworkError: If the request fails or gets an HTTP error.
+        """
+        with self._lock:
+            ids = [next(self._ids) for _ in batch_payload]
+        payload = [
+            {**message, "id": request_id}
+            for message, request_id in zip(batch_payload, ids)
+        ]
+        body = self._codec.dumps(payload)
+        if self._traffic is not None:
+            self._traffic.record_sent(len(body))
+        try:
+            status, data = self._post(body)
+        except (socket.timeout, TimeoutError):
+            raise NetworkTimeoutError(
+                f"No response from {self.url} after {self._timeout} seconds"
+            )
+        except (OSError, http.client.HTTPException) as e:
+            raise NetworkError(f"HTTP request to {self.url} failed: {e}")
+        if self._traffic is not None:
+            self._traffic.record_received(len(data))
+        if status == 413:
+            raise NetworkQueryError(
+                {"code": REQUEST_TOO_LARGE, "message": "Request too large"}
+            )
+        try:
+            received: Any = self._codec.loads(data)
+        except Exception:
+            received = None
+        error = self._error(received, ids)
+        if error is not None:
+            raise NetworkQueryError(error)
+        if status != 200 or received is None:
+            text = data[:200].decode(errors="replace")
+            raise NetworkError(
+                f"HTTP request to {self.url} failed with status "
+                f"{status}: {text}"
+            )
+        if isinstance(received, dict):
+            received = [received]
+        by_id = {message.get("id"): message for message in received}
+        try:
+            return [by_id[request_id] for request_id in ids]
+        except KeyError:
+            raise NetworkError(
+                f"Incomplete batch response from {self.url}: {received}"
+            )
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
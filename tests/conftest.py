@@ -0,0 +1,237 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, cast
+
+import pytest
+from aiohttp import web
+from scalecodec.base import RuntimeConfigurationObject, ScaleBytes
+from scalecodec.type_registry import load_type_registry_preset  # type: ignore
+
+NO_REPLY = object()
+"""Returned by `FakeNode.batch_reply` to leave a batch unanswered."""
+
+
+class RpcError(Exception):
+    """
+    Raised by a `FakeNode` handler to answer with a JSON-RPC error.
+    """
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.error = {"code": code, "message": message}
+
+
+class FakeNode:
+    """
+    A node serving JSON-RPC over websockets and HTTP POSTs on the same port,
+    from an event loop of its own thread.
+
+    Requests are answered by the handler of their method, called with their
+    params; methods without one answer "Method not found".
+    """
+
+    url: str
+    handlers: dict[str, Callable[[list[Any]], Any]]
+    requests: list[dict[str, Any]]
+    batch_reply: Callable[[list[dict[str, Any]]], Any] | None
+    http_status: int | None
+
+    def __init__(self):
+        self.handlers = {"system_chain": lambda _: "Torus"}
+        self.requests = []
+        # replaces the answer to a whole batch, or NO_REPLY
+        self.batch_reply = None
+        # answers POSTs with this bare status instead
+        self.http_status = None
+        self._sockets: list[web.WebSocketResponse] = []
+        self._queued: list[dict[str, Any]] = []
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get("/", self._serve_websocket)
+        app.router.add_post("/", self._serve_http)
+        app.on_shutdown.append(self._close_sockets)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        port = self._runner.addresses[0][1]
+        self.url = f"ws://127.0.0.1:{port}/"
+        self._thread = threading.Thread(target=self._loop.run_forever)
+        self._thread.start()
+
+    def methods(self) -> list[str]:
+        return [request["method"] for request in self.requests]
+
+    def queue_notification(self, subscription: Any, result: Any):
+        """
+        Sends a notification after the reply being built, on its socket.
+        """
+        self._queued.append(notification(subscription, result))
+
+    def notify(self, subscription: Any, result: Any):
+        """
+        Sends a notification on every open websocket.
+        """
+        message = json.dumps(notification(subscription, result))
+
+        async def send():
+            for ws in self._sockets:
+                if not ws.closed:
+                    await ws.send_str(message)
+
+        asyncio.run_coroutine_threadsafe(send(), self._loop).result(5)
+
+    def disconnect(self):
+        """
+        Closes every open websocket.
+        """
+        asyncio.run_coroutine_threadsafe(
+            self._close_sockets(None), self._loop
+        ).result(5)
+
+    def _answer(self, request: dict[str, Any]) -> dict[str, Any]:
+        self.requests.append(request)
+        response: dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+        handler = self.handlers.get(request["method"])
+        if handler is None:
+            response["error"] = {"code": -32601, "message": "Method not found"}
+            return response
+        try:
+            response["result"] = handler(request["params"])
+        except RpcError as e:
+            response["error"] = e.error
+        return response
+
+    def _reply(self, received: Any) -> Any:
+        if isinstance(received, dict):
+            return self._answer(cast(dict[str, Any], received))
+        batch = cast(list[dict[str, Any]], received)
+        if self.batch_reply is not None:
+            self.requests.extend(batch)
+            return self.batch_reply(batch)
+        return [self._answer(request) for request in batch]
+
+    async def _serve_websocket(self, request: web.Request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        async for message in ws:
+            reply = self._reply(json.loads(message.data))
+            if reply is not NO_REPLY:
+                await ws.send_str(json.dumps(reply))
+            queued, self._queued = self._queued, []
+            for queued_message in queued:
+                await ws.send_str(json.dumps(queued_message))
+        return ws
+
+    async def _serve_http(self, request: web.Request):
+        if self.http_status is not None:
+            return web.Response(status=self.http_status)
+        return web.json_response(self._reply(json.loads(await request.read())))
+
+    async def _close_sockets(self, _: Any):
+        for ws in self._sockets:
+            await ws.close()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(
+            self._runner.cleanup(), self._loop
+        ).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def notification(subscription: Any, result: Any) -> dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "method": "subscription",
+        "params": {"subscription": subscription, "result": result},
+    }
+
+
+@pytest.fixture
+def node() -> Iterator[FakeNode]:
+    node = FakeNode()
+    yield node
+    node.close()
+
+
+def _type(
+    type_id: int, definition: dict[str, Any], path: list[str] = []
+) -> dict[str, Any]:
+    return {
+        "id": type_id,
+        "type": {"path": path, "params": [], "def": definition, "docs": []},
+    }
+
+
+def _map(name: str, hashers: list[str], key: int, value: int) -> dict[str, Any]:
+    return {
+        "name": name,
+        "modifier": "Default",
+        "type": {"Map": {"hashers": hashers, "key": key, "value": value}},
+        "default": "0x0000000000000000",
+        "documentation": [],
+    }
+
+
+@pytest.fixture(scope="session")
+def substrate() -> SimpleNamespace:
+    """
+    Stands in for a `SubstrateInterface` initialized to a V14 runtime whose
+    Torus0 pallet has the maps `Stake: AccountId -> u64`,
+    `Names: u16 -> u64` and `Pairs: (u16, AccountId) -> u64`.
+    """
+    types = [
+        _type(0, {"primitive": "u8"}),
+        _type(1, {"array": {"len": 32, "type": 0}}),
+        _type(
+            2,
+            {"composite": {"fields": [{"name": None, "type": 1, "docs": []}]}},
+            ["sp_core", "crypto", "AccountId32"],
+        ),
+        _type(3, {"primitive": "u16"}),
+        _type(4, {"primitive": "u64"}),
+        _type(5, {"tuple": []}),
+        _type(6, {"tuple": [3, 2]}),
+    ]
+    pallet: dict[str, Any] = {
+        "name": "Torus0",
+        "storage": {
+            "prefix": "Torus0",
+            "entries": [
+                _map("Stake", ["Blake2_128Concat"], 2, 4),
+                _map("Names", ["Twox64Concat"], 3, 4),
+                _map("Pairs", ["Identity", "Blake2_128Concat"], 6, 4),
+            ],
+        },
+        "calls": None,
+        "event": None,
+        "constants": [],
+        "error": None,
+        "index": 0,
+    }
+    v14: dict[str, Any] = {
+        "types": {"types": types},
+        "pallets": [pallet],
+        "extrinsic": {"ty": 5, "version": 4, "signed_extensions": []},
+        "runtime_type": 5,
+    }
+    runtime_config = RuntimeConfigurationObject(implements_scale_info=True)
+    runtime_config.update_type_registry(  # type: ignore
+        load_type_registry_preset("core")  # type: ignore
+    )
+    encoded = runtime_config.create_scale_object(  # type: ignore
+        "MetadataVersioned"
+    ).encode(("0x6d657461", {"V14": v14}))
+    metadata = runtime_config.create_scale_object(  # type: ignore
+        "MetadataVersioned",
+        data=ScaleBytes(encoded.data),  # type: ignore
+    )
+    metadata.decode()  # type: ignore
+    # its storage entries resolve their types through this registry
+    runtime_config.add_portable_registry(metadata)  # type: ignore
+    return SimpleNamespace(metadata=metadata, runtime_version=1, ss58_format=42)
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+import pytest
+
+from tests.conftest import NO_REPLY, FakeNode, RpcError
+from torusdk import async_client
+from torusdk.async_client import AsyncTorusClient
+from torusdk.errors import (
+    ChainTransactionError,
+    NetworkError,
+    NetworkQueryError,
+)
+
+T = TypeVar("T")
+
+
+def run(
+    node: FakeNode,
+    test: Callable[[AsyncTorusClient], Awaitable[T]],
+    **options: Any,
+) -> T:
+    async def main() -> T:
+        async with AsyncTorusClient(
+            node.url, metadata_cache_dir=None, **options
+        ) as client:
+            return await test(client)
+
+    return asyncio.run(main())
+
+
+def echo(params: list[Any]) -> Any:
+    return params[0]
+
+
+def test_concurrent_requests_get_their_own_responses(node: FakeNode):
+    node.handlers["echo"] = echo
+
+    async def test(client: AsyncTorusClient) -> list[Any]:
+        return await asyncio.gather(
+            *(client.rpc_request("echo", [i]) for i in range(100))
+        )
+
+    assert run(node, test, num_connections=2) == list(range(100))
+
+
+def test_batch_results_follow_request_order(node: FakeNode):
+    def reversed_batch(requests: list[dict[str, Any]]) -> Any:
+        return [
+            {"jsonrpc": "2.0", "id": request["id"], "result": request["params"]}
+            for request in reversed(requests)
+        ]
+
+    async def test(client: AsyncTorusClient) -> list[Any]:
+        node.batch_reply = reversed_batch
+        return await client.rpc_request_batch([("echo", [i]) for i in range(5)])
+
+    assert run(node, test) == [[i] for i in range(5)]
+
+
+def test_error_responses_raise(node: FakeNode):
+    async def test(client: AsyncTorusClient):
+        with pytest.raises(NetworkQueryError):
+            await client.rpc_request("missing", [])
+
+    run(node, test)
+
+
+def test_dropped_connection_fails_pending_and_reconnects(node: FakeNode):
+    node.handlers["echo"] = echo
+
+    async def test(client: AsyncTorusClient) -> Any:
+        node.batch_reply = lambda _: NO_REPLY
+        pending = asyncio.ensure_future(
+            client.rpc_request_batch([("echo", [1]), ("echo", [2])])
+        )
+        await asyncio.sleep(0.1)
+        node.disconnect()
+        with pytest.raises(NetworkError):
+            await pending
+        return await client.rpc_request("echo", ["again"])
+
+    assert run(node, test) == "again"
+
+
+def test_notifications_before_registration_are_kept(node: FakeNode):
+    def subscribe(_: list[Any]) -> str:
+        node.queue_notification("sub", 1)
+        node.queue_notification("sub", 2)
+        return "sub"
+
+    node.handlers["chain_subscribeNewHeads"] = subscribe
+
+    async def test(client: AsyncTorusClient) -> list[Any]:
+        conn, subscription_id = await client.subscribe(
+            "chain_subscribeNewHeads", []
+        )
+        await asyncio.sleep(0.1)
+        queue = conn.subscription_queue(subscription_id)
+        await asyncio.to_thread(node.notify, "sub", 3)
+        return [await queue.get() for _ in range(3)]
+
+    assert run(node, test) == [1, 2, 3]
+
+
+def watch(node: FakeNode, *updates: Any):
+    def submit(_: list[Any]) -> str:
+        for update in updates:
+            node.queue_notification("xt", update)
+        return "xt"
+
+    node.handlers["author_submitAndWatchExtrinsic"] = submit
+    node.handlers["author_unwatchExtrinsic"] = lambda _: True
+
+
+def test_watch_extrinsic_returns_its_block(node: FakeNode):
+    watch(node, "ready", {"inBlock": "0x01"}, {"finalized": "0x01"})
+
+    async def test(client: AsyncTorusClient) -> Any:
+        return await client._watch_extrinsic("0x00", False)  # type: ignore
+
+    assert run(node, test) == ("0x01", False)
+    assert node.methods()[-1] == "author_unwatchExtrinsic"
+    node.requests.clear()
+
+    async def finalized(client: AsyncTorusClient) -> Any:
+        return await client._watch_extrinsic("0x00", True)  # type: ignore
+
+    assert run(node, finalized) == ("0x01", True)
+
+
+def test_watch_extrinsic_raises_when_dropped(node: FakeNode):
+    watch(node, "ready", "dropped")
+
+    async def test(client: AsyncTorusClient):
+        with pytest.raises(ChainTransactionError):
+            await client._watch_extrinsic("0x00", False)  # type: ignore
+
+    run(node, test)
+
+
+def test_unwatch_failure_is_logged(
+    node: FakeNode, caplog: pytest.LogCaptureFixture
+):
+    watch(node, {"inBlock": "0x01"})
+
+    def slow_unwatch(_: list[Any]) -> bool:
+        time.sleep(0.3)
+        return True
+
+    node.handlers["author_unwatchExtrinsic"] = slow_unwatch
+
+    async def test(client: AsyncTorusClient) -> Any:
+        return await client._watch_extrinsic("0x00", False)  # type: ignore
+
+    with caplog.at_level(logging.WARNING, "torusdk.async_client"):
+        assert run(node, test, timeout=0.1) == ("0x01", False)
+    assert "Could not unwatch" in caplog.text
+
+
+def test_close_resets_the_substrate(node: FakeNode):
+    node.handlers["echo"] = echo
+
+    async def test(client: AsyncTorusClient) -> Any:
+        assert client._substrate is not None  # type: ignore
+        await client.close()
+        assert client._substrate is None  # type: ignore
+        return await client.rpc_request("echo", ["reopened"])
+
+    assert run(node, test) == "reopened"
+
+
+def test_handler_errors_are_forwarded(node: FakeNode):
+    def refuse(_: list[Any]) -> Any:
+        raise RpcError(1010, "Invalid Transaction")
+
+    node.handlers["author_submitAndWatchExtrinsic"] = refuse
+
+    async def test(client: AsyncTorusClient):
+        with pytest.raises(NetworkQueryError, match="Invalid Transaction"):
+            await client._watch_extrinsic("0x00", False)  # type: ignore
+
+    run(node, test)
+
+
+def test_map_reads_page_their_keys(
+    node: FakeNode, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(async_client, "KEYS_PAGE_SIZE", 3)
+    keys = [f"0xaa{i:02x}" for i in range(8)]
+
+    def keys_paged(params: list[Any]) -> list[str]:
+        prefix, count, start_key, _ = params
+        assert prefix == "0xaa"
+        start = 0 if start_key is None else keys.index(start_key) + 1
+        return keys[start : start + count]
+
+    def query_storage(params: list[Any]) -> list[dict[str, Any]]:
+        page, block_hash = params
+        changes = [[key, f"0x{key[-2:]}"] for key in page]
+        return [{"block": block_hash, "changes": changes}]
+
+    node.handlers["state_getKeysPaged"] = keys_paged
+    node.handlers["state_queryStorageAt"] = query_storage
+
+    async def test(client: AsyncTorusClient) -> Any:
+        return await client._read_map_changes("0xaa", "0x01")  # type: ignore
+
+    changes = run(node, test)
+    assert changes == [[key, f"0x{key[-2:]}"] for key in keys]
+    assert node.methods().count("state_getKeysPaged") == 3
+    assert node.methods().count("state_queryStorageAt") == 3
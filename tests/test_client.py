@@ -0,0 +1,97 @@
+from typing import Any
+
+import pytest
+
+from tests.conftest import FakeNode
+from torusdk.client import (
+    MIN_WORKERS,
+    Chunk,
+    TorusClient,
+    _split_chunks,  # type: ignore
+)
+
+DEAD_URL = "ws://127.0.0.1:1/"
+
+
+def test_multiplexed_socket_fails_over_across_nodes(node: FakeNode):
+    node.handlers["echo"] = lambda params: params
+    client = TorusClient(
+        [DEAD_URL, node.url], multiplex=True, metadata_cache_dir=None
+    )
+    request = {"jsonrpc": "2.0", "method": "echo", "params": [1], "id": 1}
+    try:
+        (response,) = client._send_multiplexed([request])  # type: ignore
+        assert response["result"] == [1]
+        multiplexed = client.get_multiplexed()
+        assert multiplexed.url == node.url
+        failures = {e.url: e.failures for e in client._pool.endpoints}  # type: ignore
+        assert failures == {DEAD_URL: 1, node.url: 0}
+        # a dead socket is opened again on the next send
+        multiplexed.close()
+        (response,) = client._send_multiplexed([request])  # type: ignore
+        assert response["result"] == [1]
+        assert client.get_multiplexed() is not multiplexed
+    finally:
+        client.close()
+
+
+def keys(n: int, start: int = 0) -> list[str]:
+    return [f"0x{i:04x}" for i in range(start, start + n)]
+
+
+def query(n: int, start: int = 0) -> tuple[str, list[Any]]:
+    return ("state_queryStorageAt", [keys(n, start), "0xblock"])
+
+
+def test_small_chunks_are_kept_whole():
+    chunk = Chunk([query(3), query(2)], [["a"], ["b"]], [])
+    assert _split_chunks([chunk], 3) == [chunk]
+
+
+def test_large_requests_move_to_sliced_chunks():
+    decoders: list[Any] = ["decode_a", "decode_b", "decode_c"]
+    chunk = Chunk(
+        [query(2), query(5, 100), query(1)],
+        [["a"], ["b"], ["c"]],
+        decoders,
+    )
+    split = _split_chunks([chunk], 2)
+    kept, *slices = split
+    assert kept.batch_requests == [query(2), query(1)]
+    assert kept.prefix_list == [["a"], ["c"]]
+    assert kept.decoders == ["decode_a", "decode_c"]
+    assert [s.batch_requests for s in slices] == [
+        [("state_queryStorageAt", [keys(2, 100), "0xblock"])],
+        [("state_queryStorageAt", [keys(2, 102), "0xblock"])],
+        [("state_queryStorageAt", [keys(1, 104), "0xblock"])],
+    ]
+    assert all(s.prefix_list == [["b"]] for s in slices)
+    assert all(s.decoders == ["decode_b"] for s in slices)
+
+
+def test_chunk_of_only_large_requests_keeps_no_empty_chunk():
+    decoders: list[Any] = ["decode_a"]
+    chunk = Chunk([query(4)], [["a"]], decoders)
+    split = _split_chunks([chunk], 3)
+    assert [len(s.batch_requests[0][1][0]) for s in split] == [3, 1]
+
+
+@pytest.mark.parametrize(
+    "options, workers",
+    [
+        ({}, 2),
+        ({"max_workers": 1}, 1),
+        ({"multiplex": True}, MIN_WORKERS),
+        ({"multiplex": True, "transport": "http"}, 2),
+    ],
+)
+def test_executor_is_sized_to_the_connections(
+    node: FakeNode, options: dict[str, Any], workers: int
+):
+    client = TorusClient(
+        node.url, num_connections=2, metadata_cache_dir=None, **options
+    )
+    try:
+        assert client.executor.max_workers == workers
+    finally:
+        client.close()
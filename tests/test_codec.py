@@ -0,0 +1,48 @@
+import json
+from typing import Any
+
+import pytest
+
+from torusdk.codec import hex_list_size, json_size
+
+
+def compact(obj: Any) -> int:
+    return len(json.dumps(obj, separators=(",", ":")).encode())
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        "",
+        "plain",
+        'quo"te',
+        "back\\slash",
+        "new\nline",
+        "naïve ✓",
+        0,
+        -12,
+        1.5,
+        True,
+        None,
+        [],
+        {},
+        ["0x00", [1, 2], {}],
+        {"a": 1, "b": [None, "x"]},
+        {1: "int key"},
+        {
+            "jsonrpc": "2.0",
+            "method": "state_queryStorageAt",
+            "params": [["0xab" * 40, "0xcd" * 40], "0x" + "ef" * 32],
+            "id": 7,
+        },
+    ],
+)
+def test_json_size_matches_encoding(obj: Any):
+    assert json_size(obj) == compact(obj)
+
+
+@pytest.mark.parametrize(
+    "values", [[], ["0x"], ["0x00"], ["0x" + "ab" * 32] * 10]
+)
+def test_hex_list_size_matches_encoding(values: list[str]):
+    assert hex_list_size(values) == compact(values)
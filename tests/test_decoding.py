@@ -0,0 +1,103 @@
+import copy
+import hashlib
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from scalecodec.utils.ss58 import ss58_encode
+
+from torusdk.decoding import DecoderRegistry, StorageDecoder
+
+PREFIX = "0x" + "11" * 32
+
+
+def hashed(hash_len: int, key: bytes) -> bytes:
+    # the hash is skipped, so any bytes of its length do
+    return hashlib.blake2b(key, digest_size=hash_len).digest() + key
+
+
+def account(n: int) -> bytes:
+    return n.to_bytes(32, "little")
+
+
+def u16(n: int) -> bytes:
+    return n.to_bytes(2, "little")
+
+
+def u64(n: int) -> str:
+    return "0x" + n.to_bytes(8, "little").hex()
+
+
+def decoder(
+    substrate: SimpleNamespace, storage_function: str, params: list[Any] = []
+) -> StorageDecoder:
+    return DecoderRegistry().get(
+        substrate,  # type: ignore
+        "Torus0",
+        storage_function,
+        params,
+    )
+
+
+def scale_only(decoder: StorageDecoder) -> StorageDecoder:
+    """
+    The same decoder, going through SCALE for every key.
+    """
+    slow = copy.copy(decoder)
+    slow._key_slices = None  # type: ignore
+    return slow
+
+
+def test_sliced_account_keys_match_scale(substrate: SimpleNamespace):
+    stake = decoder(substrate, "Stake")
+    assert stake._key_slices is not None  # type: ignore
+    changes = [
+        (PREFIX + hashed(16, account(n)).hex(), u64(n * 3)) for n in range(50)
+    ]
+    entries = stake.decode_changes(changes, PREFIX)
+    assert entries == scale_only(stake).decode_changes(changes, PREFIX)
+    assert entries[ss58_encode(account(7), ss58_format=42)] == 21
+
+
+def test_sliced_integer_keys_match_scale(substrate: SimpleNamespace):
+    names = decoder(substrate, "Names")
+    assert names._key_slices is not None  # type: ignore
+    keys = [PREFIX + hashed(8, u16(n)).hex() for n in (0, 1, 300, 65535)]
+    decoded = [names.decode_key(key, PREFIX) for key in keys]
+    assert decoded == [0, 1, 300, 65535]
+    assert decoded == [scale_only(names).decode_key(k, PREFIX) for k in keys]
+
+
+def test_sliced_double_map_keys_match_scale(substrate: SimpleNamespace):
+    pairs = decoder(substrate, "Pairs")
+    assert pairs._key_slices is not None  # type: ignore
+    # the first key is hashed with Identity
+    key = PREFIX + (u16(9) + hashed(16, account(2))).hex()
+    expected = (9, ss58_encode(account(2), ss58_format=42))
+    assert pairs.decode_key(key, PREFIX) == expected
+    assert scale_only(pairs).decode_key(key, PREFIX) == expected
+
+    # with the first key fixed, only the account is left in the key
+    by_first = decoder(substrate, "Pairs", [9])
+    prefix = PREFIX + u16(9).hex()
+    assert by_first.decode_key(key, prefix) == expected[1]
+    assert scale_only(by_first).decode_key(key, prefix) == expected[1]
+
+
+def test_keys_of_unexpected_length_go_through_scale(
+    substrate: SimpleNamespace,
+):
+    stake = decoder(substrate, "Stake")
+    short_key = PREFIX + hashed(16, account(1)).hex()[:-2]
+    with pytest.raises(Exception):
+        stake.decode_key(short_key, PREFIX)
+
+
+def test_registry_compiles_each_decoder_once(substrate: SimpleNamespace):
+    registry = DecoderRegistry()
+    stake = registry.get(substrate, "Torus0", "Stake", [])  # type: ignore
+    assert registry.get(substrate, "Torus0", "Stake", []) is stake  # type: ignore
+    pairs = registry.get(substrate, "Torus0", "Pairs", [1])  # type: ignore
+    assert registry.get(substrate, "Torus0", "Pairs", []) is not pairs  # type: ignore
+    upgraded = SimpleNamespace(**{**vars(substrate), "runtime_version": 2})
+    assert registry.get(upgraded, "Torus0", "Stake", []) is not stake  # type: ignore
@@ -0,0 +1,22 @@
+from torusdk.diff import MapDiff
+
+
+def test_apply_updates_entries_in_place():
+    entries = {"a": 1, "b": 2, "c": 3}
+    diff = MapDiff(
+        "StakingTo",
+        "0x01",
+        "0x02",
+        added={"d": 4},
+        changed={"b": 20},
+        removed={"c", "missing"},
+    )
+    assert diff.churn == 4
+    assert diff.apply(entries) is entries
+    assert entries == {"a": 1, "b": 20, "d": 4}
+
+
+def test_apply_readds_removed_key():
+    entries = {"a": 1}
+    diff = MapDiff("Keys", "0x01", "0x02", {"a": 2}, {}, {"a"})
+    assert diff.apply(entries) == {"a": 2}
@@ -0,0 +1,296 @@
+import hashlib
+import itertools
+import time
+from types import SimpleNamespace
+from typing import Any, Iterator
+
+import pytest
+from scalecodec.utils.ss58 import ss58_encode
+
+from tests.conftest import FakeNode
+from torusdk import live as live_module
+from torusdk.decoding import DecoderRegistry, StorageDecoder
+from torusdk.live import REMOVED, SHARDS, LiveMap, ShardedMap
+from torusdk.pool import ReconnectPolicy
+from torusdk.transport import MultiplexedWebsocket
+
+PREFIX = "0x" + "11" * 32
+
+
+def block_hash(number: int) -> str:
+    return f"0x{number:064x}"
+
+
+def storage_key(n: int) -> str:
+    account = n.to_bytes(32, "little")
+    return (
+        PREFIX
+        + (hashlib.blake2b(account, digest_size=16).digest()).hex()
+        + account.hex()
+    )
+
+
+def address(n: int) -> str:
+    return ss58_encode(n.to_bytes(32, "little"), ss58_format=42)
+
+
+def u64(n: int) -> str:
+    return "0x" + n.to_bytes(8, "little").hex()
+
+
+class Chain:
+    """
+    Serves storage and head subscriptions from a `FakeNode`, importing a
+    block on every `import_block`.
+    """
+
+    def __init__(self, node: FakeNode, state: dict[str, str]):
+        self.node = node
+        self.state = state
+        self.number = 1
+        self.storage: dict[str, list[str]] = {}
+        self.heads: set[str] = set()
+        self._ids = itertools.count()
+        node.handlers.update(
+            {
+                "state_subscribeStorage": self._subscribe_storage,
+                "state_unsubscribeStorage": self._unsubscribe_storage,
+                "chain_subscribeNewHeads": self._subscribe_heads,
+                "chain_unsubscribeNewHeads": self._unsubscribe_heads,
+                "chain_getHeader": self._header,
+            }
+        )
+
+    def _head(self) -> dict[str, Any]:
+        return {
+            "number": hex(self.number),
+            "parentHash": block_hash(self.number - 1),
+        }
+
+    def _subscribe_storage(self, params: list[Any]) -> str:
+        subscription = f"s{next(self._ids)}"
+        self.storage[subscription] = params[0]
+        changes = [[key, self.state.get(key)] for key in params[0]]
+        self.node.queue_notification(
+            subscription, {"block": block_hash(self.number), "changes": changes}
+        )
+        return subscription
+
+    def _unsubscribe_storage(self, params: list[Any]) -> bool:
+        return self.storage.pop(params[0], None) is not None
+
+    def _subscribe_heads(self, _: list[Any]) -> str:
+        subscription = f"h{next(self._ids)}"
+        self.heads.add(subscription)
+        self.node.queue_notification(subscription, self._head())
+        return subscription
+
+    def _unsubscribe_heads(self, params: list[Any]) -> bool:
+        self.heads.discard(params[0])
+        return True
+
+    def _header(self, params: list[Any]) -> dict[str, Any]:
+        return {"number": hex(int(params[0], 16))}
+
+    def import_block(self, changes: dict[str, str | None] = {}):
+        """
+        Notifies the storage subscriptions of `changes` in a new block, then
+        its head.
+        """
+        self.number += 1
+        self.notify(changes)
+        for key, value in changes.items():
+            if value is None:
+                self.state.pop(key, None)
+            else:
+                self.state[key] = value
+        self.notify_head()
+
+    def notify(
+        self, changes: dict[str, str | None], only: list[int] | None = None
+    ):
+        """
+        Notifies the storage subscriptions, or those at the indexes `only`,
+        of `changes` in the current block.
+        """
+        for index, (subscription, keys) in enumerate(
+            list(self.storage.items())
+        ):
+            notified = [[key, changes[key]] for key in keys if key in changes]
+            if notified and (only is None or index in only):
+                result = {"block": block_hash(self.number), "changes": notified}
+                self.node.notify(subscription, result)
+
+    def notify_head(self):
+        for subscription in list(self.heads):
+            self.node.notify(subscription, self._head())
+
+
+class Client:
+    """
+    The part of `TorusClient` a `LiveMap` reads with.
+    """
+
+    def __init__(self, node: FakeNode, chain: Chain, decoder: StorageDecoder):
+        self.node = node
+        self.chain = chain
+        self.decoder = decoder
+        self.reconnect_policy = ReconnectPolicy(base_delay=0.01, max_delay=0.05)
+        self.multiplexed: MultiplexedWebsocket | None = None
+
+    def get_block_hash(self) -> str:
+        return block_hash(self.chain.number)
+
+    def describe_maps(self, *_: Any) -> list[tuple[str, StorageDecoder]]:
+        return [(PREFIX, self.decoder)]
+
+    def enumerate_keys(self, *_: Any) -> list[str]:
+        return sorted(self.chain.state)
+
+    def get_multiplexed(self) -> MultiplexedWebsocket:
+        if self.multiplexed is None or not self.multiplexed.connected:
+            self.multiplexed = MultiplexedWebsocket(self.node.url)
+        return self.multiplexed
+
+
+@pytest.fixture(autouse=True)
+def poll_interval(monkeypatch: pytest.MonkeyPatch):
+    # closing waits for a poll, and rescans run when one gets nothing
+    monkeypatch.setattr(live_module, "POLL_INTERVAL", 0.05)
+
+
+@pytest.fixture
+def chain(node: FakeNode) -> Chain:
+    return Chain(node, {storage_key(n): u64(n) for n in range(250)})
+
+
+@pytest.fixture
+def client(
+    node: FakeNode, chain: Chain, substrate: SimpleNamespace
+) -> Iterator[Client]:
+    decoder = DecoderRegistry().get(substrate, "Torus0", "Stake", [])  # type: ignore
+    client = Client(node, chain, decoder)
+    yield client
+    if client.multiplexed is not None:
+        client.multiplexed.close()
+
+
+def live_map(client: Client, **options: Any) -> LiveMap:
+    live = LiveMap(
+        client,  # type: ignore
+        {"Torus0": [("Stake", [])]},
+        timeout=5,
+        keys_per_subscription=100,
+        **options,
+    )
+    live.start()
+    return live
+
+
+def wait_for(live: LiveMap, number: int):
+    deadline = time.monotonic() + 5
+    while (live.block_number or 0) < number:
+        assert live.wait(deadline - time.monotonic()), live.last_error
+
+
+def test_sharded_map_copies_only_changed_shards():
+    base = ShardedMap().updated((n, n) for n in range(1000))
+    assert len(base) == 1000
+    updated = base.updated([(1, "one"), (2, REMOVED), (5000, 5000)])
+    assert (updated[1], updated[5000], len(updated)) == ("one", 5000, 1000)
+    assert 2 not in updated and base[2] == 2 and len(base) == 1000
+    shared = sum(
+        a is b
+        for a, b in zip(base._shards, updated._shards)  # type: ignore
+    )
+    assert shared == SHARDS - 3
+    assert base.updated([(2, REMOVED), (2, 2)]) == base
+
+
+def test_live_map_starts_from_the_initial_values(client: Client):
+    live = live_map(client, rescan_interval=None)
+    try:
+        assert len(live._subscriptions) == 3  # type: ignore
+        assert live.block_number == 1
+        assert dict(live["Stake"]) == {address(n): n for n in range(250)}
+    finally:
+        live.close()
+
+
+def test_live_map_publishes_settled_blocks(client: Client, chain: Chain):
+    live = live_map(client, rescan_interval=None)
+    try:
+        view = live["Stake"]
+        chain.import_block({storage_key(0): u64(999), storage_key(1): None})
+        # block 2 is settled by the head of block 3
+        assert not live.wait(0.3, block_hash(1))
+        chain.import_block()
+        wait_for(live, 2)
+        stake = live["Stake"]
+        assert (stake[address(0)], len(stake)) == (999, 249)
+        assert address(1) not in stake
+        # the mapping read before is left as it was
+        assert (view[address(0)], len(view)) == (0, 250)
+    finally:
+        live.close()
+    deadline = time.monotonic() + 5
+    while chain.storage or chain.heads:
+        assert time.monotonic() < deadline, "subscriptions left"
+        time.sleep(0.05)
+
+
+def test_live_map_publishes_blocks_whole(client: Client, chain: Chain):
+    live = live_map(client, rescan_interval=None)
+    try:
+        changes: dict[str, str | None] = {
+            storage_key(5): u64(41),
+            storage_key(210): u64(42),
+        }
+        chain.number += 1
+        chain.notify(changes, only=[0])
+        time.sleep(0.3)
+        assert live.block_number == 1
+        chain.notify(changes, only=[1, 2])
+        chain.notify_head()
+        chain.import_block()
+        wait_for(live, 2)
+        assert live.get("Stake", address(5)) == 41
+        assert live.get("Stake", address(210)) == 42
+    finally:
+        live.close()
+
+
+def test_live_map_subscribes_to_keys_found_by_rescans(
+    client: Client, chain: Chain
+):
+    live = live_map(client, rescan_interval=0.1)
+    try:
+        new_key = storage_key(5000)
+        chain.import_block({new_key: u64(7)})
+        deadline = time.monotonic() + 5
+        while len(live._subscriptions) < 4:  # type: ignore
+            assert time.monotonic() < deadline, live.last_error
+            time.sleep(0.05)
+        chain.import_block({new_key: u64(8)})
+        chain.import_block()
+        wait_for(live, 3)
+        assert live.get("Stake", address(5000)) == 8
+    finally:
+        live.close()
+
+
+def test_live_map_resubscribes_after_a_disconnect(
+    node: FakeNode, client: Client, chain: Chain
+):
+    live = live_map(client, rescan_interval=None)
+    try:
+        node.disconnect()
+        chain.import_block({storage_key(3): u64(33)})
+        chain.import_block()
+        deadline = time.monotonic() + 10
+        while live.get("Stake", address(3)) != 33:
+            assert time.monotonic() < deadline, live.last_error
+            live.wait(1)
+        assert len(live["Stake"]) == 250
+    finally:
+        live.close()
@@ -0,0 +1,165 @@
+import threading
+
+import pytest
+
+from torusdk import pool
+from torusdk.pool import (
+    AdaptiveChunkSize,
+    BoundedExecutor,
+    CircuitBreaker,
+    ReconnectPolicy,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(pool, "monotonic", clock)
+    return clock
+
+
+def test_circuit_opens_after_consecutive_failures(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_circuit_success_resets_failure_count(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_half_open_lets_one_probe_through(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.available()
+    assert breaker.allow()
+    # the probe is in flight
+    assert not breaker.available()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_failed_probe_reopens(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 9
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_circuit_lost_probe_expires(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_reconnect_delay_is_jittered_below_the_cap():
+    policy = ReconnectPolicy(base_delay=0.5, max_delay=3, multiplier=2)
+    for attempt, cap in [(0, 0.5), (1, 1), (2, 2), (3, 3), (10, 3)]:
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+
+
+def test_reconnect_delay_handles_huge_attempts():
+    policy = ReconnectPolicy(max_delay=5)
+    assert 0 <= policy.delay(10**6) <= 5
+
+
+def test_chunk_size_grows_additively_up_to_maximum():
+    chunk_size = AdaptiveChunkSize(1000, minimum=100, target_latency=5)
+    chunk_size.record_oversized(1000)
+    assert chunk_size.size == 500
+    chunk_size.record_success(500, 1)
+    assert chunk_size.size == 600
+    # chunks smaller than the size say nothing about larger ones
+    chunk_size.record_success(300, 1)
+    assert chunk_size.size == 600
+    for _ in range(10):
+        chunk_size.record_success(chunk_size.size, 1)
+    assert chunk_size.size == 1000
+
+
+def test_chunk_size_shrinks_in_proportion_to_latency():
+    chunk_size = AdaptiveChunkSize(1000, minimum=100, target_latency=5)
+    chunk_size.record_success(1000, 10)
+    assert chunk_size.size == 500
+    # a slow small chunk never grows the size
+    chunk_size.record_success(100, 1)
+    chunk_size.record_success(400, 4)
+    assert chunk_size.size == 500
+
+
+def test_chunk_size_stays_within_bounds():
+    chunk_size = AdaptiveChunkSize(1000, minimum=100, target_latency=5)
+    chunk_size.record_oversized(150)
+    assert chunk_size.size == 100
+    chunk_size.record_success(100, 100)
+    assert chunk_size.size == 100
+
+
+def test_executor_runs_nested_submissions_inline():
+    executor = BoundedExecutor(1)
+    try:
+
+        def outer() -> list[str]:
+            worker = threading.current_thread()
+            inner = [
+                executor.submit(threading.current_thread).result(timeout=5)
+                for _ in range(3)
+            ]
+            assert all(thread is worker for thread in inner)
+            return [thread.name for thread in inner]
+
+        names = executor.submit(outer).result(timeout=5)
+        assert all(name.startswith("torus") for name in names)
+        stats = executor.stats
+        assert (stats.queued, stats.running, stats.completed) == (0, 0, 1)
+    finally:
+        executor.shutdown()
+
+
+def test_executor_inline_errors_land_in_the_future():
+    executor = BoundedExecutor(1)
+    try:
+
+        def fail():
+            raise ValueError("inner")
+
+        def outer() -> BaseException | None:
+            return executor.submit(fail).exception()
+
+        error = executor.submit(outer).result(timeout=5)
+        assert isinstance(error, ValueError)
+    finally:
+        executor.shutdown()
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+from torusdk.snapshot_store import SnapshotStore
+
+BLOCK = "0x" + "01" * 32
+LATER_BLOCK = "0x" + "02" * 32
+ALICE = "5GrwvaEF5zXb26Fz9rcQpDWS57CtERHpNehXCPcNoHGKutQY"
+BOB = "5FHneW46xGXgs5mUiveU4sbTyGBzmstUspZC92UhjJM694ty"
+
+STAKING_TO: dict[Any, Any] = {
+    (ALICE, BOB): 10,
+    (ALICE, ALICE): 2**70,
+    (BOB, ALICE): 3,
+}
+AGENTS: dict[Any, Any] = {
+    ALICE: {"name": "alice", "weights": [(0, 1), (1, 2)], "fee": None},
+    BOB: {"name": "bob", "weights": [], "fee": 5},
+}
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Iterator[SnapshotStore]:
+    store = SnapshotStore(str(tmp_path / "snapshots.sqlite"))
+    yield store
+    store.close()
+
+
+def test_round_trips_maps(store: SnapshotStore):
+    store.save(
+        BLOCK,
+        {"StakingTo": STAKING_TO, "Agents": AGENTS},
+        block_number=7,
+        functions={"Torus0": [("StakingTo", []), ("Agents", [])]},
+    )
+    snapshot = store.open(BLOCK)
+    assert snapshot.block_number == 7
+    assert sorted(snapshot.storage_functions) == ["Agents", "StakingTo"]
+    assert snapshot.query_map("StakingTo") == STAKING_TO
+    assert snapshot.query_map("Agents") == AGENTS
+    agents = snapshot["Agents"]
+    assert agents.module == "Torus0"
+    assert len(agents) == 2
+    assert agents[BOB] == AGENTS[BOB]
+    assert ALICE in agents and "missing" not in agents
+    with pytest.raises(KeyError):
+        agents["missing"]
+
+
+def test_looks_up_double_maps_by_key(store: SnapshotStore):
+    staking_to = store.save(BLOCK, {"StakingTo": STAKING_TO})["StakingTo"]
+    assert staking_to.by_key(ALICE) == {
+        (ALICE, BOB): 10,
+        (ALICE, ALICE): 2**70,
+    }
+    assert staking_to.by_key(ALICE, position=1) == {
+        (ALICE, ALICE): 2**70,
+        (BOB, ALICE): 3,
+    }
+
+
+def test_saving_again_replaces_a_map(store: SnapshotStore):
+    store.save(BLOCK, {"Agents": AGENTS}, block_number=7)
+    store.save(BLOCK, {"Agents": {BOB: AGENTS[BOB]}})
+    snapshot = store.open(BLOCK)
+    assert snapshot.block_number == 7
+    assert snapshot.query_map("Agents") == {BOB: AGENTS[BOB]}
+
+
+def test_lists_opens_latest_and_deletes(tmp_path: Path):
+    path = str(tmp_path / "snapshots.sqlite")
+    store = SnapshotStore(path)
+    store.save(LATER_BLOCK, {"Agents": AGENTS}, block_number=8)
+    store.save(BLOCK, {"Agents": AGENTS, "StakingTo": {}}, block_number=7)
+    store.close()
+
+    store = SnapshotStore(path)
+    try:
+        infos = store.snapshots()
+        assert [info.block_hash for info in infos] == [BLOCK, LATER_BLOCK]
+        assert infos[0].maps == {"Agents": 2, "StakingTo": 0}
+        assert store.open().block_hash == LATER_BLOCK
+        store.delete(LATER_BLOCK)
+        assert store.open().block_hash == BLOCK
+        with pytest.raises(KeyError):
+            store.open(LATER_BLOCK)
+    finally:
+        store.close()
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from torusdk.storage_cache import ENTRY_OVERHEAD, DiskSpill, StorageCache
+
+BLOCK = "0x" + "01" * 32
+OTHER_BLOCK = "0x" + "02" * 32
+
+
+def entry_size(key: str, value: str | None) -> int:
+    return len(key) + len(value or "") + ENTRY_OVERHEAD
+
+
+def test_lookup_splits_hits_and_misses():
+    cache = StorageCache(max_bytes=10_000)
+    cache.store(BLOCK, [("0xaa", "0x01"), ("0xbb", None)])
+    found, missing = cache.lookup(BLOCK, ["0xaa", "0xcc", "0xbb"])
+    assert found == {"0xaa": "0x01", "0xbb": None}
+    assert missing == ["0xcc"]
+    assert cache.lookup(OTHER_BLOCK, ["0xaa"]) == ({}, ["0xaa"])
+    stats = cache.stats
+    assert (stats.hits, stats.misses) == (2, 2)
+    assert stats.size == entry_size("0xaa", "0x01") + entry_size("0xbb", None)
+
+
+def test_evicts_least_recently_used():
+    cache = StorageCache(max_bytes=2 * entry_size("0xaa", "0x01"))
+    cache.store(BLOCK, [("0xaa", "0x01"), ("0xbb", "0x02")])
+    cache.lookup(BLOCK, ["0xaa"])
+    cache.store(BLOCK, [("0xcc", "0x03")])
+    found, missing = cache.lookup(BLOCK, ["0xaa", "0xbb", "0xcc"])
+    assert found == {"0xaa": "0x01", "0xcc": "0x03"}
+    assert missing == ["0xbb"]
+    assert cache.stats.evictions == 1
+    assert cache.stats.size <= cache.max_bytes
+
+
+def test_evicted_entries_spill_and_come_back(tmp_path: Path):
+    spill = DiskSpill(str(tmp_path / "spill.sqlite"))
+    cache = StorageCache(max_bytes=entry_size("0xaa", "0x01"), spill=spill)
+    try:
+        cache.store(BLOCK, [("0xaa", "0x01"), ("0xbb", None)])
+        assert cache.stats.spilled == 1
+        found, missing = cache.lookup(BLOCK, ["0xaa", "0xbb", "0xcc"])
+        assert found == {"0xaa": "0x01", "0xbb": None}
+        assert missing == ["0xcc"]
+        assert cache.stats.disk_hits == 1
+    finally:
+        cache.close()
+
+
+def test_spill_persists_across_instances(tmp_path: Path):
+    path = str(tmp_path / "spill.sqlite")
+    spill = DiskSpill(path)
+    spill.put_many([(BLOCK, "0xaa", "0x01"), (OTHER_BLOCK, "0xaa", None)])
+    spill.close()
+    spill = DiskSpill(path)
+    try:
+        assert spill.get_many(BLOCK, ["0xaa", "0xbb"]) == {"0xaa": "0x01"}
+        assert spill.get_many(OTHER_BLOCK, ["0xaa"]) == {"0xaa": None}
+    finally:
+        spill.close()
+
+
+def test_spill_drops_oldest_over_budget(tmp_path: Path):
+    spill = DiskSpill(str(tmp_path / "spill.sqlite"), max_bytes=20)
+    try:
+        keys = [f"0x{i:02x}" for i in range(4)]
+        for key in keys:
+            spill.put_many([(BLOCK, key, "0xffff")])
+        assert spill.get_many(BLOCK, keys) == {keys[-1]: "0xffff"}
+    finally:
+        spill.close()
+
+
+def test_spill_reads_more_keys_than_sqlite_variables(tmp_path: Path):
+    spill = DiskSpill(str(tmp_path / "spill.sqlite"))
+    try:
+        keys = [f"0x{i:04x}" for i in range(1200)]
+        spill.put_many((BLOCK, key, key) for key in keys)
+        assert spill.get_many(BLOCK, keys) == {key: key for key in keys}
+    finally:
+        spill.close()
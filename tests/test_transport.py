@@ -0,0 +1,204 @@
+import threading
+import time
+from typing import Any, Iterator
+
+import pytest
+import websocket
+
+from tests.conftest import NO_REPLY, FakeNode
+from torusdk import transport
+from torusdk.codec import DEFAULT_CODEC
+from torusdk.errors import NetworkError, NetworkQueryError
+from torusdk.transport import (
+    REQUEST_TOO_LARGE,
+    HttpTransport,
+    MultiplexedWebsocket,
+    TrafficStats,
+    open_websocket,
+    recv_json,
+    send_json,
+)
+
+NULL_ID_ERROR = {"code": -32007, "message": "Request too large"}
+
+
+def requests(*values: Any) -> list[dict[str, Any]]:
+    return [
+        {"jsonrpc": "2.0", "method": "echo", "params": [value]}
+        for value in values
+    ]
+
+
+def answer(request: dict[str, Any]) -> dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request["id"], "result": request["params"]}
+
+
+def null_id_error() -> dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": None, "error": NULL_ID_ERROR}
+
+
+@pytest.fixture
+def multiplexed(node: FakeNode) -> Iterator[MultiplexedWebsocket]:
+    node.handlers["echo"] = lambda params: params
+    ws = MultiplexedWebsocket(node.url)
+    yield ws
+    ws.close()
+
+
+def test_responses_are_routed_by_id(
+    node: FakeNode, multiplexed: MultiplexedWebsocket
+):
+    node.batch_reply = lambda batch: [answer(r) for r in reversed(batch)]
+    results: dict[int, list[Any]] = {}
+
+    def send(thread: int):
+        # every thread numbers its requests alike
+        futures = multiplexed.send(requests(thread, thread + 100))
+        results[thread] = [f.result(5)["result"][0] for f in futures]
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [i, i + 100] for i in range(10)}
+    assert multiplexed.in_flight == 0
+
+
+def test_null_id_error_fails_the_rest_of_its_batch(
+    node: FakeNode, multiplexed: MultiplexedWebsocket
+):
+    node.batch_reply = lambda batch: [answer(batch[0]), null_id_error()]
+    first, second = multiplexed.send(requests(1, 2))
+    assert first.result(5)["result"] == [1]
+    with pytest.raises(NetworkQueryError):
+        second.result(5)
+    assert multiplexed.in_flight == 0
+
+
+def test_lone_null_id_error_fails_the_only_batch_in_flight(
+    node: FakeNode, multiplexed: MultiplexedWebsocket
+):
+    node.batch_reply = lambda _: null_id_error()
+    futures = multiplexed.send(requests(1, 2))
+    for future in futures:
+        with pytest.raises(NetworkQueryError):
+            future.result(5)
+    assert multiplexed.connected
+
+
+def test_lone_null_id_error_fails_every_batch_it_cant_tell_apart(
+    node: FakeNode, multiplexed: MultiplexedWebsocket
+):
+    replies = iter([NO_REPLY, null_id_error()])
+    node.batch_reply = lambda _: next(replies)
+    futures = multiplexed.send(requests(1, 2))
+    futures += multiplexed.send(requests(3, 4))
+    for future in futures:
+        with pytest.raises(NetworkQueryError):
+            future.result(5)
+    assert multiplexed.in_flight == 0
+
+
+def test_closed_connection_fails_pending_requests(
+    node: FakeNode, multiplexed: MultiplexedWebsocket
+):
+    node.batch_reply = lambda _: NO_REPLY
+    futures = multiplexed.send(requests(1, 2))
+    node.disconnect()
+    for future in futures:
+        with pytest.raises(NetworkError):
+            future.result(5)
+    assert not multiplexed.connected
+    (future,) = multiplexed.send(requests(3))
+    with pytest.raises(NetworkError):
+        future.result(5)
+
+
+def test_idle_socket_is_kept_alive_without_a_timeout(
+    node: FakeNode, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(transport, "KEEPALIVE_INTERVAL", 0.05)
+    node.handlers["echo"] = lambda params: params
+    multiplexed = MultiplexedWebsocket(node.url)
+    try:
+        time.sleep(0.3)
+        # a timeout would also bound sends of large batches
+        assert multiplexed._ws.gettimeout() is None  # type: ignore
+        (future,) = multiplexed.send(requests(1))
+        assert future.result(5)["result"] == [1]
+    finally:
+        multiplexed.close()
+
+
+def test_websocket_fragments_large_messages(node: FakeNode):
+    node.handlers["echo"] = lambda params: params
+    traffic = TrafficStats()
+    ws = open_websocket(node.url, {"max_frame_size": 100}, traffic)
+    try:
+        (request,) = requests("a" * 1000)
+        send_json(ws, DEFAULT_CODEC, {**request, "id": 1})
+        assert recv_json(ws, DEFAULT_CODEC)["result"] == ["a" * 1000]
+        assert (traffic.messages_sent, traffic.messages_received) == (1, 1)
+        assert traffic.bytes_sent > 1000 and traffic.bytes_received > 1000
+    finally:
+        ws.close()
+
+
+def test_websocket_refuses_messages_over_the_limit(node: FakeNode):
+    node.handlers["echo"] = lambda params: params
+    ws = open_websocket(node.url, {"max_message_size": 1000})
+    try:
+        (small, large) = requests("a" * 10, "a" * 5000)
+        send_json(ws, DEFAULT_CODEC, {**small, "id": 1})
+        assert recv_json(ws, DEFAULT_CODEC)["id"] == 1
+        send_json(ws, DEFAULT_CODEC, {**large, "id": 2})
+        with pytest.raises(websocket.WebSocketPayloadException):
+            recv_json(ws, DEFAULT_CODEC)
+    finally:
+        ws.close()
+
+
+def test_http_batches_answer_in_request_order(node: FakeNode):
+    node.batch_reply = lambda batch: [answer(r) for r in reversed(batch)]
+    http = HttpTransport(node.url, pool_size=2)
+    results: list[list[Any]] = []
+
+    def send(thread: int):
+        for i in range(20):
+            responses = http.send(requests(thread, i))
+            results.append([r["result"][0] for r in responses])
+
+    try:
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [[t, i] for t in range(5) for i in range(20)]
+        assert len(http._idle) <= 2  # type: ignore
+    finally:
+        http.close()
+
+
+def test_http_lone_error_raises(node: FakeNode):
+    node.batch_reply = lambda _: null_id_error()
+    http = HttpTransport(node.url)
+    with pytest.raises(NetworkQueryError) as error:
+        http.send(requests(1))
+    assert error.value.args[0] == NULL_ID_ERROR
+
+
+def test_http_request_too_large_raises_query_error(node: FakeNode):
+    node.http_status = 413
+    http = HttpTransport(node.url)
+    with pytest.raises(NetworkQueryError) as error:
+        http.send(requests(1))
+    assert error.value.args[0]["code"] == REQUEST_TOO_LARGE
+
+
+def test_http_refused_connection_raises_network_error():
+    http = HttpTransport("http://127.0.0.1:1/")
+    with pytest.raises(NetworkError) as error:
+        http.send(requests(1))
+    assert not isinstance(error.value, NetworkQueryError)